@@ -0,0 +1,339 @@
+"""
+Consolidated portfolio view over several Robinhood accounts, synced in parallel
+"""
+
+import functools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from instrument_resolver import InstrumentResolver
+from portfolio_analyzer import PortfolioAnalyzer, reprice_holding
+from price_history import PriceHistoryStore
+from shared_cache import get_shared_cache
+from utils import fan_out, safe_float
+
+# Datasets reloaded by sync(), as PortfolioAnalyzer.refresh() keys
+SYNC_DATASETS = ('holdings', 'open_orders', 'all_orders', 'dividends')
+
+# Overall deadline in seconds for one parallel pass over all accounts
+ACCOUNT_SYNC_DEADLINE = 120
+
+# Holding fields summed across accounts; price-derived fields are recomputed
+SUMMED_HOLDING_FIELDS = ('market_value', 'total_return_today')
+
+
+class PortfolioAggregator:
+    """
+    Several logged-in PortfolioAnalyzers combined into one portfolio.
+
+    Every account keeps its own analyzer (HTTP session, caches, ledgers), so
+    accounts never see each other's data; public data (instrument symbols and
+    daily prices) is shared. Reads fan out to all accounts at once, so a
+    combined view costs as much as the slowest account rather than the sum.
+    Holdings are merged per symbol; orders and dividends are concatenated and
+    tagged with the account label they came from.
+    """
+
+    def __init__(self, instrument_resolver: Optional[InstrumentResolver] = None,
+                 price_history: Optional[PriceHistoryStore] = None,
+                 deadline: float = ACCOUNT_SYNC_DEADLINE, **analyzer_options):
+        """
+        Args:
+            instrument_resolver: Resolver shared by every account (defaults to one backed by the shared cache)
+            price_history: Daily price cache shared by every account (defaults to one backed by the shared cache)
+            deadline: Seconds to wait for all accounts in one parallel pass
+            **analyzer_options: Extra PortfolioAnalyzer arguments for accounts added with add_account()
+        """
+        # Like the API server, default to stores backed by the process-wide cache of public data
+        if instrument_resolver is None:
+            instrument_resolver = InstrumentResolver(shared_cache=get_shared_cache())
+        if price_history is None:
+            price_history = PriceHistoryStore(shared_cache=get_shared_cache())
+        self._instrument_resolver = instrument_resolver
+        self._price_history = price_history
+        self._deadline = deadline
+        self._analyzer_options = analyzer_options
+        self._analyzers: Dict[str, PortfolioAnalyzer] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def accounts(self) -> List[str]:
+        """Labels of the added accounts, in the order they were added"""
+        with self._lock:
+            return list(self._analyzers)
+
+    def analyzer(self, label: str) -> PortfolioAnalyzer:
+        """
+        Get one account's analyzer
+
+        Args:
+            label: Account label
+
+        Returns:
+            PortfolioAnalyzer of the account
+        """
+        with self._lock:
+            if label not in self._analyzers:
+                raise KeyError(f"Unknown account: {label}")
+            return self._analyzers[label]
+
+    def add_account(self, label: str, username: str, password: str, mfa_code: Optional[str] = None) -> bool:
+        """
+        Log in to an account and add it
+
+        Args:
+            label: Name the account is reported under (e.g. "IRA")
+            username: Robinhood username/email
+            password: Robinhood password
+            mfa_code: MFA code if required
+
+        Returns:
+            bool: True if the login succeeded and the account was added
+        """
+        analyzer = PortfolioAnalyzer(
+            instrument_resolver=self._instrument_resolver,
+            price_history=self._price_history,
+            **self._analyzer_options,
+        )
+        if not analyzer.login(username, password, mfa_code):
+            return False
+        self.add_analyzer(label, analyzer)
+        return True
+
+    def add_analyzer(self, label: str, analyzer: PortfolioAnalyzer):
+        """
+        Add an already logged-in analyzer, replacing (and logging out) any account with the same label
+
+        Args:
+            label: Name the account is reported under
+            analyzer: Logged-in PortfolioAnalyzer
+        """
+        with self._lock:
+            previous = self._analyzers.get(label)
+            self._analyzers[label] = analyzer
+        if previous is not None and previous is not analyzer:
+            previous.logout()
+
+    def remove_account(self, label: str):
+        """
+        Log out of an account and remove it
+
+        Args:
+            label: Account label
+        """
+        with self._lock:
+            analyzer = self._analyzers.pop(label, None)
+        if analyzer is not None:
+            analyzer.logout()
+
+    def logout(self):
+        """Log out of every account"""
+        with self._lock:
+            analyzers, self._analyzers = list(self._analyzers.values()), {}
+        for analyzer in analyzers:
+            analyzer.logout()
+
+    def sync(self, datasets: Tuple[str, ...] = SYNC_DATASETS) -> Dict[str, Exception]:
+        """
+        Reload datasets of every account in parallel
+
+        Each account reloads its datasets one after another on its own
+        thread, so the whole sync takes as long as the slowest account.
+
+        Args:
+            datasets: PortfolioAnalyzer.refresh() keys to reload
+
+        Returns:
+            Dict of account label -> error for accounts that failed or missed the
+            deadline (their previously cached data is kept)
+        """
+        def sync_account(analyzer: PortfolioAnalyzer):
+            for dataset in datasets:
+                analyzer.refresh(dataset)
+
+        _, errors = self._each(sync_account, 'Sync')
+        return errors
+
+    def get_holdings(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get holdings merged by symbol across accounts
+
+        Quantities, market value and today's return are summed, the average
+        buy price is weighted by quantity, and equity, equity change and
+        percent changes are recomputed from the combined position.
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Dict of symbol -> combined holding, with 'accounts' mapping each
+            holding account's label to its quantity
+        """
+        by_account, _ = self._each(lambda analyzer: analyzer.get_holdings(force_refresh), 'Holdings')
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for label, holdings in by_account.items():
+            for symbol, data in (holdings or {}).items():
+                quantity = safe_float(data.get('quantity'))
+                combined = merged.get(symbol)
+                if combined is None:
+                    combined = merged[symbol] = dict(data, quantity=0.0, cost=0.0, accounts={})
+                    for name in SUMMED_HOLDING_FIELDS:
+                        combined[name] = 0.0
+                combined['quantity'] += quantity
+                combined['cost'] += quantity * safe_float(data.get('average_buy_price'))
+                for name in SUMMED_HOLDING_FIELDS:
+                    combined[name] += safe_float(data.get(name))
+                combined['accounts'][label] = data.get('quantity', '0')
+                # Every account sees the same quote; keep the first usable price
+                if safe_float(combined.get('price')) <= 0:
+                    combined['price'] = data.get('price', '0')
+
+        return {symbol: self._finish_holding(combined) for symbol, combined in merged.items()}
+
+    def _finish_holding(self, combined: Dict[str, Any]) -> Dict[str, Any]:
+        """Format a merged holding like a single-account one"""
+        quantity = combined['quantity']
+        cost = combined.pop('cost')
+        combined['average_buy_price'] = "{0:.4f}".format(cost / quantity if quantity else 0.0)
+        combined['quantity'] = "{0:.8f}".format(quantity).rstrip('0').rstrip('.')
+        for name in SUMMED_HOLDING_FIELDS:
+            combined[name] = "{0:.2f}".format(combined[name])
+        holding = reprice_holding(combined, combined.get('price', '0'))
+        # market_value is '0' in every holding, so today's percent is measured
+        # against the combined equity less today's return
+        today = safe_float(holding['total_return_today'])
+        opening = safe_float(holding['equity']) - today
+        holding['total_return_today_percent'] = "{0:.2f}".format(today * 100 / opening if opening else 0.0)
+        return holding
+
+    def get_dividends(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the dividends of every account
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of dividends tagged with 'account', latest payable date first
+        """
+        return self._tagged(lambda analyzer: analyzer.get_dividends(force_refresh), 'payable_date', 'Dividends')
+
+    def get_total_dividends(self, force_refresh: bool = False) -> str:
+        """
+        Get the dividends earned across all accounts
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            String representation of the combined total
+        """
+        totals, _ = self._each(lambda analyzer: analyzer.get_total_dividends(force_refresh), 'Dividend total')
+        return f"{sum(safe_float(total) for total in totals.values()):.2f}"
+
+    def get_open_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the open orders of every account
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of open orders tagged with 'account', newest first
+        """
+        return self._tagged(lambda analyzer: analyzer.get_open_orders(force_refresh), 'created_at', 'Open orders')
+
+    def get_all_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the order history of every account
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of orders tagged with 'account', newest first
+        """
+        return self._tagged(lambda analyzer: analyzer.get_all_orders(force_refresh), 'created_at', 'Order history')
+
+    def get_stock_orders_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get one symbol's orders across accounts
+
+        Args:
+            symbol: Stock symbol
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of orders tagged with 'account', newest first
+        """
+        return self._tagged(lambda analyzer: analyzer.get_stock_orders_by_symbol(symbol, force_refresh),
+                            'created_at', f'{symbol} orders')
+
+    def get_stock_dividends_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get one symbol's dividends across accounts
+
+        Args:
+            symbol: Stock symbol
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of dividends tagged with 'account', latest payable date first
+        """
+        return self._tagged(lambda analyzer: analyzer.get_stock_dividends_by_symbol(symbol, force_refresh),
+                            'payable_date', f'{symbol} dividends')
+
+    def get_account_totals(self, force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Get per-account totals for a breakdown next to the combined view
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Dict of account label -> total_equity, total_positions and total_dividends,
+            or -> {'error': message} for accounts that failed or missed the deadline
+        """
+        def totals(analyzer: PortfolioAnalyzer) -> Dict[str, float]:
+            holdings = analyzer.get_holdings(force_refresh)
+            return {
+                'total_equity': sum(safe_float(data.get('equity')) for data in holdings.values()),
+                'total_positions': len(holdings),
+                'total_dividends': safe_float(analyzer.get_total_dividends(force_refresh)),
+            }
+
+        results, errors = self._each(totals, 'Totals')
+        return {label: results[label] if label in results else {'error': str(errors[label])}
+                for label in self.accounts if label in results or label in errors}
+
+    def _tagged(self, call: Callable[[PortfolioAnalyzer], List[Dict[str, Any]]], time_field: str,
+                what: str) -> List[Dict[str, Any]]:
+        """Concatenate every account's records, tagged with the account, newest first"""
+        by_account, _ = self._each(call, what)
+        records = [dict(record, account=label) for label, items in by_account.items() for record in items or []]
+        records.sort(key=lambda record: record.get(time_field) or '', reverse=True)
+        return records
+
+    def _each(self, call: Callable[[PortfolioAnalyzer], Any], what: str) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        Run a call against every account concurrently under one deadline
+
+        Accounts that fail or miss the deadline are reported and left out of
+        the results; the others are still returned.
+
+        Args:
+            call: Callable taking an analyzer
+            what: What the call loads, for error messages
+
+        Returns:
+            Tuple of (results, errors): results maps the label of every account that
+            finished in time to its return value, errors maps the others to the exception
+        """
+        with self._lock:
+            analyzers = dict(self._analyzers)
+        results, errors = fan_out({label: functools.partial(call, analyzer) for label, analyzer in analyzers.items()},
+                                  self._deadline, thread_name_prefix='account-sync')
+        for label, error in errors.items():
+            print(f"{what} of account {label} failed: {str(error)}")
+        return results, errors
@@ -0,0 +1,530 @@
+"""
+HTTP API for the Next.js frontend, served as a plain ASGI app (uvicorn api_server:app --port 8002)
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote
+
+try:
+    import httpx
+except ImportError:  # optional: pip install httpx (the 'api' extra)
+    httpx = None
+
+from async_analyzer import AsyncPortfolioAnalyzer
+from instrument_resolver import InstrumentResolver
+from lots import METHODS as COST_BASIS_METHODS
+from portfolio_analyzer import NotLoggedInError, PortfolioAnalyzer
+from price_history import PriceHistoryStore
+from shared_cache import get_shared_cache
+from snapshot_diff import diff_snapshots, snapshot_state
+from utils import safe_float
+
+API_PORT = 8002
+
+# Origins allowed to call the API from a browser (comma-separated in IPT_API_ORIGINS)
+DEFAULT_ORIGINS = ('http://localhost:3000',)
+
+# Seconds a login stays valid without requests
+SESSION_IDLE_TIMEOUT = 3600
+
+# Encoded responses kept per session, least recently used evicted first
+RESPONSE_CACHE_SIZE = 128
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+MAX_BODY_SIZE = 64 * 1024
+
+STREAM_PATH = '/api/portfolio/stream'
+
+# Seconds between price refreshes while a session has a stream open
+STREAM_QUOTE_INTERVAL = 1
+
+# Seconds between keepalive comments on an idle stream (proxies drop silent connections)
+STREAM_KEEPALIVE = 15
+
+# Updates buffered per stream; a client that falls further behind gets a fresh snapshot
+STREAM_QUEUE_SIZE = 64
+
+# Robinhood statuses meaning the session's token is no longer accepted
+EXPIRED_SESSION_STATUSES = (401, 403)
+
+# Queued instead of an update when a stream must resend the full state
+_RESYNC = object()
+# Queued when the session ends
+_CLOSED = object()
+
+
+class ApiError(Exception):
+    """An error reported to the client as {success: false, message}"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class EncodedResponse:
+    """A serialized response body with its ETag, compressed on first use"""
+    sources: Tuple[Any, ...]
+    body: bytes
+    etag: str
+    _gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+@dataclass
+class ApiSession:
+    """A logged in frontend user"""
+    analyzer: PortfolioAnalyzer
+    client: AsyncPortfolioAnalyzer
+    last_used: float = field(default_factory=time.time)
+    responses: 'OrderedDict[str, EncodedResponse]' = field(default_factory=OrderedDict)
+    streams: List[asyncio.Queue] = field(default_factory=list)
+    unsubscribe: Optional[Callable[[], None]] = None
+    event_id: int = 0
+
+
+def _encode(payload: Any) -> bytes:
+    return json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _upstream_error(error: Exception) -> Optional[ApiError]:
+    """Map a failed Robinhood call to the error the client sees, or None for internal errors"""
+    if isinstance(error, NotLoggedInError):
+        return ApiError(401, 'Robinhood session expired. Please login again.')
+    if httpx is None or not isinstance(error, httpx.HTTPError):
+        return None
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in EXPIRED_SESSION_STATUSES:
+        return ApiError(401, 'Robinhood session expired. Please login again.')
+    return ApiError(502, 'Robinhood request failed')
+
+
+def _same_sources(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    """Datasets match by identity (the analyzer replaces them on every load), scalars by value"""
+    return len(a) == len(b) and all(
+        x is y or (not isinstance(x, (dict, list)) and x == y) for x, y in zip(a, b)
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+class ApiServer:
+    """
+    ASGI app exposing login and portfolio endpoints.
+
+    Each login gets its own PortfolioAnalyzer and a bearer token (sent by the
+    frontend as "Authorization: Bearer <token>"); data is fetched through an
+    AsyncPortfolioAnalyzer and served from the analyzer's cache. Encoded
+    responses are cached per session until the datasets behind them are
+    reloaded, carry a strong ETag so unchanged data is answered with 304 Not
+    Modified, and are gzip-compressed once for clients that accept it.
+
+    GET /api/portfolio/stream is a server-sent event stream: it starts the
+    session's background refresh and pushes only what changed (prices,
+    equity, new fills and dividends) as soon as each refresh publishes.
+    """
+
+    def __init__(self, allowed_origins: Optional[List[str]] = None,
+                 session_idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        """
+        Args:
+            allowed_origins: Browser origins allowed by CORS (defaults to IPT_API_ORIGINS or localhost:3000)
+            session_idle_timeout: Seconds after which an unused login is logged out
+        """
+        if allowed_origins is None:
+            configured = os.environ.get('IPT_API_ORIGINS', '')
+            allowed_origins = [origin.strip() for origin in configured.split(',') if origin.strip()] or list(DEFAULT_ORIGINS)
+        self._allowed_origins = set(allowed_origins)
+        self._session_idle_timeout = session_idle_timeout
+        self._sessions: Dict[str, ApiSession] = {}
+        self._instrument_resolver: Optional[InstrumentResolver] = None
+        self._price_history: Optional[PriceHistoryStore] = None
+        self._routes: List[Tuple[str, 're.Pattern', Callable[..., Awaitable[Any]]]] = [
+            ('POST', re.compile(r'/api/auth/login'), self._login),
+            ('POST', re.compile(r'/api/auth/logout'), self._logout),
+            ('GET', re.compile(r'/api/portfolio/summary'), self._summary),
+            ('GET', re.compile(r'/api/portfolio/holdings'), self._holdings),
+            ('GET', re.compile(r'/api/portfolio/orders'), self._orders),
+            ('GET', re.compile(r'/api/portfolio/dividends'), self._dividends),
+            ('GET', re.compile(r'/api/portfolio/stocks/(?P<symbol>[^/]+)'), self._stock),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        cors = self._cors_headers(headers.get('origin'))
+
+        if scope['method'] == 'OPTIONS':
+            await self._send(send, 204, b'', cors + [
+                (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                (b'access-control-allow-headers', b'Authorization, Content-Type, If-None-Match'),
+                (b'access-control-max-age', b'600'),
+            ])
+            return
+
+        try:
+            if scope['path'] == STREAM_PATH and scope['method'] == 'GET':
+                params = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+                # EventSource cannot set headers, so browsers pass the token in the query string
+                session = self._authenticate(headers, params.get('token', ''))
+                await self._stream(session, receive, send, cors)
+                return
+
+            route, match = self._match(scope['method'], scope['path'])
+            if scope['method'] == 'POST':
+                body = await self._read_body(receive)
+                await self._send_json(send, 200, await route(body, headers), cors)
+                return
+
+            session = self._authenticate(headers)
+            params = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+            cache_key = scope['path'] + '?' + scope['query_string'].decode('latin-1')
+            sources, build = await route(session, params, **match.groupdict())
+            encoded = await self._encoded(session, cache_key, sources, build)
+            await self._send_encoded(send, encoded, headers, cors)
+        except ApiError as e:
+            await self._send_json(send, e.status, {'success': False, 'message': e.message}, cors)
+        except Exception as e:
+            error = _upstream_error(e)
+            if error is not None:
+                print(f"Robinhood error on {scope['method']} {scope['path']}: {str(e)}")
+                await self._send_json(send, error.status, {'success': False, 'message': error.message}, cors)
+                return
+            print(f"API error on {scope['method']} {scope['path']}: {str(e)}")
+            await self._send_json(send, 500, {'success': False, 'message': 'Internal server error'}, cors)
+
+    async def close(self):
+        """Log out every session"""
+        for token in list(self._sessions):
+            await self._end_session(token)
+
+    async def _login(self, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        try:
+            credentials = json.loads(body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Invalid JSON body')
+        username = (credentials.get('username') or '').strip()
+        password = credentials.get('password') or ''
+        if not username or not password:
+            raise ApiError(400, 'Username and password are required')
+
+        # Shared across logins: instrument symbols and daily prices are not account data
+        if self._instrument_resolver is None:
+            self._instrument_resolver = InstrumentResolver(shared_cache=get_shared_cache())
+            self._price_history = PriceHistoryStore(shared_cache=get_shared_cache())
+        analyzer = PortfolioAnalyzer(
+            instrument_resolver=self._instrument_resolver,
+            price_history=self._price_history,
+            ledger_dir=os.environ.get('IPT_LEDGER_DIR'),
+            snapshot_dir=os.environ.get('IPT_SNAPSHOT_DIR'),
+            snapshot_key=os.environ.get('IPT_SNAPSHOT_KEY'),
+        )
+        if not await asyncio.to_thread(analyzer.login, username, password, credentials.get('mfa_code') or None):
+            raise ApiError(401, 'Login failed. Please check your credentials.')
+
+        token = secrets.token_urlsafe(32)
+        self._sessions[token] = ApiSession(analyzer, AsyncPortfolioAnalyzer(analyzer))
+        return {'success': True, 'message': 'Logged in', 'token': token}
+
+    async def _logout(self, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        token = self._token(headers)
+        if token in self._sessions:
+            await self._end_session(token)
+        return {'success': True, 'message': 'Logged out'}
+
+    async def _summary(self, session: ApiSession, params: Dict[str, str]):
+        holdings, total_dividends = await asyncio.gather(
+            session.client.get_holdings(), session.client.get_total_dividends()
+        )
+
+        async def build():
+            # Holdings carry no separate market value (it is always '0'); a
+            # position's value is its equity, quantity x latest price
+            total_equity = sum(safe_float(data.get('equity')) for data in holdings.values())
+            return {
+                'total_equity': total_equity,
+                'total_market_value': total_equity,
+                'total_positions': len(holdings),
+                'total_dividends': safe_float(total_dividends),
+            }
+        return (holdings, total_dividends), build
+
+    async def _holdings(self, session: ApiSession, params: Dict[str, str]):
+        holdings = await session.client.get_holdings()
+        return (holdings,), self._value(holdings)
+
+    async def _orders(self, session: ApiSession, params: Dict[str, str]):
+        status = params.get('status', 'all')
+        if status not in ('all', 'open'):
+            raise ApiError(400, "status must be 'all' or 'open'")
+        if status == 'open':
+            orders = await session.client.get_open_orders()
+        else:
+            orders = await session.client.get_all_orders()
+        return (orders,), self._value(orders)
+
+    async def _dividends(self, session: ApiSession, params: Dict[str, str]):
+        dividends, total_dividends = await asyncio.gather(
+            session.client.get_dividends(), session.client.get_total_dividends()
+        )
+        return (dividends, total_dividends), self._value(
+            {'dividends': dividends, 'total_dividends': safe_float(total_dividends)}
+        )
+
+    async def _stock(self, session: ApiSession, params: Dict[str, str], symbol: str):
+        symbol = unquote(symbol).upper()
+        method = params.get('cost_basis_method') or None
+        if method is not None and method not in COST_BASIS_METHODS:
+            raise ApiError(400, f"cost_basis_method must be one of {', '.join(COST_BASIS_METHODS)}")
+        holdings, orders, dividends = await asyncio.gather(
+            session.client.get_holdings(), session.client.get_all_orders(), session.client.get_dividends()
+        )
+
+        async def build():
+            return await session.client.get_stock_summary(symbol, cost_basis_method=method)
+        return (holdings, orders, dividends), build
+
+    def _value(self, value: Any) -> Callable[[], Awaitable[Any]]:
+        async def build():
+            return value
+        return build
+
+    async def _encoded(self, session: ApiSession, cache_key: str, sources: Tuple[Any, ...],
+                       build: Callable[[], Awaitable[Any]]) -> EncodedResponse:
+        """Return the cached encoding of a response unless the datasets behind it changed"""
+        encoded = session.responses.get(cache_key)
+        if encoded is not None and _same_sources(encoded.sources, sources):
+            session.responses.move_to_end(cache_key)
+            return encoded
+
+        body = _encode({'success': True, 'data': await build()})
+        encoded = EncodedResponse(sources, body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        session.responses[cache_key] = encoded
+        session.responses.move_to_end(cache_key)
+        while len(session.responses) > RESPONSE_CACHE_SIZE:
+            session.responses.popitem(last=False)
+        return encoded
+
+    def _authenticate(self, headers: Dict[str, str], token: str = '') -> ApiSession:
+        self._expire_sessions()
+        session = self._sessions.get(self._token(headers) or token)
+        if session is None:
+            raise ApiError(401, 'Not logged in. Please login first.')
+        session.last_used = time.time()
+        return session
+
+    def _token(self, headers: Dict[str, str]) -> str:
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        return token.strip() if scheme.lower() == 'bearer' else ''
+
+    def _expire_sessions(self):
+        cutoff = time.time() - self._session_idle_timeout
+        for token in [token for token, session in self._sessions.items() if session.last_used < cutoff]:
+            asyncio.ensure_future(self._end_session(token))
+
+    async def _end_session(self, token: str):
+        session = self._sessions.pop(token, None)
+        if session is None:
+            return
+        self._stop_streaming(session)
+        for queue in session.streams:
+            self._enqueue(queue, _CLOSED)
+        await session.client.aclose()
+        await asyncio.to_thread(session.analyzer.logout)
+
+    async def _stream(self, session: ApiSession, receive, send, cors: List[Tuple[bytes, bytes]]):
+        """Serve server-sent events until the client disconnects or the session ends"""
+        queue: asyncio.Queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        if session.unsubscribe is None:
+            self._start_streaming(session)
+        session.streams.append(queue)
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': cors + [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-store'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            item = _RESYNC
+            while True:
+                if item is _CLOSED:
+                    break
+                if item is _RESYNC:
+                    snapshot = session.analyzer.get_snapshot()
+                    if snapshot is not None:
+                        await self._send_event(send, session, 'snapshot', snapshot_state(snapshot))
+                elif item is not None:
+                    await self._send_event(send, session, 'update', item)
+                else:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                session.last_used = time.time()
+
+                next_item = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({next_item, disconnected}, timeout=STREAM_KEEPALIVE,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    next_item.cancel()
+                    return
+                if next_item not in done:
+                    next_item.cancel()
+                    item = None
+                else:
+                    item = next_item.result()
+            await send({'type': 'http.response.body', 'body': b'event: end\ndata: {}\n\n'})
+        finally:
+            disconnected.cancel()
+            if queue in session.streams:
+                session.streams.remove(queue)
+            if not session.streams:
+                # Nobody is listening: stop polling prices every second
+                self._stop_streaming(session)
+                await asyncio.to_thread(session.analyzer.stop_background_refresh)
+
+    def _start_streaming(self, session: ApiSession):
+        """Run the session's background refresh and fan its diffs out to every open stream"""
+        loop = asyncio.get_running_loop()
+
+        def on_snapshot(previous, snapshot):
+            # Runs on the refresher thread: diff once per session, then hand off to the event loop
+            diff = diff_snapshots(previous, snapshot)
+            if diff:
+                loop.call_soon_threadsafe(self._fan_out, session, diff)
+
+        session.analyzer.start_background_refresh(quote_interval=STREAM_QUOTE_INTERVAL)
+        session.unsubscribe = session.analyzer.subscribe_snapshots(on_snapshot)
+
+    def _stop_streaming(self, session: ApiSession):
+        if session.unsubscribe is not None:
+            session.unsubscribe()
+            session.unsubscribe = None
+
+    def _fan_out(self, session: ApiSession, diff: Dict[str, Any]):
+        for queue in session.streams:
+            self._enqueue(queue, diff)
+
+    def _enqueue(self, queue: asyncio.Queue, item: Any):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # The client is too far behind for diffs to be applied: replace the backlog with a resync
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSED if item is _CLOSED else _RESYNC)
+
+    async def _send_event(self, send, session: ApiSession, event: str, payload: Any):
+        session.event_id += 1
+        body = b'id: %d\nevent: %s\ndata: %s\n\n' % (session.event_id, event.encode('latin-1'), _encode(payload))
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    async def _wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    def _match(self, method: str, path: str):
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method == method:
+                return handler, match
+            allowed = True
+        raise ApiError(405 if allowed else 404, 'Method not allowed' if allowed else 'Not found')
+
+    def _cors_headers(self, origin: Optional[str]) -> List[Tuple[bytes, bytes]]:
+        headers = [(b'vary', b'Origin, Accept-Encoding')]
+        if origin and origin in self._allowed_origins:
+            headers += [
+                (b'access-control-allow-origin', origin.encode('latin-1')),
+                (b'access-control-expose-headers', b'ETag'),
+            ]
+        return headers
+
+    async def _read_body(self, receive) -> bytes:
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_SIZE:
+                raise ApiError(413, 'Request body too large')
+            if not message.get('more_body'):
+                return body
+
+    async def _send_encoded(self, send, encoded: EncodedResponse, headers: Dict[str, str],
+                            cors: List[Tuple[bytes, bytes]]):
+        # no-cache: browsers keep the body but revalidate it with If-None-Match every time
+        common = cors + [(b'etag', encoded.etag.encode('latin-1')), (b'cache-control', b'private, no-cache')]
+        if _etag_matches(headers.get('if-none-match', ''), encoded.etag):
+            await self._send(send, 304, b'', common)
+            return
+
+        body = encoded.body
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in headers.get('accept-encoding', ''):
+            body = encoded.gzipped
+            common.append((b'content-encoding', b'gzip'))
+        await self._send(send, 200, body, common + [(b'content-type', b'application/json')])
+
+    async def _send_json(self, send, status: int, payload: Any, cors: List[Tuple[bytes, bytes]]):
+        await self._send(send, status, _encode(payload), cors + [
+            (b'content-type', b'application/json'), (b'cache-control', b'no-store'),
+        ])
+
+    async def _send(self, send, status: int, body: bytes, headers: List[Tuple[bytes, bytes]]):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers + [(b'content-length', str(len(body)).encode('latin-1'))],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = ApiServer()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.environ.get('IPT_API_HOST', '127.0.0.1'), port=API_PORT)
@@ -5,7 +5,12 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
 from portfolio_analyzer import PortfolioAnalyzer
-from utils import format_currency, format_percentage, safe_float
+from frames import build_frame
+from instrument_resolver import InstrumentResolver
+from lots import METHODS as COST_BASIS_METHODS
+from price_history import PriceHistoryStore
+from shared_cache import get_shared_cache
+from utils import format_currency, format_date_column, format_percentage, parse_timestamp_column, safe_float
 
 # Page configuration
 st.set_page_config(
@@ -15,6 +20,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Seconds between reruns of the top-of-page metrics; matches the refresher's quote cadence
+QUOTE_REFRESH_SECONDS = 5
+
+# Seconds between checks of a placeholder for data still loading in the background
+PENDING_POLL_SECONDS = 1
+
+# Dashboard views; only the selected one is rendered (and its data read) on each rerun
+TABS = ["📈 Holdings", "💰 Dividends", "📋 Orders", "📊 Analytics"]
+
+# Streamlit number formats for table columns, applied at render time so the data stays numeric
+CURRENCY_FORMAT = "dollar"
+PERCENTAGE_FORMAT = "%+.2f%%"
+QUANTITY_FORMAT = "%.4f"
+
 # Initialize session state
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -25,6 +44,36 @@ if 'last_refresh' not in st.session_state:
 if 'user_confirmed' not in st.session_state:
     st.session_state.user_confirmed = False
 
+@st.cache_resource
+def shared_market_data():
+    """Instrument symbols and daily prices are not account data, so every session shares one resolver and price store"""
+    shared_cache = get_shared_cache()
+    return InstrumentResolver(shared_cache=shared_cache), PriceHistoryStore(shared_cache=shared_cache)
+
+def number_column_config(currency=(), percentage=(), quantity=(), labels=None):
+    """
+    Build Streamlit column_config entries for numeric table columns
+    
+    The columns stay float64 and Streamlit formats them when rendering, so
+    nothing is converted to strings cell by cell in Python.
+    
+    Args:
+        currency: Columns to show as dollars
+        percentage: Columns holding percentages (e.g. 5.2 for +5.20%)
+        quantity: Columns to show as share quantities
+        labels: Optional column name -> display label overrides
+        
+    Returns:
+        dict: Column name -> NumberColumn, for st.dataframe(column_config=...)
+    """
+    labels = labels or {}
+    config = {}
+    for columns, number_format in ((currency, CURRENCY_FORMAT), (percentage, PERCENTAGE_FORMAT),
+                                   (quantity, QUANTITY_FORMAT)):
+        for column in columns:
+            config[column] = st.column_config.NumberColumn(labels.get(column, column), format=number_format)
+    return config
+
 def login_form():
     """Display login form for Robinhood credentials"""
     st.title("🔐 Robinhood Portfolio Analyzer")
@@ -73,7 +122,14 @@ def login_form():
                         del st.session_state.analyzer
                     
                     # Create completely fresh analyzer instance
-                    analyzer = PortfolioAnalyzer()
+                    instrument_resolver, price_history = shared_market_data()
+                    analyzer = PortfolioAnalyzer(
+                        instrument_resolver=instrument_resolver,
+                        price_history=price_history,
+                        ledger_dir=os.environ.get('IPT_LEDGER_DIR'),
+                        snapshot_dir=os.environ.get('IPT_SNAPSHOT_DIR'),
+                        snapshot_key=os.environ.get('IPT_SNAPSHOT_KEY')
+                    )
                     success = analyzer.login(username, password, mfa_code if mfa_code else None)
                     
                     if success:
@@ -181,18 +237,78 @@ def user_confirmation_popup():
             st.session_state.analyzer = None
             st.rerun()
 
+def load_data(dataset: str):
+    """
+    Read a dataset from the latest background snapshot, falling back to the analyzer
+    
+    Args:
+        dataset: One of 'holdings', 'dividends', 'total_dividends', 'open_orders', 'all_orders'
+        
+    Returns:
+        The dataset from the snapshot if it has been published, otherwise from the analyzer
+    """
+    analyzer = st.session_state.analyzer
+    snapshot = analyzer.get_snapshot()
+    value = getattr(snapshot, dataset, None) if snapshot else None
+    if value is not None:
+        return value
+    return getattr(analyzer, f"get_{dataset}")()
+
+def load_frame(dataset: str) -> pd.DataFrame:
+    """
+    Read a dataset as a typed DataFrame, from the latest background snapshot if available
+    
+    Args:
+        dataset: One of 'holdings', 'dividends', 'open_orders', 'all_orders'
+        
+    Returns:
+        Typed DataFrame of the dataset (shared, do not modify in place)
+    """
+    analyzer = st.session_state.analyzer
+    snapshot = analyzer.get_snapshot()
+    if snapshot and dataset in snapshot.frames:
+        return snapshot.frames[dataset]
+    return analyzer.get_frame(dataset)
+
+def datasets_ready(*datasets: str) -> bool:
+    """Check whether datasets can be read without waiting on a background fetch"""
+    analyzer = st.session_state.analyzer
+    return all(analyzer.is_ready(dataset) for dataset in datasets)
+
+@st.fragment(run_every=PENDING_POLL_SECONDS)
+def loading_placeholder(label: str, datasets: tuple):
+    """
+    Show a placeholder (with the last error while retrying) until datasets have loaded, then rerun the page
+    
+    Args:
+        label: What is loading, as shown to the user
+        datasets: Datasets the placeholder waits for
+    """
+    if datasets_ready(*datasets):
+        st.rerun()
+    errors = [error for error in map(st.session_state.analyzer.refresh_error, datasets) if error]
+    if errors:
+        st.warning(f"⚠️ Loading {label} failed, retrying: {errors[0]}")
+    else:
+        st.info(f"⏳ Loading {label}...")
+
+@st.fragment(run_every=QUOTE_REFRESH_SECONDS)
 def display_portfolio_summary():
-    """Display portfolio summary metrics"""
+    """Display portfolio summary metrics, rerun on their own as new quotes arrive"""
+    if not datasets_ready('holdings'):
+        st.info("⏳ Loading portfolio...")
+        return
+    
     try:
-        holdings = st.session_state.analyzer.get_holdings()
+        holdings = load_frame('holdings')
         
-        if not holdings:
+        if holdings.empty:
             st.warning("No holdings data available")
             return
         
         # Calculate summary metrics
-        total_equity = sum(safe_float(holding.get('equity', 0)) for holding in holdings.values())
-        total_market_value = sum(safe_float(holding.get('market_value', 0)) for holding in holdings.values())
+        total_equity = holdings['equity'].sum()
+        total_market_value = holdings['market_value'].sum()
         
         # Display key metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -217,11 +333,11 @@ def display_portfolio_summary():
             )
         
         with col4:
-            # Calculate total dividends
-            total_divs = st.session_state.analyzer.get_total_dividends()
+            # Filled in by a later rerun if dividends are still loading
+            total_divs = load_data('total_dividends') if datasets_ready('total_dividends') else None
             st.metric(
                 label="💵 Total Dividends",
-                value=format_currency(safe_float(total_divs))
+                value=format_currency(safe_float(total_divs)) if total_divs is not None else "Loading..."
             )
         
     except Exception as e:
@@ -229,50 +345,57 @@ def display_portfolio_summary():
 
 def display_holdings():
     """Display current holdings with option for detailed view"""
+    if not datasets_ready('holdings'):
+        loading_placeholder("holdings", ('holdings',))
+        return
+    
     try:
-        holdings = st.session_state.analyzer.get_holdings()
+        holdings = load_frame('holdings')
         
-        if not holdings:
+        if holdings.empty:
             st.warning("No holdings data available")
             return
         
         # Holdings overview
         st.subheader("📈 Portfolio Holdings")
         
-        # Convert holdings to DataFrame for better display
-        holdings_data = []
-        for symbol, data in holdings.items():
-            holdings_data.append({
-                'Symbol': symbol,
-                'Quantity': safe_float(data.get('quantity', 0)),
-                'Average Cost': safe_float(data.get('average_buy_price', 0)),
-                'Current Price': safe_float(data.get('price', 0)),
-                'Market Value': safe_float(data.get('market_value', 0)),
-                'Equity': safe_float(data.get('equity', 0)),
-                'Percent Change': safe_float(data.get('percent_change', 0)),
-                'Total Return': safe_float(data.get('total_return_today', 0))
-            })
-        
-        df = pd.DataFrame(holdings_data)
+        symbols = holdings['symbol'].astype(str)
+        
+        # Per-symbol aggregates are precomputed when the history is loaded; left
+        # blank rather than waiting while the history is still being fetched
+        if datasets_ready('all_orders', 'dividends'):
+            symbol_metrics = st.session_state.analyzer.get_symbol_metrics()
+            dividends_by_symbol = {symbol: metrics['total_dividend_amount'] for symbol, metrics in symbol_metrics.items()}
+            symbol_dividends = symbols.map(dividends_by_symbol).fillna(0.0)
+        else:
+            symbol_dividends = pd.Series(float('nan'), index=symbols.index)
+        
+        df = pd.DataFrame({
+            'Symbol': symbols,
+            'Quantity': holdings['quantity'],
+            'Average Cost': holdings['average_buy_price'],
+            'Current Price': holdings['price'],
+            'Market Value': holdings['market_value'],
+            'Equity': holdings['equity'],
+            'Percent Change': holdings['percent_change'],
+            'Total Return': holdings['total_return_today'],
+            'Dividends': symbol_dividends,
+        })
         
         if not df.empty:
-            # Format the DataFrame for display
-            display_df = df.copy()
-            display_df['Average Cost'] = display_df['Average Cost'].apply(format_currency)
-            display_df['Current Price'] = display_df['Current Price'].apply(format_currency)
-            display_df['Market Value'] = display_df['Market Value'].apply(format_currency)
-            display_df['Equity'] = display_df['Equity'].apply(format_currency)
-            display_df['Percent Change'] = display_df['Percent Change'].apply(format_percentage)
-            display_df['Total Return'] = display_df['Total Return'].apply(format_currency)
-            
+            # Columns stay numeric; Streamlit formats them when rendering
             st.dataframe(
-                display_df,
+                df,
                 use_container_width=True,
                 hide_index=True,
                 column_config={
                     "Symbol": st.column_config.TextColumn("Symbol", width="small"),
-                    "Quantity": st.column_config.NumberColumn("Quantity", format="%.4f"),
-                    "Percent Change": st.column_config.TextColumn("% Change"),
+                    **number_column_config(
+                        currency=['Average Cost', 'Current Price', 'Market Value', 'Equity', 'Total Return', 'Dividends'],
+                        percentage=['Percent Change'],
+                        quantity=['Quantity'],
+                        labels={'Percent Change': '% Change'},
+                    ),
                 }
             )
             
@@ -280,10 +403,9 @@ def display_holdings():
             st.subheader("🔍 Stock Detail Analysis")
             
             # Create selectbox with stock symbols
-            symbols = [row['Symbol'] for row in holdings_data]
             selected_symbol = st.selectbox(
                 "Select a stock for detailed analysis:",
-                options=symbols,
+                options=df['Symbol'].tolist(),
                 help="Choose a stock to see detailed transaction history, dividends, and analytics"
             )
             
@@ -291,10 +413,10 @@ def display_holdings():
                 display_stock_details(selected_symbol)
             
             # Portfolio allocation chart
-            if len(holdings_data) > 1:
+            if len(df) > 1:
                 fig = px.pie(
-                    values=[item['Market Value'] for item in holdings_data],
-                    names=[item['Symbol'] for item in holdings_data],
+                    values=df['Market Value'],
+                    names=df['Symbol'],
                     title="Portfolio Allocation"
                 )
                 fig.update_traces(textposition='inside', textinfo='percent+label')
@@ -305,44 +427,43 @@ def display_holdings():
 
 def display_dividends():
     """Display dividend information"""
+    if not datasets_ready('dividends', 'total_dividends'):
+        loading_placeholder("dividend history", ('dividends', 'total_dividends'))
+        return
+    
     try:
-        dividends = st.session_state.analyzer.get_dividends()
-        total_dividends = st.session_state.analyzer.get_total_dividends()
+        dividends = load_frame('dividends')
+        total_dividends = load_data('total_dividends')
         
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.subheader("💰 Dividend History")
             
-            if dividends:
-                div_data = []
-                for div in dividends:
-                    div_data.append({
-                        'Date': div.get('paid_at', div.get('payable_date', 'N/A')),
-                        'Symbol': div.get('symbol', div.get('instrument', 'N/A')),
-                        'Amount': safe_float(div.get('amount', 0)),
-                        'Rate': safe_float(div.get('rate', 0)),
-                        'Position': safe_float(div.get('position', 0))
-                    })
+            if not dividends.empty:
+                df_div = pd.DataFrame({
+                    'Date': format_date_column(dividends['paid_at'].fillna(dividends['payable_date'])),
+                    'Symbol': dividends['symbol'].astype(str),
+                    'Amount': dividends['amount'],
+                    'Rate': dividends['rate'],
+                    'Position': dividends['position'],
+                })
                 
-                df_div = pd.DataFrame(div_data)
+                st.dataframe(
+                    df_div,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=number_column_config(currency=['Amount', 'Rate'])
+                )
                 
-                if not df_div.empty:
-                    df_div['Amount'] = df_div['Amount'].apply(format_currency)
-                    df_div['Rate'] = df_div['Rate'].apply(format_currency)
-                    
-                    st.dataframe(df_div, use_container_width=True, hide_index=True)
-                    
-                    # Dividend timeline chart
-                    if len(div_data) > 1:
-                        fig = px.bar(
-                            x=[item['Date'] for item in div_data],
-                            y=[item['Amount'] for item in div_data],
-                            title="Dividend Payments Over Time"
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.info("No dividend history available")
+                # Dividend timeline chart
+                if len(df_div) > 1:
+                    fig = px.bar(
+                        x=df_div['Date'],
+                        y=df_div['Amount'],
+                        title="Dividend Payments Over Time"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No dividend data available")
         
@@ -359,8 +480,20 @@ def display_dividends():
 def display_stock_details(symbol: str):
     """Display detailed analysis for a specific stock"""
     try:
+        cost_basis_method = st.radio(
+            "Cost basis method",
+            options=list(COST_BASIS_METHODS),
+            format_func=lambda method: 'Average cost' if method == 'average' else method.upper(),
+            horizontal=True,
+            key="cost_basis_method"
+        )
+        
+        if not datasets_ready('all_orders', 'dividends'):
+            loading_placeholder(f"{symbol} order and dividend history", ('all_orders', 'dividends'))
+            return
+        
         # Get comprehensive stock data
-        stock_data = st.session_state.analyzer.get_stock_summary(symbol)
+        stock_data = st.session_state.analyzer.get_stock_summary(symbol, cost_basis_method=cost_basis_method)
         
         if not stock_data:
             st.error(f"No data available for {symbol}")
@@ -371,6 +504,7 @@ def display_stock_details(symbol: str):
         # Display summary metrics
         metrics = stock_data.get('metrics', {})
         current_holding = stock_data.get('current_holding', {})
+        position = stock_data.get('position', {})
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -393,7 +527,8 @@ def display_stock_details(symbol: str):
             )
         
         with col4:
-            total_profit = safe_float(current_holding.get('equity', 0)) + metrics.get('total_dividend_amount', 0) - (metrics.get('calculated_avg_price', 0) * metrics.get('net_quantity', 0))
+            # Realized gains on sold lots + unrealized gains on open lots + dividends
+            total_profit = position.get('realized_pnl', 0) + position.get('unrealized_pnl', 0) + metrics.get('total_dividend_amount', 0)
             st.metric(
                 "Total Profit",
                 format_currency(total_profit)
@@ -404,58 +539,44 @@ def display_stock_details(symbol: str):
         
         with col_equity:
             st.markdown("#### 📈 Equity Transactions")
-            orders = stock_data.get('orders', [])
-            filled_orders = [o for o in orders if o.get('state') == 'filled']
+            orders = build_frame('orders', stock_data.get('orders', []))
+            filled_orders = orders[orders['state'] == 'filled']
             
-            if filled_orders:
-                equity_data = []
-                for order in filled_orders:
-                    qty = safe_float(order.get('quantity', 0))
-                    price = safe_float(order.get('price', 0))
-                    amount = qty * price
-                    date = order.get('created_at', '')[:10] if order.get('created_at') else 'N/A'
-                    
-                    equity_data.append({
-                        'Quantity': qty,
-                        'Price': price,
-                        'Amount': amount,
-                        'Date': date
-                    })
-                
-                equity_df = pd.DataFrame(equity_data)
-                equity_df['Price'] = equity_df['Price'].apply(lambda x: f"${x:.2f}")
-                equity_df['Amount'] = equity_df['Amount'].apply(format_currency)
-                
+            if not filled_orders.empty:
+                # Executed average price where known, else the order price
+                fill_price = filled_orders['average_price'].where(filled_orders['average_price'] > 0, filled_orders['price'])
+                equity_df = pd.DataFrame({
+                    'Quantity': filled_orders['quantity'],
+                    'Price': fill_price,
+                    'Amount': filled_orders['quantity'] * fill_price,
+                    'Date': format_date_column(filled_orders['created_at']),
+                })
                 st.dataframe(
                     equity_df,
                     use_container_width=True,
                     hide_index=True,
-                    height=300
+                    height=300,
+                    column_config=number_column_config(currency=['Price', 'Amount'])
                 )
             else:
                 st.info("No equity transactions found")
         
         with col_dividend:
             st.markdown("#### 💰 Dividend History")
-            dividends = stock_data.get('dividends', [])
+            dividends = build_frame('dividends', stock_data.get('dividends', []))
             
-            if dividends:
-                dividend_data = []
-                for div in dividends:
-                    dividend_data.append({
-                        'Quantity': safe_float(div.get('position', 0)),
-                        'Dividend Amount': safe_float(div.get('amount', 0)),
-                        'Date': div.get('paid_at', '')[:10] if div.get('paid_at') else 'N/A'
-                    })
-                
-                dividend_df = pd.DataFrame(dividend_data)
-                dividend_df['Dividend Amount'] = dividend_df['Dividend Amount'].apply(format_currency)
-                
+            if not dividends.empty:
+                dividend_df = pd.DataFrame({
+                    'Quantity': dividends['position'],
+                    'Dividend Amount': dividends['amount'],
+                    'Date': format_date_column(dividends['paid_at']),
+                })
                 st.dataframe(
                     dividend_df,
                     use_container_width=True,
                     hide_index=True,
-                    height=300
+                    height=300,
+                    column_config=number_column_config(currency=['Dividend Amount'])
                 )
             else:
                 st.info("No dividend history found")
@@ -467,6 +588,8 @@ def display_stock_details(symbol: str):
                 'Equity': format_currency(safe_float(current_holding.get('equity', 0))),
                 'Dividend': format_currency(metrics.get('total_dividend_amount', 0)),
                 'Total Quantity': f"{metrics.get('net_quantity', 0):.4f}",
+                'Realized P&L': format_currency(position.get('realized_pnl', 0)),
+                'Unrealized P&L': format_currency(position.get('unrealized_pnl', 0)),
                 'Total Profit': format_currency(total_profit)
             }
             
@@ -482,9 +605,77 @@ def display_stock_details(symbol: str):
             st.markdown(f"• Total Orders: {metrics.get('total_orders', 0)}")
             st.markdown(f"• Dividend Payments: {metrics.get('dividend_count', 0)}")
         
+        # Open tax lots under the selected cost basis method
+        lots = position.get('lots', [])
+        if lots:
+            with st.expander(f"🧾 Open Lots ({len(lots)})"):
+                lots_df = pd.DataFrame({
+                    'Acquired': format_date_column(parse_timestamp_column([lot['acquired_at'] for lot in lots])),
+                    'Quantity': [lot['quantity'] for lot in lots],
+                    'Cost/Share': [lot['price'] for lot in lots],
+                    'Cost Basis': [lot['cost'] for lot in lots],
+                    'Unrealized P&L': [lot.get('unrealized_pnl', 0.0) for lot in lots],
+                })
+                st.dataframe(
+                    lots_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config=number_column_config(
+                        currency=['Cost/Share', 'Cost Basis', 'Unrealized P&L'],
+                        quantity=['Quantity'],
+                    )
+                )
+        
     except Exception as e:
         st.error(f"Error loading stock details for {symbol}: {str(e)}")
 
+def display_returns():
+    """Display time-weighted/money-weighted returns and drawdowns over the order history"""
+    if not datasets_ready('all_orders', 'dividends'):
+        loading_placeholder("order and dividend history", ('all_orders', 'dividends'))
+        return
+    
+    try:
+        returns = st.session_state.analyzer.get_returns()
+        
+        if not returns:
+            st.info("Not enough order history to compute returns")
+            return
+        
+        st.markdown(f"#### 📈 Performance since {returns['start']:%Y-%m-%d}")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Time-Weighted Return", format_percentage(returns['twr'] * 100))
+        with col2:
+            annualized = returns.get('annualized_twr')
+            st.metric("Annualized TWR", format_percentage(annualized * 100) if annualized is not None else "N/A")
+        with col3:
+            irr = returns.get('xirr')
+            st.metric("Money-Weighted (XIRR)", format_percentage(irr * 100) if irr is not None else "N/A")
+        with col4:
+            st.metric(
+                "Max Drawdown",
+                format_percentage(returns['max_drawdown'] * 100),
+                f"on {returns['max_drawdown_day']:%Y-%m-%d}",
+                delta_color="off"
+            )
+        
+        series = returns['series']
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=series.index, y=series['value'], name="Portfolio Value"))
+        fig.update_layout(title="Portfolio Value", yaxis_tickprefix="$")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=series.index, y=(series['twr_index'] - 1) * 100, name="Cumulative TWR"))
+        fig.add_trace(go.Scatter(x=series.index, y=series['drawdown'] * 100, name="Drawdown", fill='tozeroy'))
+        fig.update_layout(title="Cumulative Return and Drawdown", yaxis_ticksuffix="%")
+        st.plotly_chart(fig, use_container_width=True)
+        
+    except Exception as e:
+        st.error(f"Error loading returns: {str(e)}")
+
 def display_orders():
     """Display order history"""
     try:
@@ -492,55 +683,45 @@ def display_orders():
         
         with col1:
             st.subheader("📋 Open Orders")
-            open_orders = st.session_state.analyzer.get_open_orders()
+            open_orders = load_frame('open_orders') if datasets_ready('open_orders') else None
             
-            if open_orders:
-                open_data = []
-                for order in open_orders:
-                    open_data.append({
-                        'Symbol': order.get('symbol', 'N/A'),
-                        'Side': order.get('side', 'N/A'),
-                        'Type': order.get('type', 'N/A'),
-                        'Quantity': safe_float(order.get('quantity', 0)),
-                        'Price': safe_float(order.get('price', 0)),
-                        'State': order.get('state', 'N/A'),
-                        'Created': order.get('created_at', 'N/A')[:10] if order.get('created_at') else 'N/A'
-                    })
-                
-                if open_data:
-                    df_open = pd.DataFrame(open_data)
-                    df_open['Price'] = df_open['Price'].apply(format_currency)
-                    st.dataframe(df_open, use_container_width=True, hide_index=True)
-                else:
-                    st.info("No open orders")
+            if open_orders is None:
+                loading_placeholder("open orders", ('open_orders',))
+            elif not open_orders.empty:
+                df_open = pd.DataFrame({
+                    'Symbol': open_orders['symbol'].astype(str),
+                    'Side': open_orders['side'].astype(str),
+                    'Type': open_orders['type'].astype(str),
+                    'Quantity': open_orders['quantity'],
+                    'Price': open_orders['price'],
+                    'State': open_orders['state'].astype(str),
+                    'Created': format_date_column(open_orders['created_at']),
+                })
+                st.dataframe(df_open, use_container_width=True, hide_index=True,
+                             column_config=number_column_config(currency=['Price']))
             else:
                 st.info("No open orders")
         
         with col2:
             st.subheader("📜 Recent Orders")
-            all_orders = st.session_state.analyzer.get_all_orders()
+            all_orders = load_frame('all_orders') if datasets_ready('all_orders') else None
             
-            if all_orders:
+            if all_orders is None:
+                loading_placeholder("order history", ('all_orders',))
+            elif not all_orders.empty:
                 # Show only recent orders (last 10)
-                recent_orders = all_orders[:10] if len(all_orders) > 10 else all_orders
+                recent_orders = all_orders.head(10)
                 
-                recent_data = []
-                for order in recent_orders:
-                    recent_data.append({
-                        'Symbol': order.get('symbol', 'N/A'),
-                        'Side': order.get('side', 'N/A'),
-                        'Quantity': safe_float(order.get('quantity', 0)),
-                        'Price': safe_float(order.get('price', 0)),
-                        'State': order.get('state', 'N/A'),
-                        'Date': order.get('created_at', 'N/A')[:10] if order.get('created_at') else 'N/A'
-                    })
-                
-                if recent_data:
-                    df_recent = pd.DataFrame(recent_data)
-                    df_recent['Price'] = df_recent['Price'].apply(format_currency)
-                    st.dataframe(df_recent, use_container_width=True, hide_index=True)
-                else:
-                    st.info("No recent orders")
+                df_recent = pd.DataFrame({
+                    'Symbol': recent_orders['symbol'].astype(str),
+                    'Side': recent_orders['side'].astype(str),
+                    'Quantity': recent_orders['quantity'],
+                    'Price': recent_orders['price'],
+                    'State': recent_orders['state'].astype(str),
+                    'Date': format_date_column(recent_orders['created_at']),
+                })
+                st.dataframe(df_recent, use_container_width=True, hide_index=True,
+                             column_config=number_column_config(currency=['Price']))
             else:
                 st.info("No order history available")
                 
@@ -558,6 +739,9 @@ def main():
         user_confirmation_popup()
         return
     
+    # Keep data fresh on a worker thread so reruns never wait on the API
+    st.session_state.analyzer.start_background_refresh(quote_interval=QUOTE_REFRESH_SECONDS)
+    
     # Main application layout
     st.title("📊 Robinhood Portfolio Dashboard")
     
@@ -566,14 +750,20 @@ def main():
         st.markdown(f"### Welcome!")
         st.markdown(f"**User:** {st.session_state.get('username', 'Unknown')}")
         
-        if st.session_state.last_refresh:
+        snapshot = st.session_state.analyzer.get_snapshot()
+        if snapshot:
+            st.markdown(f"**Snapshot Age:** {int(snapshot.age)}s")
+        elif st.session_state.last_refresh:
             st.markdown(f"**Last Updated:** {st.session_state.last_refresh.strftime('%H:%M:%S')}")
         
+        cache_stats = st.session_state.analyzer.get_cache_stats()
+        st.caption(f"Cache: {cache_stats['hits'] + cache_stats['stale_hits']} hits · {cache_stats['misses']} misses")
+        
         if st.button("🔄 Refresh Data"):
             with st.spinner("Refreshing portfolio data..."):
                 try:
-                    # Clear any cached data in analyzer
-                    st.session_state.analyzer.clear_cache()
+                    # Refresh in the background, or clear the cache if the refresher is not running
+                    st.session_state.analyzer.request_refresh()
                     st.session_state.last_refresh = datetime.now()
                     st.success("Data refreshed!")
                     st.rerun()
@@ -596,32 +786,31 @@ def main():
     # Portfolio summary at the top
     display_portfolio_summary()
     
-    # Main content tabs
-    tabs = st.tabs(["📈 Holdings", "💰 Dividends", "📋 Orders", "📊 Analytics"])
+    # Main content: unlike st.tabs, only the selected view runs, so the other
+    # views' data is never read (or waited for) until it is opened
+    active_tab = st.segmented_control(
+        "View", options=TABS, default=TABS[0], key="active_tab", label_visibility="collapsed"
+    ) or TABS[0]
     
-    with tabs[0]:
+    if active_tab == TABS[0]:
         display_holdings()
     
-    with tabs[1]:
+    elif active_tab == TABS[1]:
         display_dividends()
     
-    with tabs[2]:
+    elif active_tab == TABS[2]:
         display_orders()
     
-    with tabs[3]:
+    elif active_tab == TABS[3]:
         st.subheader("📊 Portfolio Analytics")
-        st.info("Advanced analytics features coming soon...")
         
         # Basic performance metrics
         try:
-            holdings = st.session_state.analyzer.get_holdings()
-            if holdings:
+            holdings = load_frame('holdings')
+            if not holdings.empty:
                 # Calculate some basic metrics
-                total_value = sum(safe_float(holding.get('equity', 0)) for holding in holdings.values())
-                total_cost = sum(
-                    safe_float(holding.get('average_buy_price', 0)) * safe_float(holding.get('quantity', 0)) 
-                    for holding in holdings.values()
-                )
+                total_value = holdings['equity'].sum()
+                total_cost = (holdings['average_buy_price'] * holdings['quantity']).sum()
                 
                 if total_cost > 0:
                     total_return = total_value - total_cost
@@ -642,6 +831,12 @@ def main():
                         )
         except Exception as e:
             st.error(f"Error calculating analytics: {str(e)}")
+        
+        display_returns()
+    
+    # The analyzer only records errors (it may run on worker threads); show them here
+    for message in st.session_state.analyzer.take_errors():
+        st.error(message)
     
     # Update last refresh time
     if not st.session_state.last_refresh:
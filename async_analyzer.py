@@ -0,0 +1,510 @@
+"""
+Asynchronous data access for a PortfolioAnalyzer over one pooled httpx client
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+try:
+    import httpx
+except ImportError:  # optional: pip install httpx (the 'async' extra)
+    httpx = None
+
+from http_session import DEFAULT_BACKOFF, DEFAULT_POOL_SIZE, DEFAULT_RETRIES, DEFAULT_TIMEOUT
+from portfolio_analyzer import QUOTE_BATCH_SIZE, holding_from_position, latest_price
+
+API_URL = 'https://api.robinhood.com'
+
+# Requests in flight at once per async analyzer
+DEFAULT_CONCURRENCY = 8
+
+# Responses retried with backoff, like the synchronous sessions
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Datasets loaded by refresh_all(), as cache keys
+REFRESH_DATASETS = ('holdings', 'open_orders', 'all_orders', 'dividends', 'account_info')
+
+
+class AsyncPortfolioAnalyzer:
+    """
+    Async counterpart of PortfolioAnalyzer for one logged in analyzer.
+
+    Requests go through a single pooled httpx.AsyncClient, at most
+    `concurrency` at a time, so independent fetches (positions, quotes,
+    fundamentals, instruments, order and dividend pages) overlap instead of
+    queueing. Raw payloads are handed to the wrapped analyzer's ingest steps,
+    which keeps one set of caches, ledgers, indexes and metrics: data loaded
+    here is what the synchronous getters serve, and the other way round.
+    Public market data (instruments, quotes, fundamentals) goes through the
+    analyzer's SharedCache, coalescing with every other analyzer.
+    Derived views (stock summaries, metrics, lots, returns) are computed by
+    the wrapped analyzer on a worker thread once their inputs are loaded.
+
+    Getters serve an expired dataset that is still inside the cache's stale
+    window while it reloads in the background. Otherwise load failures
+    propagate: NotLoggedInError when there is no session, httpx errors when
+    Robinhood rejects or fails a request.
+    """
+
+    def __init__(self, analyzer, concurrency: int = DEFAULT_CONCURRENCY, pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF):
+        """
+        Args:
+            analyzer: Logged in PortfolioAnalyzer whose session token and state are shared
+            concurrency: Maximum requests in flight at once
+            pool_size: Maximum pooled connections
+            timeout: Timeout per request in seconds
+            retries: Retries for 429/5xx responses and connection errors
+            backoff: Backoff factor between retries in seconds
+        """
+        if httpx is None:
+            raise ImportError("AsyncPortfolioAnalyzer requires httpx (pip install httpx)")
+        self._analyzer = analyzer
+        self._concurrency = max(1, concurrency)
+        self._pool_size = max(1, pool_size)
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._client: Optional['httpx.AsyncClient'] = None
+        self._limit: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __aenter__(self) -> 'AsyncPortfolioAnalyzer':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._limit = None
+
+    async def refresh(self, cache_key: str) -> Any:
+        """
+        Reload one dataset into the shared cache, raising on failure
+
+        Args:
+            cache_key: Dataset to reload ('holdings', 'open_orders', 'all_orders', 'dividends',
+                'account_info'), or 'quotes' to only reprice the cached holdings
+
+        Returns:
+            The freshly loaded dataset (the holdings for 'quotes')
+        """
+        self._analyzer.check_login()
+        if cache_key == 'quotes':
+            return await self._load('quotes', self._refresh_quotes)
+        loaders = {
+            'holdings': self._load_holdings,
+            'open_orders': self._load_open_orders,
+            'all_orders': self._load_all_orders,
+            'dividends': self._load_dividends,
+            'account_info': self._load_account_info,
+        }
+        return await self._load(cache_key, loaders[cache_key])
+
+    async def refresh_all(self, datasets: Iterable[str] = REFRESH_DATASETS) -> Dict[str, Any]:
+        """
+        Reload several datasets concurrently
+
+        Args:
+            datasets: Datasets to reload, as accepted by refresh()
+
+        Returns:
+            Dict mapping each dataset that loaded to its data; failures are
+            reported and left out so the previous data keeps being served
+        """
+        datasets = list(datasets)
+        results = await asyncio.gather(*(self.refresh(dataset) for dataset in datasets), return_exceptions=True)
+        loaded = {}
+        for dataset, result in zip(datasets, results):
+            if isinstance(result, Exception):
+                print(f"Async refresh of {dataset} failed: {str(result)}")
+            else:
+                loaded[dataset] = result
+        return loaded
+
+    async def get_holdings(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get current stock holdings
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Dict containing holdings data
+        """
+        return await self._get('holdings', self._load_holdings, force_refresh)
+
+    async def get_dividends(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get dividend information
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of dividend records
+        """
+        return await self._get('dividends', self._load_dividends, force_refresh)
+
+    async def get_total_dividends(self, force_refresh: bool = False) -> str:
+        """
+        Get total dividends earned
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            String representation of total dividends
+        """
+        await self.get_dividends(force_refresh)
+        return await asyncio.to_thread(self._analyzer.get_total_dividends)
+
+    async def get_open_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get all open stock orders
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of open orders
+        """
+        return await self._get('open_orders', self._load_open_orders, force_refresh)
+
+    async def get_all_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get all stock orders (including completed)
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of all orders
+        """
+        return await self._get('all_orders', self._load_all_orders, force_refresh)
+
+    async def get_account_info(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get basic account information
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Dict containing account information
+        """
+        return await self._get('account_info', self._load_account_info, force_refresh)
+
+    async def get_stock_orders_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get all orders for a specific stock symbol
+
+        Args:
+            symbol: Stock symbol to filter by
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of orders for the specified symbol
+        """
+        await self.get_all_orders(force_refresh)
+        return await asyncio.to_thread(self._analyzer.get_stock_orders_by_symbol, symbol)
+
+    async def get_stock_dividends_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get all dividends for a specific stock symbol
+
+        Args:
+            symbol: Stock symbol to filter by
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            List of dividends for the specified symbol
+        """
+        await self.get_dividends(force_refresh)
+        return await asyncio.to_thread(self._analyzer.get_stock_dividends_by_symbol, symbol)
+
+    async def get_stock_summary(self, symbol: str, force_refresh: bool = False,
+                                cost_basis_method: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get comprehensive summary for a specific stock
+
+        Args:
+            symbol: Stock symbol
+            force_refresh: Force refresh of cached data
+            cost_basis_method: Lot matching method for 'position' (defaults to the analyzer's)
+
+        Returns:
+            Dict containing comprehensive stock data
+        """
+        await self._load_history(force_refresh, holdings=True)
+        return await asyncio.to_thread(self._analyzer.get_stock_summary, symbol, False, cost_basis_method)
+
+    async def get_symbol_metrics(self, force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Get position metrics for every symbol with order or dividend history
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Dict mapping symbol to metrics (quantities, cost, dividends, order counts)
+        """
+        await self._load_history(force_refresh)
+        return await asyncio.to_thread(self._analyzer.get_symbol_metrics)
+
+    async def get_position_lots(self, symbol: str, cost_basis_method: Optional[str] = None,
+                                force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get the open tax lots and realized P&L of one symbol
+
+        Args:
+            symbol: Stock symbol
+            cost_basis_method: Lot matching method (defaults to the analyzer's)
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Position dict as returned by PortfolioAnalyzer.get_position_lots()
+        """
+        await asyncio.gather(self.get_holdings(force_refresh), self.get_all_orders(force_refresh))
+        return await asyncio.to_thread(self._analyzer.get_position_lots, symbol, cost_basis_method)
+
+    async def get_returns(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get time-weighted and money-weighted returns over the order history
+
+        Args:
+            force_refresh: Force refresh of cached data
+
+        Returns:
+            Returns dict as returned by PortfolioAnalyzer.get_returns()
+        """
+        await self._load_history(force_refresh)
+        return await asyncio.to_thread(self._analyzer.get_returns)
+
+    async def _get(self, key: str, loader: Callable[[], Awaitable[Any]], force_refresh: bool) -> Any:
+        """
+        Serve a dataset from the shared cache, loading it when missing or expired
+
+        A stale entry is returned at once and reloaded in the background, like
+        TTLCache.get_or_load(); past its stale window the load runs inline and
+        its errors reach the caller.
+        """
+        self._analyzer.check_login()
+        if not force_refresh:
+            value = self._analyzer.cached(key)
+            if value is not None:
+                return value
+            value = self._analyzer.cached(key, allow_stale=True)
+            if value is not None:
+                self._revalidate(key, loader)
+                return value
+        return await self._load(key, loader)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a loader at most once at a time per key; concurrent callers share its result"""
+        # A cancelled caller must not cancel the load the other callers are waiting on
+        return await asyncio.shield(self._start(key, loader))
+
+    def _start(self, key: str, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Return the running load of a key, starting one if there is none"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _revalidate(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        """Reload a stale dataset in the background; on failure the stale copy keeps being served"""
+        def report(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is not None:
+                print(f"Background refresh of '{key}' failed: {str(task.exception())}")
+
+        self._start(key, loader).add_done_callback(report)
+
+    async def _load_history(self, force_refresh: bool, holdings: bool = False):
+        """Load the order and dividend history (and holdings) concurrently"""
+        loads = [self.get_all_orders(force_refresh), self.get_dividends(force_refresh)]
+        if holdings:
+            loads.append(self.get_holdings(force_refresh))
+        await asyncio.gather(*loads)
+
+    async def _load_holdings(self) -> Dict[str, Any]:
+        """Fetch positions, then their instruments, quotes and fundamentals concurrently"""
+        positions = [item for item in await self._get_all(f'{API_URL}/positions/', {'nonzero': 'true'}) if item]
+        instruments = await self._get_instruments(item.get('instrument', '') for item in positions)
+        symbols = sorted({data['symbol'].upper() for data in instruments.values()})
+        quotes, fundamentals = await asyncio.gather(
+            self._get_by_symbol('quotes', symbols), self._get_by_symbol('fundamentals', symbols)
+        )
+
+        # Positions without a quote are skipped, like build_holdings does
+        holdings = {}
+        for item in positions:
+            instrument = instruments.get(item.get('instrument', ''))
+            if instrument is None:
+                continue
+            symbol = instrument['symbol'].upper()
+            price = latest_price(quotes.get(symbol) or {})
+            if price:
+                holdings[instrument['symbol']] = holding_from_position(item, instrument, price, fundamentals.get(symbol) or {})
+
+        processed = await asyncio.to_thread(self._analyzer.ingest, 'holdings', holdings)
+        return self._analyzer.store('holdings', processed)
+
+    async def _refresh_quotes(self) -> Dict[str, Any]:
+        """Reprice the cached holdings from batched quotes requests"""
+        holdings = self._analyzer.cached('holdings', allow_stale=True)
+        if not holdings:
+            return await self._load('holdings', self._load_holdings)
+        quotes = await self._get_by_symbol('quotes', list(holdings))
+        return self._analyzer.apply_quotes(holdings, list(quotes.values()))
+
+    async def _load_open_orders(self) -> List[Dict[str, Any]]:
+        orders = [order for order in await self._get_all(f'{API_URL}/orders/') if order]
+        open_orders = [order for order in orders if order.get('cancel') is not None]
+        await self._resolve_symbols(open_orders)
+        processed = await asyncio.to_thread(self._analyzer.ingest, 'open_orders', open_orders)
+        return self._analyzer.store('open_orders', processed)
+
+    async def _load_all_orders(self) -> List[Dict[str, Any]]:
+        # Only orders created or updated since the newest one we have can differ;
+        # finding it reads the ledger from disk, so that runs off the event loop
+        cursor = await asyncio.to_thread(self._analyzer.order_sync_cursor)
+        orders = await self._get_all(f'{API_URL}/orders/', {'updated_at[gte]': cursor} if cursor else None)
+        await self._resolve_symbols(orders)
+        processed = await asyncio.to_thread(self._analyzer.ingest, 'all_orders', orders)
+        return self._analyzer.store('all_orders', processed)
+
+    async def _load_dividends(self) -> List[Dict[str, Any]]:
+        scan = await asyncio.to_thread(self._analyzer.dividend_scan)
+        async for page in self._get_pages(f'{API_URL}/dividends/'):
+            if not scan(page):
+                break
+        await self._resolve_symbols(scan.fresh)
+        processed = await asyncio.to_thread(self._analyzer.ingest, 'dividends', scan.fresh)
+        return self._analyzer.store('dividends', processed)
+
+    async def _load_account_info(self) -> Dict[str, Any]:
+        profile, account, portfolio = await asyncio.gather(
+            self._request(f'{API_URL}/user/basic_info/'),
+            self._request(f'{API_URL}/accounts/'),
+            self._request(f'{API_URL}/portfolios/'),
+        )
+        return self._analyzer.store('account_info', {
+            'profile': profile or {},
+            'account': ((account or {}).get('results') or [{}])[0],
+            'portfolio': ((portfolio or {}).get('results') or [{}])[0],
+        })
+
+    async def _resolve_symbols(self, records: List[Dict[str, Any]]):
+        """Fetch the instruments the analyzer cannot resolve yet, so ingesting needs no lookups"""
+        resolver = self._analyzer.instrument_resolver
+        await self._get_instruments(
+            record.get('instrument', '') for record in records
+            if record and record.get('instrument') and record['instrument'] not in resolver
+        )
+
+    async def _get_instruments(self, instrument_urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get instrument records, fetching each unknown URL once and concurrently
+
+        Args:
+            instrument_urls: Instrument URLs, duplicates allowed
+
+        Returns:
+            Dict mapping each URL that could be fetched to its instrument record
+        """
+        async def load(missing: List[str]) -> Dict[str, Dict[str, Any]]:
+            results = await asyncio.gather(*(self._request(url) for url in missing), return_exceptions=True)
+            records = {}
+            for url, data in zip(missing, results):
+                if isinstance(data, Exception):
+                    # Failed lookups are not remembered so they can be retried later
+                    print(f"Instrument lookup failed for {url}: {str(data)}")
+                elif isinstance(data, dict) and 'symbol' in data:
+                    records[url] = data
+            return records
+
+        instruments = await self._analyzer.shared_cache.aget_many_or_load('instruments', instrument_urls, load)
+        self._analyzer.instrument_resolver.seed({url: data['symbol'] for url, data in instruments.items()})
+        return instruments
+
+    async def _get_by_symbol(self, endpoint: str, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch a per-symbol endpoint ('quotes', 'fundamentals') through the shared cache, in concurrent batches"""
+        async def load(missing: List[str]) -> Dict[str, Dict[str, Any]]:
+            batches = [missing[i:i + QUOTE_BATCH_SIZE] for i in range(0, len(missing), QUOTE_BATCH_SIZE)]
+            pages = await asyncio.gather(*(
+                self._request(f'{API_URL}/{endpoint}/', {'symbols': ','.join(batch)}) for batch in batches
+            ))
+            records = {}
+            for page in pages:
+                for record in (page or {}).get('results') or []:
+                    if record and record.get('symbol'):
+                        records[record['symbol'].upper()] = record
+            return records
+
+        return await self._analyzer.shared_cache.aget_many_or_load(
+            endpoint, [symbol.upper() for symbol in symbols], load
+        )
+
+    async def _get_all(self, url: str, params: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """Fetch every page of a paginated endpoint"""
+        records = []
+        async for page in self._get_pages(url, params):
+            records.extend(page)
+        return records
+
+    async def _get_pages(self, url: str, params: Optional[Dict[str, str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Iterate over the pages of a paginated Robinhood endpoint
+
+        Args:
+            url: First page URL
+            params: Query parameters of the first page (later page URLs carry their own)
+
+        Yields:
+            List of records on each page
+        """
+        while url:
+            data = await self._request(url, params)
+            if not data:
+                return
+            yield data.get('results', [])
+            url, params = data.get('next'), None
+
+    async def _request(self, url: str, params: Optional[Dict[str, str]] = None) -> Any:
+        """GET a JSON resource with the analyzer's token, retrying 429/5xx with backoff"""
+        headers = self._analyzer.auth_headers()
+        client = self._get_client()
+        for attempt in range(self._retries + 1):
+            # Only the request holds a slot; backoff sleeps leave it to other requests
+            async with self._limit:
+                response = await client.get(url, params=params, headers=headers)
+            if response.status_code in RETRY_STATUSES and attempt < self._retries:
+                await asyncio.sleep(self._retry_delay(response, attempt))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def _retry_delay(self, response: 'httpx.Response', attempt: int) -> float:
+        retry_after = response.headers.get('Retry-After')
+        try:
+            return float(retry_after) if retry_after else self._backoff * (2 ** attempt)
+        except ValueError:
+            return self._backoff * (2 ** attempt)
+
+    def _get_client(self) -> 'httpx.AsyncClient':
+        if self._client is None:
+            # Transport-level retries cover connection errors; statuses are retried in _request
+            transport = httpx.AsyncHTTPTransport(
+                retries=self._retries,
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+            )
+            self._client = httpx.AsyncClient(transport=transport, timeout=self._timeout)
+            self._limit = asyncio.Semaphore(self._concurrency)
+        return self._client
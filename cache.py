@@ -0,0 +1,239 @@
+"""
+In-memory cache with per-key TTLs, LRU eviction and stale-while-revalidate
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'ttl')
+
+    def __init__(self, value: Any, stored_at: float, ttl: float):
+        self.value = value
+        self.stored_at = stored_at
+        self.ttl = ttl
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+
+class TTLCache:
+    """
+    A size-bounded cache where every key has its own time to live.
+
+    Entries younger than their TTL are fresh. Entries older than their TTL but
+    still inside the stale window are served as-is while a background refresh
+    runs (stale-while-revalidate). Anything older is reloaded synchronously.
+    When the cache grows past max_entries the least recently used entry is
+    evicted.
+    """
+
+    def __init__(self, default_ttl: float = 300, max_entries: int = 64,
+                 ttls: Optional[Dict[str, float]] = None, stale_ttl: Optional[float] = None):
+        """
+        Args:
+            default_ttl: TTL in seconds for keys without an explicit TTL
+            max_entries: Maximum number of entries kept before LRU eviction
+            ttls: Per-key TTL overrides
+            stale_ttl: How long past its TTL an entry may be served stale
+                (defaults to the entry's own TTL)
+        """
+        self._default_ttl = default_ttl
+        self._max_entries = max(1, max_entries)
+        self._ttls = dict(ttls or {})
+        self._stale_ttl = stale_ttl
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._refreshing = set()
+        self._generation = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def ttl_for(self, key: str) -> float:
+        """Return the TTL configured for a key"""
+        return self._ttls.get(key, self._default_ttl)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.age(time.time()) < entry.ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a fresh value without triggering any load
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.age(time.time()) >= entry.ttl:
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry.value
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """
+        Get a value that is fresh or still inside its stale window, without triggering any load
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or past its stale window
+
+        Returns:
+            Cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = entry.age(time.time())
+                if age < entry.ttl + self._stale_window(entry):
+                    self._entries.move_to_end(key)
+                    self._stats['hits' if age < entry.ttl else 'stale_hits'] += 1
+                    return entry.value
+            self._stats['misses'] += 1
+            return default
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Return any stored value, fresh or stale, without touching stats or LRU order"""
+        entry = self._entries.get(key)
+        return default if entry is None else entry.value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, stored_at: Optional[float] = None):
+        """
+        Store a value
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: TTL override for this entry
+            stored_at: Timestamp the value was produced at (defaults to now)
+        """
+        with self._lock:
+            self._entries[key] = _Entry(
+                value,
+                stored_at if stored_at is not None else time.time(),
+                ttl if ttl is not None else self.ttl_for(key),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def update(self, key: str, value: Any) -> bool:
+        """
+        Replace a stored value without changing its age or TTL
+
+        Used for partial refreshes (e.g. new prices on cached positions) that
+        must not make the rest of the entry look freshly loaded.
+
+        Args:
+            key: Cache key
+            value: Replacement value
+
+        Returns:
+            bool: False if the key is not stored (nothing was written)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.value = value
+            return True
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove a key and return its value"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry.value
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            # Background refreshes started before the clear must not repopulate it
+            self._generation += 1
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], force_refresh: bool = False) -> Any:
+        """
+        Return a cached value, loading it when missing or expired
+
+        Empty results (None, {}, []) are returned but not cached so the next
+        call tries again.
+
+        Args:
+            key: Cache key
+            loader: Callable producing the value
+            force_refresh: Bypass the cache and reload synchronously
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        if not force_refresh:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    age = entry.age(time.time())
+                    stale_ttl = self._stale_window(entry)
+                    if age < entry.ttl:
+                        self._entries.move_to_end(key)
+                        self._stats['hits'] += 1
+                        return entry.value
+                    if age < entry.ttl + stale_ttl:
+                        self._entries.move_to_end(key)
+                        self._stats['stale_hits'] += 1
+                        self._revalidate(key, loader)
+                        return entry.value
+                self._stats['misses'] += 1
+
+        generation = self._generation
+        value = loader()
+        with self._lock:
+            if value and generation == self._generation:
+                self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict with hits, stale_hits, misses, evictions and current size
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def _stale_window(self, entry: _Entry) -> float:
+        return self._stale_ttl if self._stale_ttl is not None else entry.ttl
+
+    def _revalidate(self, key: str, loader: Callable[[], Any]):
+        """Refresh a stale key in the background, at most once at a time"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        generation = self._generation
+
+        def refresh():
+            try:
+                value = loader()
+                with self._lock:
+                    if value and generation == self._generation:
+                        self.set(key, value)
+            except Exception as e:
+                print(f"Background refresh of '{key}' failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{key}", daemon=True).start()
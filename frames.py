@@ -0,0 +1,132 @@
+"""
+Typed pandas frames of the analyzer's holdings, orders and dividends
+"""
+
+import threading
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from utils import parse_timestamp_column
+
+# Column name -> dtype kind for every dataset. 'float' columns are float64
+# (missing values become 0.0 unless listed in NULLABLE), 'datetime' columns are
+# UTC datetime64, 'category' columns are pandas categoricals and 'string'
+# columns hold plain strings ('' when missing).
+COLUMNS = {
+    'holdings': {
+        'symbol': 'category', 'name': 'string', 'type': 'category', 'id': 'string',
+        'quantity': 'float', 'average_buy_price': 'float', 'equity': 'float',
+        'market_value': 'float', 'price': 'float', 'percent_change': 'float',
+        'total_return_today': 'float', 'total_return_today_percent': 'float',
+        'equity_change': 'float', 'pe_ratio': 'float', 'dividend_yield': 'float',
+    },
+    'orders': {
+        'id': 'string', 'symbol': 'category', 'side': 'category', 'type': 'category',
+        'time_in_force': 'category', 'state': 'category', 'quantity': 'float', 'price': 'float',
+        'created_at': 'datetime', 'updated_at': 'datetime', 'executed_at': 'datetime',
+        'instrument': 'string', 'average_price': 'float', 'cumulative_quantity': 'float',
+    },
+    'dividends': {
+        'id': 'string', 'symbol': 'category', 'state': 'category', 'amount': 'float',
+        'rate': 'float', 'position': 'float', 'paid_at': 'datetime', 'payable_date': 'datetime',
+        'record_date': 'datetime', 'instrument': 'string',
+    },
+}
+
+# Float columns where a missing value means "unknown" rather than zero
+NULLABLE = ('pe_ratio', 'dividend_yield')
+
+# Analyzer dataset -> frame schema
+DATASET_SCHEMAS = {
+    'holdings': 'holdings',
+    'open_orders': 'orders',
+    'all_orders': 'orders',
+    'dividends': 'dividends',
+}
+
+
+def build_frame(schema: str, records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Build a typed frame from the analyzer's string-valued records
+
+    Args:
+        schema: Schema name in COLUMNS ('holdings', 'orders' or 'dividends')
+        records: Records in the analyzer's format
+
+    Returns:
+        DataFrame with one typed column per schema column, in schema order
+    """
+    columns = COLUMNS[schema]
+    raw = pd.DataFrame.from_records(list(records), columns=list(columns))
+
+    frame = {}
+    for name, kind in columns.items():
+        column = raw[name]
+        if kind == 'float':
+            values = pd.to_numeric(column.replace('', None), errors='coerce').astype('float64')
+            frame[name] = values if name in NULLABLE else values.fillna(0.0)
+        elif kind == 'datetime':
+            frame[name] = parse_timestamp_column(column)
+        elif kind == 'category':
+            frame[name] = column.fillna('').astype(str).astype('category')
+        else:
+            frame[name] = column.fillna('').astype(str)
+    return pd.DataFrame(frame, columns=list(columns))
+
+
+def holdings_frame(holdings: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Build the holdings frame
+
+    Args:
+        holdings: Symbol -> holding, as returned by get_holdings()
+
+    Returns:
+        DataFrame with one row per holding
+    """
+    return build_frame('holdings', [dict(data, symbol=symbol) for symbol, data in holdings.items()])
+
+
+class FrameCache:
+    """
+    Typed frames keyed by dataset, rebuilt only when the underlying records change.
+
+    Frames are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._sources: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def frame(self, dataset: str, records: Any) -> pd.DataFrame:
+        """
+        Get the frame of a dataset
+
+        Args:
+            dataset: Analyzer dataset ('holdings', 'open_orders', 'all_orders', 'dividends')
+            records: Current records of the dataset
+
+        Returns:
+            Cached frame if the records are the ones it was built from, otherwise a new one
+        """
+        with self._lock:
+            if self._sources.get(dataset) is records and dataset in self._frames:
+                return self._frames[dataset]
+
+        if dataset == 'holdings':
+            frame = holdings_frame(records or {})
+        else:
+            frame = build_frame(DATASET_SCHEMAS[dataset], records or [])
+
+        with self._lock:
+            self._frames[dataset] = frame
+            self._sources[dataset] = records
+        return frame
+
+    def clear(self):
+        """Drop every cached frame"""
+        with self._lock:
+            self._frames.clear()
+            self._sources.clear()
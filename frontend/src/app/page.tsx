@@ -15,6 +15,7 @@ interface LoginForm {
 
 export default function Home() {
   const [isLoggedIn, setIsLoggedIn] = useState(false)
+  const [token, setToken] = useState<string | null>(null)
   const [isLoading, setIsLoading] = useState(false)
   const [loginForm, setLoginForm] = useState<LoginForm>({
     username: '',
@@ -42,6 +43,7 @@ export default function Home() {
       const data = await response.json()
       
       if (data.success) {
+        setToken(data.token)
         setIsLoggedIn(true)
       } else {
         alert(data.message || 'Login failed')
@@ -149,10 +151,10 @@ export default function Home() {
     )
   }
 
-  return <Dashboard />
+  return <Dashboard token={token} />
 }
 
-function Dashboard() {
+function Dashboard({ token }: { token: string | null }) {
   const [portfolioData, setPortfolioData] = useState<any>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
@@ -160,7 +162,10 @@ function Dashboard() {
   const fetchPortfolioData = async () => {
     try {
       setLoading(true)
-      const response = await fetch('http://localhost:8002/api/portfolio/summary')
+      // The browser revalidates with If-None-Match, so unchanged data comes back as 304
+      const response = await fetch('http://localhost:8002/api/portfolio/summary', {
+        headers: { Authorization: `Bearer ${token}` },
+      })
       const data = await response.json()
       if (data.success) {
         setPortfolioData(data.data)
@@ -185,6 +190,50 @@ function Dashboard() {
     fetchPortfolioData()
   }, [])
 
+  // Live updates: the server pushes only the holdings fields that changed
+  useEffect(() => {
+    if (!token) return
+    let holdings: Record<string, any> | null = null
+    const source = new EventSource(
+      `http://localhost:8002/api/portfolio/stream?token=${encodeURIComponent(token)}`
+    )
+
+    const apply = (totalDividends?: string | null) => {
+      setPortfolioData((previous: any) => {
+        if (!previous) return previous
+        const next = { ...previous }
+        if (holdings) {
+          const positions = Object.values(holdings)
+          next.total_equity = positions.reduce((sum: number, data: any) => sum + (parseFloat(data.equity) || 0), 0)
+          next.total_market_value = next.total_equity
+          next.total_positions = positions.length
+        }
+        if (totalDividends != null) next.total_dividends = parseFloat(totalDividends) || 0
+        return next
+      })
+    }
+
+    source.addEventListener('snapshot', (event) => {
+      const state = JSON.parse((event as MessageEvent).data)
+      holdings = state.holdings
+      apply(state.total_dividends)
+    })
+    source.addEventListener('update', (event) => {
+      const diff = JSON.parse((event as MessageEvent).data)
+      if (diff.holdings || diff.removed) {
+        holdings = { ...(holdings || {}) }
+        for (const [symbol, fields] of Object.entries(diff.holdings || {})) {
+          holdings[symbol] = { ...(holdings[symbol] || {}), ...(fields as object) }
+        }
+        for (const symbol of diff.removed || []) delete holdings[symbol]
+      }
+      apply(diff.total_dividends)
+    })
+    source.addEventListener('end', () => source.close())
+
+    return () => source.close()
+  }, [token])
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
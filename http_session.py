@@ -0,0 +1,133 @@
+"""
+Per-analyzer HTTP sessions for robin_stocks
+
+robin_stocks sends every request through one process-global requests.Session.
+This module swaps that global for a router that forwards to whichever session
+is bound in the current context, so each PortfolioAnalyzer can authenticate
+and fetch through its own session without touching anyone else's.
+"""
+
+import contextlib
+import contextvars
+import functools
+from typing import Any, Callable, Optional
+
+import requests
+import robin_stocks.robinhood.helper as rh_helper
+from requests.adapters import HTTPAdapter
+from robin_stocks.robinhood.globals import SESSION as DEFAULT_SESSION
+from urllib3.util.retry import Retry
+
+# Connection pool and retry defaults for analyzer sessions
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 15
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar('robinhood_session', default=None)
+
+
+class PooledSession(requests.Session):
+    """
+    A requests.Session that applies a default timeout to every request.
+
+    robin_stocks never passes a timeout for GET requests, so without this a
+    stalled connection would block a worker forever.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+
+class SessionRouter:
+    """
+    Stand-in for robin_stocks' global SESSION.
+
+    Attribute access is forwarded to the session bound with bind_session(), or
+    to the original global session when nothing is bound.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_current_session.get() or DEFAULT_SESSION, name)
+
+
+def install_router():
+    """Route robin_stocks requests through the context-bound session (idempotent)"""
+    if not isinstance(rh_helper.SESSION, SessionRouter):
+        rh_helper.SESSION = SessionRouter()
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                   backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT) -> requests.Session:
+    """
+    Create a new unauthenticated session with robin_stocks' default headers
+
+    Connections are kept alive in a pool sized for concurrent fan-out, and
+    idempotent requests are retried with backoff on connection errors, 429
+    and 5xx responses (honouring Retry-After).
+
+    Args:
+        pool_size: Maximum number of pooled connections per host
+        retries: Retries for failed GET requests
+        backoff: Backoff factor between retries in seconds
+        timeout: Default timeout for requests that do not set one
+
+    Returns:
+        requests.Session
+    """
+    session = PooledSession(timeout)
+    session.headers.update(DEFAULT_SESSION.headers)
+    session.headers.pop('Authorization', None)
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@contextlib.contextmanager
+def bind_session(session: Optional[requests.Session]):
+    """
+    Make robin_stocks calls in this context use the given session
+
+    Args:
+        session: Session to bind (None falls back to the global session)
+    """
+    install_router()
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+
+
+def bound(session: Optional[requests.Session], func: Callable) -> Callable:
+    """
+    Wrap a callable so it runs with the session bound, on whatever thread calls it
+
+    Args:
+        session: Session to bind
+        func: Callable to wrap
+
+    Returns:
+        Wrapped callable
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with bind_session(session):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,213 @@
+"""
+Instrument URL to symbol resolution for the Robinhood Portfolio Analyzer
+"""
+
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+import robin_stocks.robinhood as r
+
+from shared_cache import SharedCache
+
+DEFAULT_STORE_PATH = os.path.join('.cache', 'instruments.json')
+
+
+class RateLimitedError(Exception):
+    """Raised when Robinhood still answers an instrument request with HTTP 429 after the session's retries"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Rate limited by Robinhood")
+        self.retry_after = retry_after
+
+
+class InstrumentResolver:
+    """
+    Resolve Robinhood instrument URLs to ticker symbols.
+
+    Instrument URLs and their symbols never change, so every URL is fetched at
+    most once: results are kept in an in-process dictionary and mirrored to a
+    small JSON file on disk that later sessions load on startup. Batches of
+    unknown URLs are fetched concurrently through a bounded thread pool.
+    Full instrument records are kept in a SharedCache, so resolvers sharing
+    one never fetch the same instrument twice, even at the same time.
+    """
+
+    def __init__(self, store_path: Optional[str] = DEFAULT_STORE_PATH,
+                 fetch_instrument: Optional[Callable[[str], Optional[Dict]]] = None,
+                 max_workers: int = 8, timeout: float = 10.0, shared_cache: Optional[SharedCache] = None):
+        """
+        Args:
+            store_path: JSON file used to persist resolved symbols (None disables persistence)
+            fetch_instrument: Callable returning instrument data for a URL
+            max_workers: Maximum number of concurrent instrument requests
+            timeout: Per-request timeout in seconds
+            shared_cache: Cache for instrument records (a private in-memory one if omitted)
+        """
+        self._store_path = store_path
+        self._fetch_instrument = fetch_instrument or self._get_instrument
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout
+        self._shared_cache = shared_cache if shared_cache is not None else SharedCache()
+        self._symbols: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def __contains__(self, instrument_url: str) -> bool:
+        return instrument_url in self._symbols
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def symbols(self) -> Dict[str, str]:
+        """Return a copy of every known URL to symbol mapping"""
+        with self._lock:
+            return dict(self._symbols)
+
+    def seed(self, symbols: Dict[str, str]):
+        """
+        Add already known URL to symbol mappings, e.g. from a snapshot
+
+        Args:
+            symbols: Dict mapping instrument URL to symbol
+        """
+        known = {url: symbol for url, symbol in symbols.items() if url and symbol and url not in self._symbols}
+        if known:
+            with self._lock:
+                self._symbols.update(known)
+            self._save()
+
+    def resolve(self, instrument_url: str) -> str:
+        """
+        Resolve a single instrument URL to its symbol
+
+        Args:
+            instrument_url: URL of the instrument
+
+        Returns:
+            Stock symbol or 'N/A' if not found
+        """
+        if not instrument_url:
+            return 'N/A'
+
+        symbol = self._symbols.get(instrument_url)
+        if symbol is not None:
+            return symbol
+
+        # Failed lookups are not remembered so they can be retried later
+        return self.resolve_many([instrument_url])[instrument_url]
+
+    def resolve_many(self, instrument_urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Resolve several instrument URLs, fetching each unknown URL once and concurrently
+
+        Args:
+            instrument_urls: Instrument URLs, duplicates allowed
+
+        Returns:
+            Dict mapping each URL to its symbol ('N/A' if not found)
+        """
+        urls = {url for url in instrument_urls if url}
+        missing = [url for url in urls if url not in self._symbols]
+        if missing:
+            self.instruments(missing)
+        return {url: self._symbols.get(url, 'N/A') for url in urls}
+
+    def instruments(self, instrument_urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get full instrument records (symbol, name, type, id, ...)
+
+        Args:
+            instrument_urls: Instrument URLs, duplicates allowed
+
+        Returns:
+            Dict mapping each URL that could be fetched to its instrument record
+        """
+        records = self._shared_cache.get_many_or_load('instruments', instrument_urls, self._fetch_many)
+
+        found = {url: record['symbol'] for url, record in records.items() if url not in self._symbols}
+        if found:
+            with self._lock:
+                self._symbols.update(found)
+            self._save()
+        return records
+
+    def _get_instrument(self, instrument_url: str) -> Optional[Dict]:
+        """
+        Fetch raw instrument data, surfacing rate limiting to the caller
+
+        429 responses are retried (honouring Retry-After) by the analyzer's
+        HTTP session, so one that gets here has exhausted those retries.
+        """
+        response = r.helper.SESSION.get(instrument_url, timeout=self._timeout)
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise RateLimitedError(retry_after)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_many(self, instrument_urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch instrument records concurrently through the bounded pool"""
+        workers = min(self._max_workers, len(instrument_urls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Each lookup runs in a copy of the caller's context so it uses the caller's bound HTTP session
+            futures = [executor.submit(contextvars.copy_context().run, self._lookup, url) for url in instrument_urls]
+            fetched = dict(zip(instrument_urls, (future.result() for future in futures)))
+        return {url: record for url, record in fetched.items() if record is not None}
+
+    def _lookup(self, instrument_url: str) -> Optional[Dict[str, Any]]:
+        """Fetch the instrument record from Robinhood, None if it has no symbol"""
+        try:
+            instrument_data = self._fetch_instrument(instrument_url)
+            if instrument_data and isinstance(instrument_data, dict) and 'symbol' in instrument_data:
+                return instrument_data
+            return None
+        except RateLimitedError:
+            print(f"Instrument lookup rate limited for {instrument_url}, giving up")
+            return None
+        except requests.exceptions.Timeout:
+            print(f"Instrument lookup timed out for {instrument_url}")
+            return None
+        except Exception as e:
+            print(f"Instrument lookup failed for {instrument_url}: {str(e)}")
+            return None
+
+    def _load(self):
+        """Load previously resolved symbols from disk"""
+        if not self._store_path or not os.path.isfile(self._store_path):
+            return
+
+        try:
+            with open(self._store_path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._symbols.update({str(k): str(v) for k, v in data.items()})
+        except (OSError, ValueError) as e:
+            print(f"Could not load instrument store {self._store_path}: {str(e)}")
+
+    def _save(self):
+        """Persist resolved symbols to disk"""
+        if not self._store_path:
+            return
+
+        with self._lock:
+            snapshot = dict(self._symbols)
+
+        try:
+            directory = os.path.dirname(self._store_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self._store_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self._store_path)
+        except OSError as e:
+            print(f"Could not save instrument store {self._store_path}: {str(e)}")
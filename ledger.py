@@ -0,0 +1,256 @@
+"""
+Persistent record ledgers used for incremental history syncs
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # pragma: no cover - cryptography ships with robin_stocks
+    Fernet = None
+    InvalidToken = Exception
+
+DEFAULT_LEDGER_DIR = os.path.join('.cache', 'ledgers')
+
+
+def ledger_path(kind: str, account_id: str, ledger_dir: str = DEFAULT_LEDGER_DIR) -> str:
+    """
+    Build the on-disk path of an account's ledger
+
+    Args:
+        kind: Ledger kind, e.g. 'orders'
+        account_id: Account identifier the ledger belongs to
+        ledger_dir: Directory holding ledger files
+
+    Returns:
+        str: Path of the ledger file (the account id is hashed, never stored in the name)
+    """
+    digest = hashlib.sha256(account_id.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(ledger_dir, f"{kind}_{digest}.json")
+
+
+class RecordLedger:
+    """
+    A JSON-backed collection of records keyed by id.
+
+    Records are merged in rather than replaced wholesale, so a sync only needs
+    to hand over what changed since the last one. With an encryption key the
+    file is a Fernet token of the JSON, like an encrypted snapshot.
+    """
+
+    version = 1
+
+    def __init__(self, path: Optional[str], key: str = 'id', encryption_key: Optional[str] = None):
+        """
+        Args:
+            path: JSON file backing the ledger (None keeps it in memory only)
+            key: Record field used as the primary key
+            encryption_key: Fernet key (urlsafe base64, 32 bytes) enabling encryption at rest
+        """
+        if encryption_key and Fernet is None:
+            raise RuntimeError("Encrypted ledgers require the 'cryptography' package")
+
+        self._path = path
+        self._key = key
+        self._fernet = Fernet(encryption_key) if encryption_key else None
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._meta: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._records
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Return a record by id"""
+        return self._records.get(record_id)
+
+    def merge(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert new records and replace changed ones
+
+        Args:
+            records: Processed records carrying the key field (the last copy of a repeated id wins)
+
+        Returns:
+            List of records that were new or differed from the stored copy
+        """
+        changed = []
+        with self._lock:
+            for record_id, record in self._unique(records).items():
+                if self._records.get(record_id) != record:
+                    self._records[record_id] = record
+                    changed.append(record)
+            self._on_merge(changed)
+            if changed:
+                self.save()
+        return changed
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Return all stored records"""
+        with self._lock:
+            return list(self._records.values())
+
+    def clear(self):
+        """Drop every record and the stored metadata"""
+        with self._lock:
+            self._records.clear()
+            self._meta.clear()
+            self.save()
+
+    def save(self):
+        """Persist the ledger to disk"""
+        if not self._path:
+            return
+
+        with self._lock:
+            payload = {'version': self.version, 'meta': dict(self._meta), 'records': dict(self._records)}
+
+        try:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            data = json.dumps(payload).encode('utf-8')
+            if self._fernet:
+                data = self._fernet.encrypt(data)
+            temp_path = f"{self._path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._path)
+        except OSError as e:
+            print(f"Could not save ledger {self._path}: {str(e)}")
+
+    def _unique(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Key records by id, dropping ones without an id and keeping the last copy of a repeated one"""
+        unique = {}
+        for record in records:
+            record_id = record.get(self._key)
+            if record_id:
+                unique[record_id] = record
+        return unique
+
+    def _on_merge(self, changed: List[Dict[str, Any]]):
+        """Hook for subclasses to update derived metadata after a merge"""
+
+    def _load(self):
+        """Load the ledger from disk, ignoring files written by another version or key"""
+        if not self._path or not os.path.isfile(self._path):
+            return
+
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+            if self._fernet:
+                data = self._fernet.decrypt(data)
+            payload = json.loads(data)
+            if isinstance(payload, dict) and payload.get('version') == self.version:
+                self._records = dict(payload.get('records', {}))
+                self._meta = dict(payload.get('meta', {}))
+        except (OSError, ValueError, InvalidToken) as e:
+            print(f"Could not load ledger {self._path}: {str(e)}")
+
+
+class OrderLedger(RecordLedger):
+    """
+    Stock order history keyed by order id, with an updated_at sync cursor.
+    """
+
+    # Version 2 added average_price and cumulative_quantity to stored orders
+    version = 2
+
+    @property
+    def cursor(self) -> Optional[str]:
+        """Newest updated_at timestamp seen so far (None before the first sync)"""
+        return self._meta.get('cursor')
+
+    def orders(self) -> List[Dict[str, Any]]:
+        """
+        Get all stored orders
+
+        Returns:
+            List of orders sorted by creation time (newest first)
+        """
+        return sorted(self.records(), key=lambda x: x.get('created_at', ''), reverse=True)
+
+    def _on_merge(self, changed: List[Dict[str, Any]]):
+        timestamps = [order.get('updated_at', '') for order in changed if order.get('updated_at')]
+        if self.cursor:
+            timestamps.append(self.cursor)
+        if timestamps:
+            self._meta['cursor'] = max(timestamps)
+
+
+class DividendLedger(RecordLedger):
+    """
+    Dividend history keyed by dividend id, with a running total of paid dividends.
+    """
+
+    # States robin_stocks counts towards the total dividends earned
+    PAID_STATES = ('paid', 'reinvested')
+
+    # States that can still change; paid, reinvested, voided and cancelled records are final
+    PENDING_STATES = ('pending',)
+
+    def needs_update(self, dividend: Dict[str, Any]) -> bool:
+        """
+        Check whether a raw dividend record is new or changed since it was stored
+
+        Args:
+            dividend: Raw dividend record from Robinhood
+
+        Returns:
+            bool: True if the record must be (re)ingested
+        """
+        stored = self._records.get(dividend.get('id', ''))
+        if stored is None:
+            return True
+        return any(stored.get(field) != dividend.get(field, stored.get(field))
+                   for field in ('state', 'amount', 'paid_at'))
+
+    def pending_ids(self) -> List[str]:
+        """Return ids of stored dividends whose state can still change"""
+        with self._lock:
+            return [record_id for record_id, record in self._records.items()
+                    if record.get('state') in self.PENDING_STATES]
+
+    @property
+    def total(self) -> float:
+        """Total amount of paid or reinvested dividends"""
+        return self._meta.get('total', 0.0)
+
+    def dividends(self) -> List[Dict[str, Any]]:
+        """
+        Get all stored dividends
+
+        Returns:
+            List of dividends sorted by payable date (newest first)
+        """
+        return sorted(self.records(), key=lambda x: x.get('payable_date', ''), reverse=True)
+
+    def merge(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = self._unique(records)
+            # Take the previous copies out of the running total before they are replaced
+            for record_id, record in records.items():
+                previous = self._records.get(record_id)
+                if previous is not None and previous != record:
+                    self._meta['total'] = self.total - self._paid_amount(previous)
+            return super().merge(records.values())
+
+    def _on_merge(self, changed: List[Dict[str, Any]]):
+        self._meta['total'] = self.total + sum(self._paid_amount(record) for record in changed)
+
+    def _paid_amount(self, dividend: Dict[str, Any]) -> float:
+        if dividend.get('state') not in self.PAID_STATES:
+            return 0.0
+        try:
+            return float(dividend.get('amount', 0) or 0)
+        except (TypeError, ValueError):
+            return 0.0
@@ -0,0 +1,284 @@
+"""
+Tax-lot tracking with FIFO, LIFO, HIFO and average-cost matching
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from utils import safe_float
+
+# Lot matching methods for sells
+METHODS = ('fifo', 'lifo', 'hifo', 'average')
+
+# Order states that can carry executed quantity (a cancelled order may be partially filled)
+FILL_STATES = ('filled', 'partially_filled', 'cancelled')
+
+
+@dataclass
+class Lot:
+    """An open (or partially sold) purchase"""
+    order_id: str
+    acquired_at: str
+    quantity: float
+    price: float
+    original_quantity: float
+
+    @property
+    def cost(self) -> float:
+        return self.quantity * self.price
+
+    def as_dict(self, current_price: Optional[float] = None) -> Dict[str, Any]:
+        data = {
+            'order_id': self.order_id,
+            'acquired_at': self.acquired_at,
+            'quantity': self.quantity,
+            'original_quantity': self.original_quantity,
+            'price': self.price,
+            'cost': self.cost,
+        }
+        if current_price is not None:
+            data['market_value'] = self.quantity * current_price
+            data['unrealized_pnl'] = (current_price - self.price) * self.quantity
+        return data
+
+
+@dataclass
+class Realization:
+    """The part of a sell matched against one lot"""
+    sell_order_id: str
+    sold_at: str
+    lot_order_id: Optional[str]
+    quantity: float
+    proceeds: float
+    cost: float
+
+    @property
+    def pnl(self) -> float:
+        return self.proceeds - self.cost
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'sell_order_id': self.sell_order_id,
+            'sold_at': self.sold_at,
+            'lot_order_id': self.lot_order_id,
+            'quantity': self.quantity,
+            'proceeds': self.proceeds,
+            'cost': self.cost,
+            'pnl': self.pnl,
+        }
+
+
+def fill_of(order: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Extract the executed part of an order
+
+    Args:
+        order: Processed order
+
+    Returns:
+        Dict with id, side, time, quantity and price, or None if nothing executed
+    """
+    if order.get('state') not in FILL_STATES or order.get('side') not in ('buy', 'sell'):
+        return None
+
+    # Older records only carry the order quantity and limit price
+    quantity = safe_float(order.get('cumulative_quantity')) or (
+        safe_float(order.get('quantity')) if order.get('state') == 'filled' else 0.0)
+    if quantity <= 0:
+        return None
+
+    return {
+        'id': order.get('id', ''),
+        'side': order.get('side'),
+        'time': order.get('executed_at') or order.get('created_at', ''),
+        'quantity': quantity,
+        'price': safe_float(order.get('average_price')) or safe_float(order.get('price')),
+    }
+
+
+class LotBook:
+    """Open lots and realized gains of one symbol"""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.lots: List[Lot] = []
+        self.realized: List[Realization] = []
+        self.fills: Dict[str, Dict[str, Any]] = {}
+        self.watermark = ''
+
+    def add(self, fill: Dict[str, Any]) -> bool:
+        """
+        Apply one fill in time order
+
+        Returns:
+            bool: False if the fill cannot be applied incrementally (it changed
+            or is older than fills already applied) and the book must be replayed
+        """
+        previous = self.fills.get(fill['id'])
+        if previous == fill:
+            return True
+        if previous is not None or fill['time'] < self.watermark:
+            self.fills[fill['id']] = fill
+            return False
+
+        self.fills[fill['id']] = fill
+        self.watermark = fill['time']
+        if fill['side'] == 'buy':
+            self.lots.append(Lot(fill['id'], fill['time'], fill['quantity'], fill['price'], fill['quantity']))
+        else:
+            self._sell(fill)
+        return True
+
+    def replay(self):
+        """Rebuild lots and realized gains from every known fill"""
+        fills = sorted(self.fills.values(), key=lambda x: (x['time'], x['side'] != 'buy'))
+        self.lots, self.realized, self.fills, self.watermark = [], [], {}, ''
+        for fill in fills:
+            self.add(fill)
+
+    def _sell(self, fill: Dict[str, Any]):
+        remaining = fill['quantity']
+        price = fill['price']
+
+        if self.method == 'average':
+            held = sum(lot.quantity for lot in self.lots)
+            matched = min(remaining, held)
+            if matched > 0:
+                average = sum(lot.cost for lot in self.lots) / held
+                self.realized.append(Realization(fill['id'], fill['time'], None, matched,
+                                                 matched * price, matched * average))
+                # Every remaining share now carries the pooled average cost
+                for lot in self.lots:
+                    lot.quantity *= (held - matched) / held
+                    lot.price = average
+                remaining -= matched
+        else:
+            for lot in self._match_order():
+                if remaining <= 0:
+                    break
+                matched = min(remaining, lot.quantity)
+                self.realized.append(Realization(fill['id'], fill['time'], lot.order_id, matched,
+                                                 matched * price, matched * lot.price))
+                lot.quantity -= matched
+                remaining -= matched
+
+        self.lots = [lot for lot in self.lots if lot.quantity > 1e-9]
+        if remaining > 1e-9:
+            # Shares sold without a known purchase (history incomplete): no cost basis
+            self.realized.append(Realization(fill['id'], fill['time'], None, remaining, remaining * price, 0.0))
+
+    def _match_order(self) -> List[Lot]:
+        if self.method == 'lifo':
+            return list(reversed(self.lots))
+        if self.method == 'hifo':
+            return sorted(self.lots, key=lambda lot: lot.price, reverse=True)
+        return list(self.lots)
+
+
+class LotEngine:
+    """
+    Per-symbol tax lots built from the order history.
+
+    New fills are applied incrementally in O(new fills); a symbol is only
+    replayed from its own fills when a fill arrives out of order or an
+    already-applied order changes (e.g. a partial fill grows).
+    """
+
+    def __init__(self, method: str = 'fifo'):
+        """
+        Args:
+            method: Lot matching method, one of METHODS
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown cost basis method '{method}', expected one of {METHODS}")
+        self.method = method
+        self._books: Dict[str, LotBook] = {}
+        self._source: Optional[List[Dict[str, Any]]] = None
+        self._origin: Any = None
+        self._lock = threading.RLock()
+
+    def apply(self, changed: List[Dict[str, Any]], orders: List[Dict[str, Any]], origin: Any):
+        """
+        Bring the lots up to date after an order sync
+
+        Args:
+            changed: Orders that are new or changed since the previous sync of origin
+            orders: Full order history after the sync
+            origin: Object the orders came from (e.g. a ledger); deltas from a
+                different origin than the last one trigger a full rebuild
+        """
+        with self._lock:
+            if origin is None or origin is not self._origin:
+                self._rebuild(orders)
+            else:
+                self._ingest(changed)
+            self._source = orders
+            self._origin = origin
+
+    def position(self, symbol: str, orders: List[Dict[str, Any]],
+                 current_price: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get the lots and P&L of one symbol
+
+        Args:
+            symbol: Stock symbol (case-insensitive)
+            orders: Current order history, used to rebuild the lots if it changed
+            current_price: Latest price for unrealized P&L (omitted: no unrealized figures)
+
+        Returns:
+            Dict with method, open lots, realizations, quantity, cost_basis,
+            average_cost, realized_pnl and, with a price, market_value and unrealized_pnl
+        """
+        with self._lock:
+            if orders is not self._source:
+                self._rebuild(orders)
+                self._origin = None
+            book = self._books.get(symbol.upper()) or LotBook(self.method)
+
+            quantity = sum(lot.quantity for lot in book.lots)
+            cost_basis = sum(lot.cost for lot in book.lots)
+            position = {
+                'method': self.method,
+                'lots': [lot.as_dict(current_price) for lot in book.lots],
+                'realized': [realization.as_dict() for realization in book.realized],
+                'quantity': quantity,
+                'cost_basis': cost_basis,
+                'average_cost': cost_basis / quantity if quantity > 0 else 0.0,
+                'realized_pnl': sum(realization.pnl for realization in book.realized),
+            }
+            if current_price is not None:
+                position['market_value'] = quantity * current_price
+                position['unrealized_pnl'] = quantity * current_price - cost_basis
+            return position
+
+    def clear(self):
+        """Drop all lots"""
+        with self._lock:
+            self._books.clear()
+            self._source = None
+            self._origin = None
+
+    def _rebuild(self, orders: List[Dict[str, Any]]):
+        self._books.clear()
+        self._ingest(orders)
+        self._source = orders
+
+    def _ingest(self, orders: List[Dict[str, Any]]):
+        fills: Dict[str, List[Dict[str, Any]]] = {}
+        for order in orders:
+            fill = fill_of(order)
+            if fill is not None:
+                fills.setdefault((order.get('symbol', '') or '').upper(), []).append(fill)
+
+        for symbol, symbol_fills in fills.items():
+            book = self._books.setdefault(symbol, LotBook(self.method))
+            needs_replay = False
+            # Buys first on equal timestamps so same-second round trips match
+            for fill in sorted(symbol_fills, key=lambda x: (x['time'], x['side'] != 'buy')):
+                if needs_replay:
+                    book.fills[fill['id']] = fill
+                elif not book.add(fill):
+                    needs_replay = True
+            if needs_replay:
+                book.replay()
@@ -0,0 +1,153 @@
+"""
+Per-symbol position metrics computed in one pass over the order and dividend history
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils import safe_float
+
+
+def _order_totals(orders: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Aggregate every symbol's orders in a single pass"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for order in orders:
+        symbol = (order.get('symbol', '') or '').upper()
+        entry = totals.get(symbol)
+        if entry is None:
+            entry = totals[symbol] = {
+                'bought_quantity': 0.0, 'sold_quantity': 0.0, 'buy_cost': 0.0,
+                'total_orders': 0, 'buy_orders': 0, 'sell_orders': 0,
+            }
+
+        side = order.get('side')
+        entry['total_orders'] += 1
+        if side == 'buy':
+            entry['buy_orders'] += 1
+        elif side == 'sell':
+            entry['sell_orders'] += 1
+
+        if order.get('state') != 'filled':
+            continue
+        quantity = safe_float(order.get('quantity'))
+        if side == 'buy':
+            entry['bought_quantity'] += quantity
+            entry['buy_cost'] += quantity * safe_float(order.get('price'))
+        elif side == 'sell':
+            entry['sold_quantity'] += quantity
+    return totals
+
+
+def _dividend_totals(dividends: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Aggregate every symbol's dividends in a single pass"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for div in dividends:
+        symbol = (div.get('symbol', '') or '').upper()
+        entry = totals.get(symbol)
+        if entry is None:
+            entry = totals[symbol] = {'amount': 0.0, 'count': 0}
+        entry['amount'] += safe_float(div.get('amount'))
+        entry['count'] += 1
+    return totals
+
+
+class MetricsEngine:
+    """
+    Caches per-symbol aggregates of the order and dividend history.
+
+    Aggregates are recomputed for all symbols at once whenever a new order or
+    dividend list is ingested, so reading one symbol's metrics is a dict lookup.
+    """
+
+    def __init__(self):
+        self._orders: Optional[List[Dict[str, Any]]] = None
+        self._dividends: Optional[List[Dict[str, Any]]] = None
+        self._order_totals: Dict[str, Dict[str, float]] = {}
+        self._dividend_totals: Dict[str, Dict[str, float]] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def ingest_orders(self, orders: List[Dict[str, Any]]):
+        """Recompute order aggregates from a newly loaded order list"""
+        totals = _order_totals(orders)
+        with self._lock:
+            self._orders = orders
+            self._order_totals = totals
+            self._metrics = {}
+
+    def ingest_dividends(self, dividends: List[Dict[str, Any]]):
+        """Recompute dividend aggregates from a newly loaded dividend list"""
+        totals = _dividend_totals(dividends)
+        with self._lock:
+            self._dividends = dividends
+            self._dividend_totals = totals
+            self._metrics = {}
+
+    def metrics(self, symbol: str, orders: List[Dict[str, Any]],
+                dividends: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Get the metrics of one symbol
+
+        Args:
+            symbol: Stock symbol (case-insensitive)
+            orders: Current order history, ingested first if not seen yet
+            dividends: Current dividend history, ingested first if not seen yet
+
+        Returns:
+            Dict of position metrics (zeroes for a symbol without history)
+        """
+        with self._lock:
+            self._sync(orders, dividends)
+            symbol = symbol.upper()
+            if symbol not in self._metrics:
+                self._metrics[symbol] = self._combine(symbol)
+            return dict(self._metrics[symbol])
+
+    def all_metrics(self, orders: List[Dict[str, Any]],
+                    dividends: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the metrics of every symbol with order or dividend history
+
+        Args:
+            orders: Current order history
+            dividends: Current dividend history
+
+        Returns:
+            Dict mapping symbol to its metrics
+        """
+        with self._lock:
+            self._sync(orders, dividends)
+            symbols = set(self._order_totals) | set(self._dividend_totals)
+            return {symbol: self.metrics(symbol, orders, dividends) for symbol in symbols}
+
+    def clear(self):
+        """Drop all cached aggregates"""
+        with self._lock:
+            self._orders = self._dividends = None
+            self._order_totals = {}
+            self._dividend_totals = {}
+            self._metrics = {}
+
+    def _sync(self, orders: List[Dict[str, Any]], dividends: List[Dict[str, Any]]):
+        if orders is not self._orders:
+            self.ingest_orders(orders)
+        if dividends is not self._dividends:
+            self.ingest_dividends(dividends)
+
+    def _combine(self, symbol: str) -> Dict[str, Any]:
+        order = self._order_totals.get(symbol, {})
+        div = self._dividend_totals.get(symbol, {})
+        bought = order.get('bought_quantity', 0.0)
+        sold = order.get('sold_quantity', 0.0)
+        return {
+            'total_bought_quantity': bought,
+            'total_sold_quantity': sold,
+            'net_quantity': bought - sold,
+            'total_cost': order.get('buy_cost', 0.0),
+            'total_dividend_amount': div.get('amount', 0.0),
+            'dividend_count': div.get('count', 0),
+            'calculated_avg_price': order.get('buy_cost', 0.0) / bought if bought > 0 else 0,
+            'total_orders': order.get('total_orders', 0),
+            'buy_orders': order.get('buy_orders', 0),
+            'sell_orders': order.get('sell_orders', 0),
+        }
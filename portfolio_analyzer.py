@@ -1,18 +1,149 @@
 import robin_stocks.robinhood as r
-import streamlit as st
-from typing import Dict, List, Optional, Any
-import os
+from typing import Dict, List, Optional, Any, Callable, Tuple
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from cache import TTLCache
+from frames import FrameCache
+from http_session import bind_session, bound, create_session
+from instrument_resolver import InstrumentResolver
+from ledger import DividendLedger, OrderLedger, ledger_path
+from lots import LotEngine
+from metrics import MetricsEngine
+from price_history import PriceHistoryStore
+from refresher import BackgroundRefresher, PortfolioSnapshot
+from returns import ReturnsEngine, fills_frame
+from shared_cache import SharedCache, get_shared_cache
+from snapshot_store import SnapshotStore, snapshot_path
+from symbol_index import SymbolIndex
+from utils import fan_out, safe_float
+
+# Per-key cache lifetimes in seconds: live prices go stale quickly, history barely changes
+CACHE_TTLS = {
+    'holdings': 60,
+    'open_orders': 60,
+    'account_info': 300,
+    'dividends': 3600,
+    'all_orders': 3600,
+}
+
+# Symbols per batched quotes/fundamentals request
+QUOTE_BATCH_SIZE = 100
+
+# Overall deadlines in seconds for concurrent API fan-outs
+LOGIN_VERIFY_DEADLINE = 30
+ACCOUNT_INFO_DEADLINE = 15
+
+
+class NotLoggedInError(Exception):
+    """Raised when account data is requested without a Robinhood session"""
+
+
+def latest_price(quote: Dict[str, Any]) -> Optional[str]:
+    """Return a quote's latest trade price, preferring the extended-hours one like robin_stocks"""
+    return quote.get('last_extended_hours_trade_price') or quote.get('last_trade_price')
+
+def reprice_holding(holding: Dict[str, Any], price: str) -> Dict[str, Any]:
+    """
+    Recompute a holding's price-dependent fields the way build_holdings derives them
+    
+    Args:
+        holding: Holding with quantity and average_buy_price
+        price: Latest price
+        
+    Returns:
+        Copy of the holding with price, equity, equity_change and percent_change updated
+    """
+    value = safe_float(price)
+    quantity = safe_float(holding.get('quantity'))
+    average_buy_price = safe_float(holding.get('average_buy_price'))
+    return dict(
+        holding,
+        price=price,
+        equity="{0:.2f}".format(quantity * value),
+        equity_change="{0:.2f}".format(quantity * (value - average_buy_price)),
+        percent_change="{0:.2f}".format(
+            (value - average_buy_price) * 100 / average_buy_price if average_buy_price else 0.0),
+    )
+
+def holding_from_position(position: Dict[str, Any], instrument: Dict[str, Any], price: str,
+                          fundamentals: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a holding the way build_holdings does, from already fetched parts
+    
+    Args:
+        position: Raw open position
+        instrument: Instrument record of the position
+        price: Latest price
+        fundamentals: Fundamentals record of the symbol
+        
+    Returns:
+        Holding in build_holdings' format
+    """
+    return reprice_holding({
+        'quantity': position.get('quantity', '0'),
+        'average_buy_price': position.get('average_buy_price', '0'),
+        'type': instrument.get('type', 'stock'),
+        'name': instrument.get('simple_name') or instrument.get('name') or instrument['symbol'],
+        'id': instrument.get('id', ''),
+        'pe_ratio': fundamentals.get('pe_ratio'),
+        'dividend_yield': fundamentals.get('dividend_yield'),
+    }, price)
 
 class PortfolioAnalyzer:
     """
     A class to handle Robinhood API interactions and portfolio analysis
     """
     
-    def __init__(self):
+    def __init__(self, instrument_resolver: Optional[InstrumentResolver] = None,
+                 incremental_sync: bool = True, ledger_dir: Optional[str] = None,
+                 snapshot_dir: Optional[str] = None, snapshot_key: Optional[str] = None,
+                 cost_basis_method: str = 'fifo', price_history: Optional[PriceHistoryStore] = None,
+                 shared_cache: Optional[SharedCache] = None):
+        """
+        Args:
+            instrument_resolver: Shared instrument resolver (a new one is created if omitted)
+            incremental_sync: Only pull orders and dividends changed since the last sync
+            ledger_dir: Directory for per-account history ledgers (None keeps them in memory)
+            snapshot_dir: Directory for per-account SQLite snapshots (None disables snapshots)
+            snapshot_key: Fernet key used to encrypt snapshots and ledgers at rest
+            cost_basis_method: Default lot matching method ('fifo', 'lifo', 'hifo' or 'average')
+            price_history: Shared daily price cache (a new one is created if omitted)
+            shared_cache: Cache for public market data shared with other analyzers
+                (defaults to the process-wide one)
+        """
         self._logged_in = False
-        self._cache = {}
         self._cache_timeout = 300  # 5 minutes
+        self._cache = TTLCache(default_ttl=self._cache_timeout, max_entries=32, ttls=CACHE_TTLS)
         self._current_user_info = {}
+        self._shared_cache = shared_cache if shared_cache is not None else get_shared_cache()
+        self._instrument_resolver = (instrument_resolver if instrument_resolver is not None
+                                     else InstrumentResolver(shared_cache=self._shared_cache))
+        self._incremental_sync = incremental_sync
+        self._ledger_dir = ledger_dir
+        self._order_ledger = None
+        self._dividend_ledger = None
+        self._order_index = SymbolIndex('created_at')
+        self._dividend_index = SymbolIndex('paid_at')
+        self._metrics = MetricsEngine()
+        self._frames = FrameCache()
+        self._cost_basis_method = LotEngine(cost_basis_method).method
+        self._lot_engines = {}
+        self._returns = ReturnsEngine()
+        self._price_history = (price_history if price_history is not None
+                               else PriceHistoryStore(shared_cache=self._shared_cache))
+        self._snapshot_dir = snapshot_dir
+        self._snapshot_key = snapshot_key
+        self._snapshot_store = None
+        self._refresher = None
+        self._errors: Dict[str, None] = {}
+        self._errors_lock = threading.Lock()
+        self._session = None
+        self._token_dir = None
         
     def login(self, username: str, password: str, mfa_code: Optional[str] = None) -> bool:
         """
@@ -26,51 +157,47 @@ class PortfolioAnalyzer:
         Returns:
             bool: True if login successful, False otherwise
         """
+        success = self._login(username, password, mfa_code)
+        if not success:
+            # Never keep a half-authenticated session around
+            self._reset_session()
+        return success
+    
+    def _login(self, username: str, password: str, mfa_code: Optional[str] = None) -> bool:
+        """Authenticate and verify the account; see login()"""
         try:
-            # Aggressive session clearing
-            self._clear_all_sessions()
+            self.stop_background_refresh()
+            
+            # Drop any previous session of this analyzer
+            self._reset_session()
             
             # Clear any cached data
             self._cache.clear()
+            self._order_ledger = None
+            self._dividend_ledger = None
+            self._order_index.clear()
+            self._dividend_index.clear()
+            self._metrics.clear()
+            self._frames.clear()
+            self._lot_engines = {}
+            self._returns.clear()
+            self._close_snapshot_store()
             self._logged_in = False
             
-            # Nuclear reimport approach - completely reload robin_stocks modules
-            import importlib
-            import sys
-            
-            modules_to_reload = [
-                'robin_stocks.robinhood.authentication',
-                'robin_stocks.robinhood.account',
-                'robin_stocks.robinhood.profiles', 
-                'robin_stocks.robinhood.orders',
-                'robin_stocks.robinhood.markets',
-                'robin_stocks.robinhood',
-                'robin_stocks'
-            ]
-            
-            for module_name in modules_to_reload:
-                if module_name in sys.modules:
-                    try:
-                        importlib.reload(sys.modules[module_name])
-                    except:
-                        pass
-            
-            # Force clear any cached authentication in the module
-            global r
-            import robin_stocks.robinhood as r
+            # Every login gets its own HTTP session and token directory, so nothing
+            # is shared with other analyzers and there is nothing global to clean up
+            self._session = create_session()
+            self._token_dir = tempfile.mkdtemp(prefix='ipt-session-')
             
             # Attempt fresh login with explicit credential validation
             try:
                 # Store the credentials we're attempting to use
                 attempted_username = username
                 
-                if mfa_code:
-                    login_result = r.login(username, password, mfa_code=mfa_code)
-                else:
-                    login_result = r.login(username, password)
+                with bind_session(self._session):
+                    r.login(username, password, mfa_code=mfa_code, pickle_path=self._token_dir)
                 
-                # CRITICAL: The robin_stocks login may return success even for invalid credentials
-                # due to persistent session caching, so we need extensive verification
+                # CRITICAL: Still verify below that the session really belongs to this account
                 
             except Exception as login_error:
                 # Direct login failure
@@ -80,18 +207,25 @@ class PortfolioAnalyzer:
             
             # EXTENSIVE VERIFICATION: Multiple layers of validation
             try:
-                # Layer 1: Basic profile access
-                profile = r.profiles.load_basic_profile()
-                account = r.profiles.load_account_profile()
+                # Layers 1 and 2 are independent reads, so issue them concurrently
+                results, errors = self._fan_out({
+                    'profile': r.profiles.load_basic_profile,
+                    'account': r.profiles.load_account_profile,
+                    # Positions alone prove account access; build_holdings would also pull
+                    # every quote and fundamental, which the holdings load fetches anyway
+                    'positions': r.account.get_open_stock_positions,
+                }, LOGIN_VERIFY_DEADLINE)
+                
+                # Layer 1: Basic profile access (mandatory)
+                for name in ('profile', 'account'):
+                    if name in errors:
+                        raise errors[name]
+                profile = results['profile']
+                account = results['account']
                 
                 # Layer 2: Account-specific data access
-                try:
-                    holdings = r.account.build_holdings()
-                    positions = r.account.get_open_stock_positions()
-                except Exception as data_error:
-                    print(f"Account data access failed: {str(data_error)}")
-                    holdings = None
-                    positions = None
+                if 'positions' in errors:
+                    print(f"Account data access failed: {str(errors['positions'])}")
                 
                 # Layer 3: Cross-validate the profile email with attempted username
                 if profile and account:
@@ -148,6 +282,9 @@ class PortfolioAnalyzer:
                     }
                     
                     print(f"Login successful for user: {user_name} (Email: {profile_email})")
+                    
+                    # Render from the last snapshot while fresh data loads in the background
+                    self._restore_snapshot()
                     return True
                 else:
                     print("Login verification failed: Could not access account data")
@@ -161,23 +298,41 @@ class PortfolioAnalyzer:
                 return False
                 
         except Exception as e:
-            st.error(f"Login failed: {str(e)}")
+            self._report_error(f"Login failed: {str(e)}")
             self._logged_in = False
             return False
     
     def logout(self):
         """Logout from Robinhood and clear all session data"""
+        self.stop_background_refresh()
         try:
-            # Use aggressive session clearing
-            self._clear_all_sessions()
+            self._reset_session()
             self._logged_in = False
             self._cache.clear()
+            self._order_ledger = None
+            self._dividend_ledger = None
+            self._order_index.clear()
+            self._dividend_index.clear()
+            self._metrics.clear()
+            self._frames.clear()
+            self._lot_engines = {}
+            self._returns.clear()
+            self._close_snapshot_store()
             self._current_user_info = {}
                         
         except Exception as e:
             # Don't show error for logout - just ensure we clear local state
             self._logged_in = False
             self._cache.clear()
+            self._order_ledger = None
+            self._dividend_ledger = None
+            self._order_index.clear()
+            self._dividend_index.clear()
+            self._metrics.clear()
+            self._frames.clear()
+            self._lot_engines = {}
+            self._returns.clear()
+            self._close_snapshot_store()
             self._current_user_info = {}
     
     def get_current_user_info(self) -> Dict[str, Any]:
@@ -195,8 +350,9 @@ class PortfolioAnalyzer:
                 return self._current_user_info
             
             # Fallback: fetch fresh profile if not stored
-            profile = r.profiles.load_basic_profile()
-            account = r.profiles.load_account_profile()
+            with bind_session(self._session):
+                profile = r.profiles.load_basic_profile()
+                account = r.profiles.load_account_profile()
             
             if profile and account:
                 self._current_user_info = {
@@ -217,127 +373,288 @@ class PortfolioAnalyzer:
             return {}
     
     def clear_session(self):
-        """Clear session data - alias for _clear_all_sessions"""
-        self._clear_all_sessions()
+        """Clear session data - alias for _reset_session"""
+        self._reset_session()
         self._current_user_info = {}
     
     def clear_cache(self):
         """Clear the data cache to force refresh"""
         self._cache.clear()
     
-    def _clear_all_sessions(self):
-        """Nuclear option: clear all possible session data"""
-        try:
-            # Force logout multiple times to be sure
-            for _ in range(10):
-                try:
-                    r.logout()
-                except:
-                    pass
+    def refresh(self, cache_key: str) -> Any:
+        """
+        Reload one dataset into the cache, raising on failure
+        
+        Used by background workers, which must not replace good data with the
+        empty fallbacks the public getters return on errors.
+        
+        Args:
+            cache_key: Dataset to reload ('holdings', 'open_orders', 'all_orders', 'dividends',
+                'account_info'), or 'quotes' to only reprice the cached holdings
             
-            # Clear module-level state in robin_stocks
-            try:
-                # Reset any global state variables in robin_stocks if they exist
-                import robin_stocks.robinhood as rh_module
-                for attr_name in ['_session', 'session', '_logged_in', 'authentication_token']:
-                    if hasattr(rh_module, attr_name):
-                        try:
-                            setattr(rh_module, attr_name, None)
-                        except:
-                            pass
-                
-                # Clear authentication module state
-                import robin_stocks.robinhood.authentication as auth_module
-                for attr in dir(auth_module):
-                    if not attr.startswith('__') and attr.islower():
-                        try:
-                            setattr(auth_module, attr, None)
-                        except:
-                            pass
-            except:
-                pass
-            
-            # Clear session files in multiple possible locations
-            import glob
-            import shutil
-            possible_locations = [
-                './',
-                '/tmp/',
-                os.path.expanduser('~/.'),
-                '/app/',
-                '/home/runner/',
-                '/home/runner/.cache/',
-                './.cache/',
-                './temp/',
-                '/var/tmp/'
-            ]
-            
-            session_patterns = [
-                '*.pickle',
-                '*robinhood*',
-                '.robinhood*',
-                'rh_*',
-                '*auth*',
-                '*session*',
-                '*token*'
-            ]
-            
-            for location in possible_locations:
-                if not os.path.exists(location):
-                    continue
-                for pattern in session_patterns:
-                    try:
-                        for file_path in glob.glob(os.path.join(location, pattern)):
-                            if os.path.isfile(file_path):
-                                try:
-                                    os.remove(file_path)
-                                    print(f"Removed session file: {file_path}")
-                                except:
-                                    pass
-                            elif os.path.isdir(file_path) and 'robinhood' in file_path.lower():
-                                try:
-                                    shutil.rmtree(file_path)
-                                    print(f"Removed session directory: {file_path}")
-                                except:
-                                    pass
-                    except:
-                        pass
-                        
-            # Clear environment variables that might cache auth
-            env_vars_to_clear = [key for key in os.environ.keys() 
-                               if any(term in key.lower() for term in ['robinhood', 'rh_', 'auth', 'token', 'session'])]
+        Returns:
+            The freshly loaded dataset (the holdings for 'quotes')
+        """
+        self.check_login()
+        if cache_key == 'quotes':
+            return self._bound(self._refresh_quotes)()
+        loaders = {
+            'holdings': self._load_holdings,
+            'open_orders': self._load_open_orders,
+            'all_orders': self._load_all_orders,
+            'dividends': self._load_dividends,
+            'account_info': self._load_account_info,
+        }
+        return self._cache.get_or_load(cache_key, self._bound(loaders[cache_key]), force_refresh=True)
+    
+    def start_background_refresh(self, quote_interval: float = 5, history_interval: float = 600,
+                                 position_interval: float = 60):
+        """
+        Start refreshing data on a background thread, or restart it after it stopped for being idle
+        
+        Args:
+            quote_interval: Seconds between batched price refreshes of the held symbols
+            history_interval: Seconds between order history/dividend refreshes
+            position_interval: Seconds between full holdings/open order refreshes
+        """
+        if self._refresher is None:
+            self._refresher = BackgroundRefresher(self, quote_interval, history_interval, position_interval)
+        self._refresher.start()
+    
+    def stop_background_refresh(self):
+        """Stop the background refresh thread, if running"""
+        if self._refresher is not None:
+            self._refresher.stop()
+            self._refresher = None
+    
+    def get_snapshot(self) -> Optional[PortfolioSnapshot]:
+        """
+        Get the latest snapshot published by the background refresher
+        
+        Returns:
+            PortfolioSnapshot, or None if background refresh is off or has not completed yet
+        """
+        if self._refresher is None:
+            return None
+        self._refresher.touch()
+        return self._refresher.snapshot
+    
+    def subscribe_snapshots(self, listener: Callable[[Optional[PortfolioSnapshot], PortfolioSnapshot], None]) -> Callable[[], None]:
+        """
+        Call a listener with (previous, new) whenever the background refresher publishes
+        
+        Args:
+            listener: Callable run on the refresher thread; it must return quickly
             
-            for var in env_vars_to_clear:
-                try:
-                    del os.environ[var]
-                    print(f"Cleared env var: {var}")
-                except:
-                    pass
+        Returns:
+            Callable that unsubscribes the listener
+        """
+        if self._refresher is None:
+            raise RuntimeError("Background refresh is not running. Call start_background_refresh() first.")
+        return self._refresher.subscribe(listener)
+    
+    def is_ready(self, dataset: str) -> bool:
+        """
+        Check whether a dataset can be read without waiting on the API
+        
+        While the background refresher is running, a dataset is ready once it
+        is in the latest snapshot or cached, even if stale; otherwise the getters load
+        synchronously and every dataset counts as ready.
+        
+        Args:
+            dataset: 'holdings', 'open_orders', 'all_orders', 'dividends' or 'total_dividends'
             
-            # Force clear any module-level variables in robin_stocks
-            try:
-                import sys
-                for module_name in list(sys.modules.keys()):
-                    if 'robin_stocks' in module_name:
-                        module = sys.modules[module_name]
-                        # Clear common session variables
-                        for attr in ['access_token', 'refresh_token', 'session', '_session', 'logged_in']:
-                            if hasattr(module, attr):
-                                try:
-                                    delattr(module, attr)
-                                    print(f"Cleared module attribute: {module_name}.{attr}")
-                                except:
-                                    pass
-            except:
-                pass
-                    
-        except Exception as e:
-            pass  # Continue even if clearing fails
+        Returns:
+            bool: False if the dataset is still being fetched in the background
+        """
+        if self._refresher is None or not self._refresher.is_running:
+            return True
+        self._refresher.touch()
+        snapshot = self._refresher.snapshot
+        if snapshot is not None and getattr(snapshot, dataset, None) is not None:
+            return True
+        # Stale entries (e.g. restored from a snapshot) are served without waiting
+        return self._cache.peek('dividends' if dataset == 'total_dividends' else dataset) is not None
+    
+    @property
+    def instrument_resolver(self) -> InstrumentResolver:
+        """Resolver of instrument URLs to symbols used by this analyzer"""
+        return self._instrument_resolver
+    
+    @property
+    def shared_cache(self) -> SharedCache:
+        """Cache of public market data shared with other analyzers"""
+        return self._shared_cache
+    
+    def auth_headers(self) -> Dict[str, str]:
+        """
+        Get the headers of this analyzer's authenticated session, for clients other than robin_stocks
+        
+        Returns:
+            Copy of the session headers, including Authorization
+        """
+        self.check_login()
+        session = self._session
+        if session is None or 'Authorization' not in session.headers:
+            raise NotLoggedInError("Not logged in to Robinhood. Please login first.")
+        return dict(session.headers)
+    
+    def cached(self, cache_key: str, allow_stale: bool = False) -> Any:
+        """
+        Get a cached dataset without loading it
+        
+        Args:
+            cache_key: Dataset cache key
+            allow_stale: Also return an expired entry that is still within its stale window
+            
+        Returns:
+            The cached dataset, or None
+        """
+        if allow_stale:
+            return self._cache.get_stale(cache_key)
+        return self._cache.get(cache_key)
+    
+    def store(self, cache_key: str, value: Any) -> Any:
+        """
+        Cache a dataset loaded outside the getters (empty values are not cached)
+        
+        Args:
+            cache_key: Dataset cache key
+            value: Processed dataset
+            
+        Returns:
+            The value
+        """
+        if value:
+            self._cache.set(cache_key, value)
+        return value
+    
+    def ingest(self, dataset: str, raw: Any) -> Any:
+        """
+        Process raw Robinhood payloads fetched by another client, as the loaders do
+        
+        Updates the ledgers, indexes, metrics and frames; may read and write
+        local files, so async callers should run it in a worker thread.
+        
+        Args:
+            dataset: 'holdings' (symbol -> raw holding in build_holdings format), 'open_orders',
+                'all_orders' (orders updated since order_sync_cursor()) or 'dividends'
+                (new or changed records collected by a dividend_scan())
+            raw: Raw payload
+            
+        Returns:
+            The processed dataset (not cached; see store())
+        """
+        ingesters = {
+            'holdings': self._ingest_holdings,
+            'open_orders': self._ingest_open_orders,
+            'all_orders': self._ingest_orders,
+            'dividends': self._ingest_dividends,
+        }
+        return self._bound(ingesters[dataset])(raw)
+    
+    def refresh_error(self, dataset: str) -> Optional[str]:
+        """
+        Get the error of a dataset's last failed background refresh
+        
+        Args:
+            dataset: 'holdings', 'open_orders', 'all_orders', 'dividends' or 'total_dividends'
+            
+        Returns:
+            Error message, or None if the last refresh succeeded or background refresh is off
+        """
+        if self._refresher is None:
+            return None
+        errors = self._refresher.errors
+        if dataset == 'holdings':
+            return errors.get('holdings') or errors.get('quotes')
+        return errors.get('dividends' if dataset == 'total_dividends' else dataset)
+    
+    def request_refresh(self):
+        """Refresh all data: immediately in the background if running, otherwise on next access"""
+        if self._refresher is not None and self._refresher.is_running:
+            self._refresher.trigger()
+        else:
+            self.clear_cache()
+    
+    def get_frame(self, dataset: str, force_refresh: bool = False) -> pd.DataFrame:
+        """
+        Get a dataset as a typed DataFrame
+        
+        Quantities and prices are float64, timestamps UTC datetime64 and
+        symbols, sides and states categorical. The frame is built once per
+        load and shared, so callers must not modify it in place.
+        
+        Args:
+            dataset: 'holdings', 'open_orders', 'all_orders' or 'dividends'
+            force_refresh: Force refresh of cached data
+            
+        Returns:
+            DataFrame of the dataset (empty with typed columns if nothing is available)
+        """
+        return self.to_frame(dataset, getattr(self, f"get_{dataset}")(force_refresh))
+    
+    def to_frame(self, dataset: str, records: Any) -> pd.DataFrame:
+        """
+        Get the typed DataFrame of already loaded dataset records
+        
+        Args:
+            dataset: 'holdings', 'open_orders', 'all_orders' or 'dividends'
+            records: Records as returned by the matching get_* method
+            
+        Returns:
+            Cached frame for these records, built on first use
+        """
+        return self._frames.frame(dataset, records)
+    
+    def take_errors(self) -> List[str]:
+        """
+        Get the errors the getters ran into since the last call, for the UI to show
+        
+        Getters can run on worker threads, so they only record errors; showing
+        them is left to the caller.
+        
+        Returns:
+            List of error messages, oldest first (each message once)
+        """
+        with self._errors_lock:
+            errors, self._errors = list(self._errors), {}
+        return errors
+    
+    def _report_error(self, message: str):
+        """Log a getter error and keep it for take_errors()"""
+        print(message)
+        with self._errors_lock:
+            self._errors[message] = None
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        Get cache hit/miss counters
+        
+        Returns:
+            Dict with hits, stale_hits, misses, evictions and size
+        """
+        return self._cache.stats()
+    
+    def _reset_session(self):
+        """Drop this analyzer's HTTP session and delete its stored tokens"""
+        if self._session is not None:
+            self._session.headers.pop('Authorization', None)
+            self._session.close()
+            self._session = None
+        
+        if self._token_dir:
+            shutil.rmtree(self._token_dir, ignore_errors=True)
+            self._token_dir = None
     
-    def _check_login(self):
-        """Check if user is logged in"""
+    def _bound(self, func: Callable) -> Callable:
+        """Wrap a callable so its robin_stocks calls go through this analyzer's session"""
+        return bound(self._session, func)
+    
+    def check_login(self):
+        """Check if user is logged in, raising NotLoggedInError if not"""
         if not self._logged_in:
-            raise Exception("Not logged in to Robinhood. Please login first.")
+            raise NotLoggedInError("Not logged in to Robinhood. Please login first.")
     
     def get_holdings(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
@@ -349,47 +666,137 @@ class PortfolioAnalyzer:
         Returns:
             Dict containing holdings data
         """
-        cache_key = 'holdings'
-        
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
-        
         try:
-            self._check_login()
-            
-            # Get holdings with dividends
-            holdings = r.account.build_holdings(with_dividends=True)
-            
-            if holdings:
-                # Process and clean the holdings data
-                processed_holdings = {}
-                for symbol, data in holdings.items():
-                    processed_holdings[symbol] = {
-                        'quantity': data.get('quantity', '0'),
-                        'average_buy_price': data.get('average_buy_price', '0'),
-                        'equity': data.get('equity', '0'),
-                        'market_value': data.get('market_value', '0'),
-                        'price': data.get('price', '0'),
-                        'percent_change': data.get('percent_change', '0'),
-                        'total_return_today': data.get('total_return_today', '0'),
-                        'total_return_today_percent': data.get('total_return_today_percent', '0'),
-                        'equity_change': data.get('equity_change', '0'),
-                        'type': data.get('type', 'stock'),
-                        'name': data.get('name', symbol),
-                        'id': data.get('id', ''),
-                        'pe_ratio': data.get('pe_ratio', ''),
-                        'dividend_yield': data.get('dividend_yield', ''),
-                    }
-                
-                self._cache[cache_key] = processed_holdings
-                return processed_holdings
-            else:
-                return {}
+            self.check_login()
+            return self._cache.get_or_load('holdings', self._bound(self._load_holdings), force_refresh)
                 
         except Exception as e:
-            st.error(f"Error fetching holdings: {str(e)}")
+            self._report_error(f"Error fetching holdings: {str(e)}")
             return {}
     
+    def _load_holdings(self) -> Dict[str, Any]:
+        """Fetch positions, then build holdings from shared instrument, quote and fundamentals data"""
+        # Only the positions are account data; the rest is shared with every other analyzer
+        positions = [item for item in r.account.get_open_stock_positions() or [] if item]
+        instruments = self._instrument_resolver.instruments(item.get('instrument', '') for item in positions)
+        symbols = sorted({data['symbol'].upper() for data in instruments.values()})
+        quotes = self._get_market_data('quotes', symbols)
+        fundamentals = self._get_market_data('fundamentals', symbols)
+        
+        # Positions without a quote are skipped, like build_holdings does
+        holdings = {}
+        for item in positions:
+            instrument = instruments.get(item.get('instrument', ''))
+            if instrument is None:
+                continue
+            symbol = instrument['symbol'].upper()
+            price = latest_price(quotes.get(symbol) or {})
+            if price:
+                holdings[instrument['symbol']] = holding_from_position(item, instrument, price, fundamentals.get(symbol) or {})
+        return self._ingest_holdings(holdings)
+    
+    def _get_market_data(self, kind: str, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get quotes or fundamentals through the shared cache, fetching only what nobody has
+        
+        Args:
+            kind: 'quotes' or 'fundamentals'
+            symbols: Stock symbols
+            
+        Returns:
+            Dict of upper-case symbol -> record (shared: do not modify)
+        """
+        fetch = r.stocks.get_quotes if kind == 'quotes' else r.stocks.get_fundamentals
+        
+        def load(missing: List[str]) -> Dict[str, Dict[str, Any]]:
+            records = {}
+            for i in range(0, len(missing), QUOTE_BATCH_SIZE):
+                for record in fetch(missing[i:i + QUOTE_BATCH_SIZE]) or []:
+                    if record and record.get('symbol'):
+                        records[record['symbol'].upper()] = record
+            return records
+        
+        return self._shared_cache.get_many_or_load(kind, [symbol.upper() for symbol in symbols], load)
+    
+    def _ingest_holdings(self, holdings: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Process holdings in robin_stocks' build_holdings format and index them
+        
+        Args:
+            holdings: Symbol -> raw holding
+            
+        Returns:
+            Processed holdings
+        """
+        if not holdings:
+            return {}
+        
+        # Process and clean the holdings data
+        processed_holdings = {}
+        for symbol, data in holdings.items():
+            processed_holdings[symbol] = {
+                'quantity': data.get('quantity', '0'),
+                'average_buy_price': data.get('average_buy_price', '0'),
+                'equity': data.get('equity', '0'),
+                'market_value': data.get('market_value', '0'),
+                'price': data.get('price', '0'),
+                'percent_change': data.get('percent_change', '0'),
+                'total_return_today': data.get('total_return_today', '0'),
+                'total_return_today_percent': data.get('total_return_today_percent', '0'),
+                'equity_change': data.get('equity_change', '0'),
+                'type': data.get('type', 'stock'),
+                'name': data.get('name', symbol),
+                'id': data.get('id', ''),
+                'pe_ratio': data.get('pe_ratio', ''),
+                'dividend_yield': data.get('dividend_yield', ''),
+            }
+        
+        self._save_snapshot(holdings=[dict(data, symbol=symbol) for symbol, data in processed_holdings.items()])
+        self._frames.frame('holdings', processed_holdings)
+        return processed_holdings
+    
+    def _refresh_quotes(self) -> Dict[str, Any]:
+        """
+        Reprice the cached holdings from batched quotes shared with other analyzers
+        
+        Positions (quantity, average cost, fundamentals) are kept as cached;
+        only price, equity, equity_change and percent_change are recomputed,
+        the same way build_holdings derives them. The cache entry keeps its
+        age, so positions are still reloaded when their TTL runs out.
+        
+        Returns:
+            Repriced holdings (fully loaded first if nothing is cached yet)
+        """
+        holdings = self._cache.peek('holdings')
+        if not holdings:
+            return self._cache.get_or_load('holdings', self._load_holdings, force_refresh=True)
+        
+        quotes = self._get_market_data('quotes', list(holdings))
+        return self.apply_quotes(holdings, list(quotes.values()))
+    
+    def apply_quotes(self, holdings: Dict[str, Any], quotes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Reprice holdings from raw quotes and store them without changing the cache entry's age
+        
+        Args:
+            holdings: Processed holdings
+            quotes: Raw quotes of the held symbols
+            
+        Returns:
+            Repriced holdings
+        """
+        quotes = {quote['symbol'].upper(): quote for quote in quotes if quote and quote.get('symbol')}
+        repriced = {}
+        for symbol, data in holdings.items():
+            price = latest_price(quotes.get(symbol.upper()) or {})
+            # No quote for this symbol: keep its last known price
+            repriced[symbol] = reprice_holding(data, price) if safe_float(price) > 0 else data
+        
+        # Skipped if the cache was cleared meanwhile (e.g. logout)
+        if self._cache.update('holdings', repriced):
+            self._frames.frame('holdings', repriced)
+        return repriced
+    
     def get_dividends(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get dividend information
@@ -400,42 +807,97 @@ class PortfolioAnalyzer:
         Returns:
             List of dividend records
         """
-        cache_key = 'dividends'
-        
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
-        
         try:
-            self._check_login()
-            
-            dividends = r.account.get_dividends()
-            
-            if dividends:
-                # Process dividend data
-                processed_dividends = []
-                for div in dividends:
-                    processed_dividends.append({
-                        'id': div.get('id', ''),
-                        'amount': div.get('amount', '0'),
-                        'rate': div.get('rate', '0'),
-                        'position': div.get('position', '0'),
-                        'paid_at': div.get('paid_at', ''),
-                        'payable_date': div.get('payable_date', ''),
-                        'record_date': div.get('record_date', ''),
-                        'state': div.get('state', ''),
-                        'symbol': self._get_symbol_from_instrument(div.get('instrument', '')),
-                        'instrument': div.get('instrument', ''),
-                    })
-                
-                self._cache[cache_key] = processed_dividends
-                return processed_dividends
-            else:
-                return []
+            self.check_login()
+            return self._cache.get_or_load('dividends', self._bound(self._load_dividends), force_refresh)
                 
         except Exception as e:
-            st.error(f"Error fetching dividends: {str(e)}")
+            self._report_error(f"Error fetching dividends: {str(e)}")
             return []
     
+    def _load_dividends(self) -> List[Dict[str, Any]]:
+        """Fetch dividend records, ingesting only new or state-changed ones into the ledger"""
+        scan = self.dividend_scan()
+        for page in self._iter_pages(r.urls.dividends_url()):
+            if not scan(page):
+                break
+        return self._ingest_dividends(scan.fresh)
+    
+    def dividend_scan(self) -> Callable[[List[Dict[str, Any]]], bool]:
+        """
+        Create a page filter for a dividend sync
+        
+        Returns:
+            Callable taking each raw page in turn, collecting new or state-changed
+            dividends in its 'fresh' attribute and returning False once the
+            remaining pages are already stored
+        """
+        ledger = self._get_dividend_ledger()
+        pending = set(ledger.pending_ids())
+        fresh = []
+        
+        def scan(page: List[Dict[str, Any]]) -> bool:
+            page = [div for div in page if div]
+            changed = [div for div in page if ledger.needs_update(div)]
+            fresh.extend(changed)
+            pending.difference_update(div.get('id') for div in page)
+            
+            # Newest-first pages: once a page brings nothing new and every pending
+            # dividend has been seen again, the rest of the history is already stored
+            newest_first = page and page[0].get('payable_date', '') >= page[-1].get('payable_date', '')
+            return not (self._incremental_sync and len(ledger) and newest_first and not changed and not pending)
+        
+        scan.fresh = fresh
+        return scan
+    
+    def _ingest_dividends(self, fresh: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Merge new or changed raw dividends into the ledger and index the result
+        
+        Args:
+            fresh: Raw dividends from Robinhood
+            
+        Returns:
+            Full processed dividend history
+        """
+        ledger = self._get_dividend_ledger()
+        changed = []
+        if fresh:
+            # Resolve all instruments up front so lookups run concurrently
+            symbols = self._resolve_symbols(fresh)
+            changed = ledger.merge(self._process_dividend(div, symbols) for div in fresh)
+        
+        dividends = ledger.dividends()
+        self._dividend_index.apply(changed, dividends, ledger)
+        self._metrics.ingest_dividends(dividends)
+        self._frames.frame('dividends', dividends)
+        self._save_snapshot(dividends=dividends, instruments=self._instrument_snapshot())
+        return dividends
+    
+    def _process_dividend(self, div: Dict[str, Any], symbols: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Convert a raw dividend record into the analyzer's dividend format
+        
+        Args:
+            div: Raw dividend from Robinhood
+            symbols: Instrument URL to symbol mapping
+            
+        Returns:
+            Processed dividend dict
+        """
+        return {
+            'id': div.get('id', ''),
+            'amount': div.get('amount', '0'),
+            'rate': div.get('rate', '0'),
+            'position': div.get('position', '0'),
+            'paid_at': div.get('paid_at', ''),
+            'payable_date': div.get('payable_date', ''),
+            'record_date': div.get('record_date', ''),
+            'state': div.get('state', ''),
+            'symbol': symbols.get(div.get('instrument', ''), 'N/A'),
+            'instrument': div.get('instrument', ''),
+        }
+    
     def get_total_dividends(self, force_refresh: bool = False) -> str:
         """
         Get total dividends earned
@@ -446,24 +908,15 @@ class PortfolioAnalyzer:
         Returns:
             String representation of total dividends
         """
-        cache_key = 'total_dividends'
-        
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
-        
         try:
-            self._check_login()
-            
-            total_dividends = r.account.get_total_dividends()
+            self.check_login()
             
-            if total_dividends:
-                self._cache[cache_key] = str(total_dividends)
-                return str(total_dividends)
-            else:
-                return "0.00"
+            # Syncing the dividend ledger keeps its running total current
+            self.get_dividends(force_refresh)
+            return f"{self._get_dividend_ledger().total:.2f}"
                 
         except Exception as e:
-            st.error(f"Error fetching total dividends: {str(e)}")
+            self._report_error(f"Error fetching total dividends: {str(e)}")
             return "0.00"
     
     def get_open_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
@@ -476,43 +929,54 @@ class PortfolioAnalyzer:
         Returns:
             List of open orders
         """
-        cache_key = 'open_orders'
-        
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
-        
         try:
-            self._check_login()
-            
-            open_orders = r.orders.get_all_open_stock_orders()
-            
-            if open_orders:
-                # Process orders data
-                processed_orders = []
-                for order in open_orders:
-                    processed_orders.append({
-                        'id': order.get('id', ''),
-                        'quantity': order.get('quantity', '0'),
-                        'price': order.get('price', '0'),
-                        'side': order.get('side', ''),
-                        'type': order.get('type', ''),
-                        'time_in_force': order.get('time_in_force', ''),
-                        'state': order.get('state', ''),
-                        'created_at': order.get('created_at', ''),
-                        'updated_at': order.get('updated_at', ''),
-                        'symbol': self._get_symbol_from_instrument(order.get('instrument', '')),
-                        'instrument': order.get('instrument', ''),
-                    })
-                
-                self._cache[cache_key] = processed_orders
-                return processed_orders
-            else:
-                return []
+            self.check_login()
+            return self._cache.get_or_load('open_orders', self._bound(self._load_open_orders), force_refresh)
                 
         except Exception as e:
-            st.error(f"Error fetching open orders: {str(e)}")
+            self._report_error(f"Error fetching open orders: {str(e)}")
             return []
     
+    def _load_open_orders(self) -> List[Dict[str, Any]]:
+        """Fetch and process open stock orders from Robinhood"""
+        return self._ingest_open_orders(r.orders.get_all_open_stock_orders())
+    
+    def _ingest_open_orders(self, open_orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process raw open orders
+        
+        Args:
+            open_orders: Raw open orders from Robinhood
+            
+        Returns:
+            Processed open orders
+        """
+        if not open_orders:
+            return []
+        
+        # Resolve all instruments up front so lookups run concurrently
+        symbols = self._resolve_symbols(open_orders)
+        
+        # Process orders data
+        processed_orders = []
+        for order in open_orders:
+            processed_orders.append({
+                'id': order.get('id', ''),
+                'quantity': order.get('quantity', '0'),
+                'price': order.get('price', '0'),
+                'side': order.get('side', ''),
+                'type': order.get('type', ''),
+                'time_in_force': order.get('time_in_force', ''),
+                'state': order.get('state', ''),
+                'created_at': order.get('created_at', ''),
+                'updated_at': order.get('updated_at', ''),
+                'symbol': symbols.get(order.get('instrument', ''), 'N/A'),
+                'instrument': order.get('instrument', ''),
+            })
+        
+        self._frames.frame('open_orders', processed_orders)
+        return processed_orders
+    
     def get_all_orders(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get all stock orders (including completed)
@@ -523,43 +987,202 @@ class PortfolioAnalyzer:
         Returns:
             List of all orders
         """
-        cache_key = 'all_orders'
+        try:
+            self.check_login()
+            return self._cache.get_or_load('all_orders', self._bound(self._load_all_orders), force_refresh)
+                
+        except Exception as e:
+            self._report_error(f"Error fetching all orders: {str(e)}")
+            return []
+    
+    def _load_all_orders(self) -> List[Dict[str, Any]]:
+        """Fetch and process the stock order history, incrementally when a ledger exists"""
+        # Only orders created or updated since the newest one we have can differ
+        cursor = self.order_sync_cursor()
+        if cursor:
+            all_orders = r.orders.get_all_stock_orders(start_date=cursor)
+        else:
+            all_orders = r.orders.get_all_stock_orders()
+        return self._ingest_orders(all_orders)
+    
+    def order_sync_cursor(self) -> Optional[str]:
+        """
+        Get the timestamp an order sync can start from
         
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
+        Returns:
+            Newest stored update time (only orders updated since can differ), or
+            None when the full history must be fetched
+        """
+        if not self._incremental_sync:
+            return None
+        return self._get_order_ledger().cursor or None
+    
+    def _ingest_orders(self, all_orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process raw orders and merge them into the order history
+        
+        Args:
+            all_orders: Raw orders from Robinhood, either the full history or
+                those updated since order_sync_cursor()
+            
+        Returns:
+            Full processed order history
+        """
+        all_orders = [order for order in all_orders or [] if order]
+        if not self._incremental_sync:
+            symbols = self._resolve_symbols(all_orders)
+            orders = [self._process_order(order, symbols) for order in all_orders]
+            self._metrics.ingest_orders(orders)
+            self._frames.frame('all_orders', orders)
+            for engine in list(self._lot_engines.values()):
+                engine.apply([], orders, None)
+            return orders
+        
+        ledger = self._get_order_ledger()
+        changed = []
+        if all_orders:
+            # Resolve all instruments up front so lookups run concurrently
+            symbols = self._resolve_symbols(all_orders)
+            changed = ledger.merge(self._process_order(order, symbols) for order in all_orders)
+        
+        orders = ledger.orders()
+        self._order_index.apply(changed, orders, ledger)
+        self._metrics.ingest_orders(orders)
+        self._frames.frame('all_orders', orders)
+        for engine in list(self._lot_engines.values()):
+            engine.apply(changed, orders, ledger)
+        self._save_snapshot(orders=orders, instruments=self._instrument_snapshot())
+        return orders
+    
+    def _process_order(self, order: Dict[str, Any], symbols: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Convert a raw order record into the analyzer's order format
+        
+        Args:
+            order: Raw order from Robinhood
+            symbols: Instrument URL to symbol mapping
+            
+        Returns:
+            Processed order dict
+        """
+        return {
+            'id': order.get('id', ''),
+            'quantity': order.get('quantity', '0'),
+            'price': order.get('price', '0'),
+            'side': order.get('side', ''),
+            'type': order.get('type', ''),
+            'time_in_force': order.get('time_in_force', ''),
+            'state': order.get('state', ''),
+            'created_at': order.get('created_at', ''),
+            'updated_at': order.get('updated_at', ''),
+            'executed_at': order.get('executed_at', ''),
+            'symbol': symbols.get(order.get('instrument', ''), 'N/A'),
+            'instrument': order.get('instrument', ''),
+            'average_price': order.get('average_price') or '',
+            'cumulative_quantity': order.get('cumulative_quantity') or '0',
+        }
+    
+    def _get_order_ledger(self) -> OrderLedger:
+        """Return the order ledger of the logged in account"""
+        if self._order_ledger is None:
+            self._order_ledger = OrderLedger(self._ledger_path('orders'), encryption_key=self._snapshot_key)
+        return self._order_ledger
+    
+    def _get_dividend_ledger(self) -> DividendLedger:
+        """Return the dividend ledger of the logged in account"""
+        if self._dividend_ledger is None:
+            self._dividend_ledger = DividendLedger(self._ledger_path('dividends'), encryption_key=self._snapshot_key)
+        return self._dividend_ledger
+    
+    def _get_snapshot_store(self) -> Optional[SnapshotStore]:
+        """Return the snapshot store of the logged in account, if snapshots are enabled"""
+        if self._snapshot_store is None and self._snapshot_dir:
+            account_id = self._current_user_info.get('account_id', '')
+            if account_id and account_id != 'Unknown':
+                try:
+                    self._snapshot_store = SnapshotStore(
+                        snapshot_path(account_id, self._snapshot_dir), key=self._snapshot_key
+                    )
+                except Exception as e:
+                    print(f"Snapshot store unavailable: {str(e)}")
+                    self._snapshot_dir = None
+        return self._snapshot_store
+    
+    def _close_snapshot_store(self):
+        """Close the snapshot store of the previous account"""
+        if self._snapshot_store is not None:
+            self._snapshot_store.close()
+            self._snapshot_store = None
+    
+    def _save_snapshot(self, **tables: List[Dict[str, Any]]):
+        """
+        Write synced data to the snapshot store
+        
+        Args:
+            **tables: Table name -> records (holdings, orders, dividends, instruments)
+        """
+        store = self._get_snapshot_store()
+        if store is None:
+            return
+        try:
+            store.save(**tables)
+        except Exception as e:
+            print(f"Could not write snapshot: {str(e)}")
+    
+    def _restore_snapshot(self):
+        """Seed the cache from the last snapshot, marked stale so it is refreshed in the background"""
+        store = self._get_snapshot_store()
+        if store is None or store.saved_at is None:
+            return
         
         try:
-            self._check_login()
+            self._instrument_resolver.seed({row['url']: row['symbol'] for row in store.load('instruments')})
             
-            all_orders = r.orders.get_all_stock_orders()
+            holdings = {row.pop('symbol'): row for row in store.load('holdings')}
+            orders = sorted(store.load('orders'), key=lambda x: x.get('created_at', ''), reverse=True)
+            dividends = sorted(store.load('dividends'), key=lambda x: x.get('payable_date', ''), reverse=True)
             
-            if all_orders:
-                # Process orders data
-                processed_orders = []
-                for order in all_orders:
-                    processed_orders.append({
-                        'id': order.get('id', ''),
-                        'quantity': order.get('quantity', '0'),
-                        'price': order.get('price', '0'),
-                        'side': order.get('side', ''),
-                        'type': order.get('type', ''),
-                        'time_in_force': order.get('time_in_force', ''),
-                        'state': order.get('state', ''),
-                        'created_at': order.get('created_at', ''),
-                        'updated_at': order.get('updated_at', ''),
-                        'executed_at': order.get('executed_at', ''),
-                        'symbol': self._get_symbol_from_instrument(order.get('instrument', '')),
-                        'instrument': order.get('instrument', ''),
-                    })
-                
-                self._cache[cache_key] = processed_orders
-                return processed_orders
-            else:
-                return []
-                
+            for cache_key, value in (('holdings', holdings), ('all_orders', orders), ('dividends', dividends)):
+                if value:
+                    self._cache.set(cache_key, value, stored_at=time.time() - self._cache.ttl_for(cache_key))
         except Exception as e:
-            st.error(f"Error fetching all orders: {str(e)}")
-            return []
+            print(f"Could not restore snapshot: {str(e)}")
+    
+    def _instrument_snapshot(self) -> List[Dict[str, str]]:
+        """Return known instruments as snapshot rows"""
+        return [{'url': url, 'symbol': symbol} for url, symbol in self._instrument_resolver.symbols().items()]
+    
+    def _iter_pages(self, url: str):
+        """
+        Iterate over the pages of a paginated Robinhood endpoint
+        
+        Args:
+            url: First page URL
+            
+        Yields:
+            List of records on each page
+        """
+        while url:
+            data = r.helper.request_get(url, 'regular')
+            if not data:
+                return
+            yield data.get('results', [])
+            url = data.get('next')
+    
+    def _ledger_path(self, kind: str) -> Optional[str]:
+        """
+        Get the ledger file for the logged in account
+        
+        Args:
+            kind: Ledger kind, e.g. 'orders'
+            
+        Returns:
+            Ledger path, or None to keep the ledger in memory
+        """
+        account_id = self._current_user_info.get('account_id', '')
+        if not self._ledger_dir or not account_id or account_id == 'Unknown':
+            return None
+        return ledger_path(kind, account_id, self._ledger_dir)
     
     def get_stock_orders_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
@@ -574,13 +1197,8 @@ class PortfolioAnalyzer:
         """
         all_orders = self.get_all_orders(force_refresh)
         
-        # Filter orders by symbol
-        symbol_orders = [order for order in all_orders if order.get('symbol', '').upper() == symbol.upper()]
-        
-        # Sort by date (newest first)
-        symbol_orders.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        return symbol_orders
+        # Served from the per-symbol index (rebuilt only if the order list changed)
+        return self._order_index.lookup(symbol, all_orders)
     
     def get_stock_dividends_by_symbol(self, symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
@@ -595,27 +1213,24 @@ class PortfolioAnalyzer:
         """
         all_dividends = self.get_dividends(force_refresh)
         
-        # Filter dividends by symbol
-        symbol_dividends = [div for div in all_dividends if div.get('symbol', '').upper() == symbol.upper()]
-        
-        # Sort by date (newest first)
-        symbol_dividends.sort(key=lambda x: x.get('paid_at', ''), reverse=True)
-        
-        return symbol_dividends
+        # Served from the per-symbol index (rebuilt only if the dividend list changed)
+        return self._dividend_index.lookup(symbol, all_dividends)
     
-    def get_stock_summary(self, symbol: str, force_refresh: bool = False) -> Dict[str, Any]:
+    def get_stock_summary(self, symbol: str, force_refresh: bool = False,
+                          cost_basis_method: Optional[str] = None) -> Dict[str, Any]:
         """
         Get comprehensive summary for a specific stock
         
         Args:
             symbol: Stock symbol
             force_refresh: Force refresh of cached data
+            cost_basis_method: Lot matching method for 'position' (defaults to the analyzer's)
             
         Returns:
             Dict containing comprehensive stock data
         """
         try:
-            self._check_login()
+            self.check_login()
             
             # Get current holdings data
             holdings = self.get_holdings(force_refresh)
@@ -627,51 +1242,124 @@ class PortfolioAnalyzer:
             # Get dividend history
             dividends = self.get_stock_dividends_by_symbol(symbol, force_refresh)
             
-            # Calculate additional metrics
-            total_bought_quantity = sum(float(order.get('quantity', 0)) 
-                                      for order in orders 
-                                      if order.get('state') == 'filled' and order.get('side') == 'buy')
-            
-            total_sold_quantity = sum(float(order.get('quantity', 0)) 
-                                    for order in orders 
-                                    if order.get('state') == 'filled' and order.get('side') == 'sell')
+            # Aggregates are precomputed for every symbol when the history is loaded
+            metrics = self._metrics.metrics(symbol, self.get_all_orders(), self.get_dividends())
             
-            total_dividend_amount = sum(float(div.get('amount', 0)) for div in dividends)
-            
-            # Calculate average buy price from filled buy orders
-            buy_orders = [order for order in orders 
-                         if order.get('state') == 'filled' and order.get('side') == 'buy']
-            
-            if buy_orders:
-                total_cost = sum(float(order.get('price', 0)) * float(order.get('quantity', 0)) 
-                               for order in buy_orders)
-                total_shares = sum(float(order.get('quantity', 0)) for order in buy_orders)
-                calculated_avg_price = total_cost / total_shares if total_shares > 0 else 0
-            else:
-                calculated_avg_price = 0
+            # Open lots and realized/unrealized P&L at the current price
+            price = stock_holding.get('price')
+            position = self._get_lot_engine(cost_basis_method).position(
+                symbol, self.get_all_orders(), float(price) if price else None
+            )
             
             return {
                 'symbol': symbol.upper(),
                 'current_holding': stock_holding,
                 'orders': orders,
                 'dividends': dividends,
-                'metrics': {
-                    'total_bought_quantity': total_bought_quantity,
-                    'total_sold_quantity': total_sold_quantity,
-                    'net_quantity': total_bought_quantity - total_sold_quantity,
-                    'total_dividend_amount': total_dividend_amount,
-                    'dividend_count': len(dividends),
-                    'calculated_avg_price': calculated_avg_price,
-                    'total_orders': len(orders),
-                    'buy_orders': len([o for o in orders if o.get('side') == 'buy']),
-                    'sell_orders': len([o for o in orders if o.get('side') == 'sell'])
-                }
+                'metrics': metrics,
+                'position': position
             }
             
         except Exception as e:
-            st.error(f"Error getting stock summary for {symbol}: {str(e)}")
+            self._report_error(f"Error getting stock summary for {symbol}: {str(e)}")
             return {}
     
+    def get_symbol_metrics(self, force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Get position metrics for every symbol with order or dividend history
+        
+        Args:
+            force_refresh: Force refresh of cached data
+            
+        Returns:
+            Dict mapping symbol to metrics (quantities, cost, dividends, order counts)
+        """
+        try:
+            self.check_login()
+            return self._metrics.all_metrics(self.get_all_orders(force_refresh), self.get_dividends(force_refresh))
+            
+        except Exception as e:
+            self._report_error(f"Error computing stock metrics: {str(e)}")
+            return {}
+    
+    def get_position_lots(self, symbol: str, cost_basis_method: Optional[str] = None,
+                          force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get the open tax lots and P&L of a stock
+        
+        Args:
+            symbol: Stock symbol
+            cost_basis_method: 'fifo', 'lifo', 'hifo' or 'average' (defaults to the analyzer's)
+            force_refresh: Force refresh of cached data
+            
+        Returns:
+            Dict with open lots, realized sales, quantity, cost basis, realized P&L
+            and, when the stock is held, unrealized P&L at the current price
+        """
+        try:
+            self.check_login()
+            price = self.get_holdings(force_refresh).get(symbol.upper(), {}).get('price')
+            return self._get_lot_engine(cost_basis_method).position(
+                symbol, self.get_all_orders(force_refresh), float(price) if price else None
+            )
+            
+        except Exception as e:
+            self._report_error(f"Error computing lots for {symbol}: {str(e)}")
+            return {}
+    
+    def get_returns(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Get time-weighted and money-weighted returns over the order history
+        
+        Daily portfolio value is rebuilt from filled orders, paid dividends and
+        daily closes of every traded symbol.
+        
+        Args:
+            force_refresh: Force refresh of cached data
+            
+        Returns:
+            Dict with the daily 'series' DataFrame (value, flow, dividends, twr_index,
+            drawdown), 'twr', 'annualized_twr', 'xirr', 'max_drawdown',
+            'max_drawdown_day', 'start' and 'end'; empty if there is no history
+        """
+        try:
+            self.check_login()
+            orders = self.get_all_orders(force_refresh)
+            dividends = self.get_dividends(force_refresh)
+            
+            fills = fills_frame(orders)
+            if fills.empty:
+                return {}
+            
+            prices = self._get_price_history(sorted(fills['symbol'].unique()), fills['day'].min())
+            return self._returns.compute(orders, dividends, prices)
+            
+        except Exception as e:
+            self._report_error(f"Error computing returns: {str(e)}")
+            return {}
+    
+    def _get_price_history(self, symbols: List[str], start: Any) -> pd.DataFrame:
+        """
+        Get daily closes for symbols from the local price cache
+        
+        Only days missing from the cache are fetched, in batched historicals requests.
+        
+        Args:
+            symbols: Stock symbols
+            start: First day needed
+            
+        Returns:
+            DataFrame of closes indexed by day, one column per symbol
+        """
+        return self._bound(self._price_history.closes)(symbols, start)
+    
+    def _get_lot_engine(self, method: Optional[str] = None) -> LotEngine:
+        """Return the lot engine of a matching method, kept up to date by order syncs"""
+        method = method or self._cost_basis_method
+        if method not in self._lot_engines:
+            self._lot_engines[method] = LotEngine(method)
+        return self._lot_engines[method]
+    
     def _get_symbol_from_instrument(self, instrument_url: str) -> str:
         """
         Extract symbol from instrument URL
@@ -682,15 +1370,21 @@ class PortfolioAnalyzer:
         Returns:
             Stock symbol or 'N/A' if not found
         """
-        try:
-            if instrument_url:
-                # Use robin_stocks function to get instrument data
-                instrument_data = r.stocks.get_instrument_by_url(instrument_url)
-                if instrument_data and isinstance(instrument_data, dict) and 'symbol' in instrument_data:
-                    return instrument_data['symbol']
-            return 'N/A'
-        except Exception:
-            return 'N/A'
+        return self._instrument_resolver.resolve(instrument_url)
+    
+    def _resolve_symbols(self, records: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Resolve the instruments referenced by a payload in one concurrent batch
+        
+        Args:
+            records: Raw API records carrying an 'instrument' URL
+            
+        Returns:
+            Dict mapping instrument URL to symbol
+        """
+        return self._instrument_resolver.resolve_many(
+            record.get('instrument', '') for record in records if record
+        )
     
     def get_account_info(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
@@ -702,28 +1396,32 @@ class PortfolioAnalyzer:
         Returns:
             Dict containing account information
         """
-        cache_key = 'account_info'
-        
-        if not force_refresh and cache_key in self._cache:
-            return self._cache[cache_key]
-        
         try:
-            self._check_login()
-            
-            # Get basic account information
-            profile = r.profiles.load_basic_profile()
-            account = r.profiles.load_account_profile()
-            portfolio = r.profiles.load_portfolio_profile()
-            
-            account_info = {
-                'profile': profile or {},
-                'account': account or {},
-                'portfolio': portfolio or {}
-            }
-            
-            self._cache[cache_key] = account_info
-            return account_info
+            self.check_login()
+            return self._cache.get_or_load('account_info', self._bound(self._load_account_info), force_refresh)
             
         except Exception as e:
-            st.error(f"Error fetching account info: {str(e)}")
+            self._report_error(f"Error fetching account info: {str(e)}")
             return {}
+    
+    def _load_account_info(self) -> Dict[str, Any]:
+        """Fetch profile, account and portfolio information from Robinhood"""
+        # The three profile reads are independent, so fetch them concurrently
+        results, errors = self._fan_out({
+            'profile': r.profiles.load_basic_profile,
+            'account': r.profiles.load_account_profile,
+            'portfolio': r.profiles.load_portfolio_profile,
+        }, ACCOUNT_INFO_DEADLINE)
+        
+        if errors:
+            raise next(iter(errors.values()))
+        
+        return {
+            'profile': results.get('profile') or {},
+            'account': results.get('account') or {},
+            'portfolio': results.get('portfolio') or {}
+        }
+    
+    def _fan_out(self, calls: Dict[str, Callable[[], Any]], deadline: float) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """Run independent API calls concurrently through this analyzer's session (see utils.fan_out)"""
+        return fan_out({name: self._bound(call) for name, call in calls.items()}, deadline)
@@ -0,0 +1,279 @@
+"""
+Daily price history with a local append-only, memory-mapped bar cache
+"""
+
+import datetime
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import robin_stocks.robinhood as r
+
+from shared_cache import SharedCache
+
+DEFAULT_PRICE_DIR = os.path.join('.cache', 'prices')
+
+# Symbols per historicals request
+BATCH_SIZE = 50
+
+# Historicals spans with their length in days, smallest first
+SPANS = (('week', 7), ('month', 31), ('3month', 92), ('year', 366), ('5year', 1827))
+
+# One daily bar as stored on disk; day is days since 1970-01-01
+BAR_DTYPE = np.dtype([
+    ('day', '<i4'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('volume', '<f8'),
+])
+
+
+def _span_for(days: int) -> str:
+    """Return the smallest historicals span covering a number of days"""
+    for span, length in SPANS:
+        if days <= length:
+            return span
+    return SPANS[-1][0]
+
+
+def _day_number(day: datetime.date) -> int:
+    return (day - datetime.date(1970, 1, 1)).days
+
+
+class PriceHistoryStore:
+    """
+    Daily OHLC bars per symbol, cached on disk and fetched only where missing.
+
+    Each symbol's bars live in a flat binary file of BAR_DTYPE records that is
+    only ever appended to and is read through a memory map. A small JSON index
+    records the day range each symbol has been fetched for, so later calls
+    request just the missing days, batching all symbols that need the same
+    span into one historicals request. Only completed days are stored. With
+    a SharedCache, fetched bars are shared per symbol with other stores and
+    processes, and concurrent fetches of the same symbol are coalesced.
+    """
+
+    def __init__(self, store_dir: Optional[str] = DEFAULT_PRICE_DIR,
+                 fetch_historicals: Optional[Callable[[List[str], str], List[Dict[str, Any]]]] = None,
+                 batch_size: int = BATCH_SIZE, shared_cache: Optional[SharedCache] = None):
+        """
+        Args:
+            store_dir: Directory for bar files (None keeps bars in memory only)
+            fetch_historicals: Callable (symbols, span) -> list of daily bars
+                (defaults to robin_stocks' get_stock_historicals)
+            batch_size: Maximum symbols per historicals request
+            shared_cache: Cache for fetched bars shared with other stores (None fetches directly)
+        """
+        self._dir = store_dir
+        self._fetch_historicals = fetch_historicals or self._get_historicals
+        self._batch_size = max(1, batch_size)
+        self._shared_cache = shared_cache
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._bars: Dict[str, np.ndarray] = {}
+        self._memory: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self._load_index()
+
+    def closes(self, symbols: Iterable[str], start: Any) -> pd.DataFrame:
+        """
+        Get daily closes, fetching any missing days first
+
+        Args:
+            symbols: Stock symbols
+            start: First day needed (date, Timestamp or ISO string)
+
+        Returns:
+            DataFrame of closes indexed by day, one column per symbol with bars
+        """
+        symbols = sorted({symbol.upper() for symbol in symbols if symbol})
+        self.update(symbols, start)
+
+        columns = {}
+        first = np.datetime64(pd.Timestamp(start).date(), 'D')
+        for symbol in symbols:
+            bars = self.bars(symbol)
+            if len(bars):
+                days = bars['day'].astype('datetime64[D]')
+                keep = days >= first
+                columns[symbol] = pd.Series(bars['close'][keep], index=days[keep])
+        if not columns:
+            return pd.DataFrame()
+        return pd.DataFrame(columns).sort_index()
+
+    def bars(self, symbol: str) -> np.ndarray:
+        """
+        Get every stored bar of a symbol
+
+        Args:
+            symbol: Stock symbol
+
+        Returns:
+            Read-only array of BAR_DTYPE records sorted by day
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            if symbol not in self._bars:
+                self._bars[symbol] = self._read(symbol)
+            return self._bars[symbol]
+
+    def update(self, symbols: List[str], start: Any):
+        """
+        Fetch the days missing between start and yesterday for each symbol
+
+        Args:
+            symbols: Stock symbols
+            start: First day needed
+        """
+        today = datetime.date.today()
+        last = _day_number(today) - 1
+        first = max(_day_number(pd.Timestamp(start).date()), last + 1 - SPANS[-1][1])
+
+        # Group symbols by the span their gap needs, so each group is one batched request
+        by_span: Dict[str, List[str]] = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._index.get(symbol)
+                if entry is None or first < entry['from']:
+                    gap = last - first + 1
+                elif entry['through'] < last:
+                    gap = last - entry['through']
+                else:
+                    continue
+                by_span.setdefault(_span_for(gap), []).append(symbol)
+
+        for span, span_symbols in by_span.items():
+            for i in range(0, len(span_symbols), self._batch_size):
+                batch = span_symbols[i:i + self._batch_size]
+                try:
+                    bars = self._fetch(batch, span, last)
+                except Exception as e:
+                    # Serve what is cached; the gap is retried next time
+                    print(f"Error fetching price history ({span}): {str(e)}")
+                    continue
+                self._store(batch, bars, last - dict(SPANS)[span] + 1, last)
+
+    def _fetch(self, symbols: List[str], span: str, last: int) -> List[Dict[str, Any]]:
+        """Fetch bars of a batch, through the shared cache when there is one"""
+        if self._shared_cache is None:
+            return self._fetch_historicals(symbols, span) or []
+
+        # Keyed by the last completed day too, so bars fetched yesterday are not reused today
+        prefix = f'{span}:{last}:'
+
+        def load(missing: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+            by_symbol = {item_id: [] for item_id in missing}
+            for bar in self._fetch_historicals([item_id[len(prefix):] for item_id in missing], span) or []:
+                item_id = prefix + (bar.get('symbol') or '').upper() if bar else None
+                if item_id in by_symbol:
+                    by_symbol[item_id].append(bar)
+            return by_symbol
+
+        found = self._shared_cache.get_many_or_load('historicals', [prefix + symbol for symbol in symbols], load)
+        return [bar for bars in found.values() for bar in bars]
+
+    def _store(self, symbols: List[str], bars: List[Dict[str, Any]], covered_from: int, covered_through: int):
+        """Persist fetched bars, appending completed days newer than what is stored"""
+        parsed: Dict[str, Dict[int, tuple]] = {symbol: {} for symbol in symbols}
+        for bar in bars:
+            if not bar or (bar.get('symbol') or '').upper() not in parsed:
+                continue
+            try:
+                day = _day_number(pd.Timestamp(bar['begins_at']).date())
+                record = (day, float(bar.get('open_price') or 'nan'), float(bar.get('high_price') or 'nan'),
+                          float(bar.get('low_price') or 'nan'), float(bar.get('close_price') or 'nan'),
+                          float(bar.get('volume') or 0))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if day <= covered_through:
+                parsed[bar['symbol'].upper()][day] = record
+
+        with self._lock:
+            for symbol in symbols:
+                fetched = np.array([parsed[symbol][day] for day in sorted(parsed[symbol])], dtype=BAR_DTYPE)
+                existing = self.bars(symbol)
+                entry = self._index.get(symbol)
+
+                if entry is None or covered_from < entry['from']:
+                    # The fetch reaches back past what is stored: rewrite the file once
+                    if len(existing):
+                        older = existing[~np.isin(existing['day'], fetched['day'])]
+                        fetched = np.sort(np.concatenate([older, fetched]), order='day')
+                    self._write(symbol, fetched)
+                    start = min(covered_from, entry['from']) if entry else covered_from
+                else:
+                    # Only append days after the last stored one
+                    last_day = existing['day'][-1] if len(existing) else -1
+                    self._append(symbol, fetched[fetched['day'] > last_day])
+                    start = entry['from']
+
+                self._index[symbol] = {'from': int(start), 'through': int(covered_through)}
+                self._bars.pop(symbol, None)
+            self._save_index()
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self._dir, re.sub(r'[^A-Z0-9._-]', '_', symbol) + '.bars')
+
+    def _read(self, symbol: str) -> np.ndarray:
+        if not self._dir:
+            return self._memory.get(symbol, np.empty(0, dtype=BAR_DTYPE))
+        path = self._path(symbol)
+        if not os.path.isfile(path) or os.path.getsize(path) < BAR_DTYPE.itemsize:
+            return np.empty(0, dtype=BAR_DTYPE)
+        count = os.path.getsize(path) // BAR_DTYPE.itemsize
+        return np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(count,))
+
+    def _append(self, symbol: str, bars: np.ndarray):
+        if not len(bars):
+            return
+        if not self._dir:
+            self._memory[symbol] = np.concatenate([self.bars(symbol), bars])
+            return
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            with open(self._path(symbol), 'ab') as f:
+                f.write(bars.tobytes())
+        except OSError as e:
+            print(f"Could not save price history for {symbol}: {str(e)}")
+
+    def _write(self, symbol: str, bars: np.ndarray):
+        if not self._dir:
+            self._memory[symbol] = bars
+            return
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            path = self._path(symbol)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(bars.tobytes())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not save price history for {symbol}: {str(e)}")
+
+    def _load_index(self):
+        if not self._dir:
+            return
+        path = os.path.join(self._dir, 'index.json')
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                self._index = dict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not load price history index: {str(e)}")
+
+    def _save_index(self):
+        if not self._dir:
+            return
+        try:
+            os.makedirs(self._dir, exist_ok=True)
+            path = os.path.join(self._dir, 'index.json')
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not save price history index: {str(e)}")
+
+    def _get_historicals(self, symbols: List[str], span: str) -> List[Dict[str, Any]]:
+        return r.stocks.get_stock_historicals(symbols, interval='day', span=span)
@@ -0,0 +1,253 @@
+"""
+Background refresh of portfolio data, decoupled from Streamlit reruns
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+# Datasets refreshed on each cadence, as PortfolioAnalyzer.refresh() keys
+QUOTE_DATASETS = ('quotes',)
+POSITION_DATASETS = ('holdings', 'open_orders')
+HISTORY_DATASETS = ('all_orders', 'dividends')
+
+# Refresh keys published under a different snapshot field
+SNAPSHOT_FIELDS = {'quotes': 'holdings'}
+
+# Seconds without a reader or subscriber after which the worker stops itself
+IDLE_TIMEOUT = 300
+
+# First retry delay in seconds after a failed refresh, doubled per consecutive
+# failure and capped at the dataset's own interval
+RETRY_DELAY = 5
+
+
+def _freeze(value: Any) -> Any:
+    """Return a read-only view of a dataset"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class PortfolioSnapshot:
+    """
+    An immutable view of the portfolio at one point in time.
+
+    Datasets that have not been loaded yet are None. frames holds the typed
+    DataFrame of every loaded dataset, keyed by dataset name.
+    """
+    taken_at: float
+    holdings: Optional[Mapping[str, Mapping[str, Any]]] = None
+    open_orders: Optional[Tuple[Mapping[str, Any], ...]] = None
+    all_orders: Optional[Tuple[Mapping[str, Any], ...]] = None
+    dividends: Optional[Tuple[Mapping[str, Any], ...]] = None
+    total_dividends: Optional[str] = None
+    frames: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was taken"""
+        return time.time() - self.taken_at
+
+
+class BackgroundRefresher:
+    """
+    Periodically reloads an analyzer's data on a worker thread.
+
+    Prices of the held symbols are refreshed on the fast quote cadence with a
+    single batched quotes request, full holdings and open orders on the
+    position cadence, order history and dividends on the slower history
+    cadence. Each dataset publishes a new PortfolioSnapshot as soon as it
+    loads; readers just take the latest reference and never wait on the
+    network, and subscribers are called with every new snapshot.
+
+    A dataset is only rescheduled a full interval ahead once it loaded; a
+    failed one is retried with exponential backoff, and its last error is
+    kept in errors until it loads again.
+
+    Readers call touch(); once nobody has read for idle_timeout seconds and
+    there are no subscribers (e.g. the browser tab was closed), the worker
+    stops itself, and start() brings it back.
+    """
+
+    def __init__(self, analyzer, quote_interval: float = 5, history_interval: float = 600,
+                 position_interval: float = 60, idle_timeout: Optional[float] = IDLE_TIMEOUT):
+        """
+        Args:
+            analyzer: PortfolioAnalyzer to refresh
+            quote_interval: Seconds between batched price refreshes of the held symbols
+            history_interval: Seconds between order history/dividend refreshes
+            position_interval: Seconds between full holdings/open order refreshes
+            idle_timeout: Seconds without a reader before the worker stops (None runs until stop())
+        """
+        self._analyzer = analyzer
+        self._quote_interval = quote_interval
+        self._position_interval = position_interval
+        self._history_interval = history_interval
+        self._idle_timeout = idle_timeout
+        self._last_read = time.time()
+        self._errors: Dict[str, str] = {}
+        self._failures: Dict[str, int] = {}
+        self._snapshot: Optional[PortfolioSnapshot] = None
+        self._listeners: List[Callable[[Optional[PortfolioSnapshot], PortfolioSnapshot], None]] = []
+        self._listeners_lock = threading.Lock()
+        self._force_all = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[PortfolioSnapshot]:
+        """Latest published snapshot (None until the first refresh completes)"""
+        return self._snapshot
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        """Last error of every dataset whose most recent refresh failed, by refresh key"""
+        return dict(self._errors)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def touch(self):
+        """Record a read, keeping an idle-timed worker alive"""
+        self._last_read = time.time()
+
+    def start(self):
+        """Start the worker thread"""
+        self.touch()
+        if self.is_running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="portfolio-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5):
+        """Stop the worker thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def subscribe(self, listener: Callable[[Optional[PortfolioSnapshot], PortfolioSnapshot], None]) -> Callable[[], None]:
+        """
+        Call a listener with (previous, new) after every published snapshot
+
+        Listeners run on the worker thread and must return quickly (e.g. hand
+        off to a queue); exceptions are reported and ignored.
+
+        Args:
+            listener: Callable taking the previous snapshot (None at first) and the new one
+
+        Returns:
+            Callable that unsubscribes the listener
+        """
+        with self._listeners_lock:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self._listeners_lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+        return unsubscribe
+
+    def trigger(self):
+        """Refresh everything now instead of waiting for the next tick"""
+        self._force_all = True
+        self._wake.set()
+
+    def _run(self):
+        intervals = dict(
+            [(dataset, self._quote_interval) for dataset in QUOTE_DATASETS]
+            + [(dataset, self._position_interval) for dataset in POSITION_DATASETS]
+            + [(dataset, self._history_interval) for dataset in HISTORY_DATASETS]
+        )
+        next_run = dict.fromkeys(intervals, 0.0)
+
+        while not self._stop.is_set():
+            # Cleared before refreshing so a trigger() during the refresh is not lost
+            self._wake.clear()
+            now = time.time()
+            force_all, self._force_all = self._force_all, False
+            if force_all:
+                next_run = dict.fromkeys(intervals, 0.0)
+
+            datasets = [dataset for dataset in POSITION_DATASETS + HISTORY_DATASETS if next_run[dataset] <= now]
+            if 'holdings' in datasets:
+                # A full holdings load already carries fresh prices
+                for dataset in QUOTE_DATASETS:
+                    next_run[dataset] = now + intervals[dataset]
+            else:
+                datasets[:0] = [dataset for dataset in QUOTE_DATASETS if next_run[dataset] <= now]
+
+            for dataset in datasets:
+                if self._stop.is_set():
+                    return
+                loaded = self._refresh(dataset)
+                # Only a successful load waits the full interval; failures retry sooner
+                next_run[dataset] = time.time() + (intervals[dataset] if loaded
+                                                   else self._retry_delay(dataset, intervals[dataset]))
+
+            if self._is_idle():
+                print(f"Background refresh stopped after {self._idle_timeout}s without readers")
+                return
+
+            self._wake.wait(max(0.0, min(next_run.values()) - time.time()))
+
+    def _retry_delay(self, dataset: str, interval: float) -> float:
+        return min(interval, RETRY_DELAY * 2 ** (self._failures.get(dataset, 1) - 1))
+
+    def _is_idle(self) -> bool:
+        if self._idle_timeout is None:
+            return False
+        with self._listeners_lock:
+            if self._listeners:
+                return False
+        return time.time() - self._last_read > self._idle_timeout
+
+    def _refresh(self, dataset: str) -> bool:
+        """Reload one dataset and publish a new snapshot with it, returning whether it loaded"""
+        name = SNAPSHOT_FIELDS.get(dataset, dataset)
+        try:
+            records = self._analyzer.refresh(dataset)
+            updates = {name: _freeze(records)}
+            frames = {name: self._analyzer.to_frame(name, records)}
+        except Exception as e:
+            # Keep serving the previous data for this dataset
+            print(f"Background refresh of {dataset} failed: {str(e)}")
+            self._errors[dataset] = str(e)
+            self._failures[dataset] = self._failures.get(dataset, 0) + 1
+            return False
+
+        self._errors.pop(dataset, None)
+        self._failures.pop(dataset, None)
+        if name == 'dividends':
+            updates['total_dividends'] = self._analyzer.get_total_dividends()
+        # Readers can show holdings while the slower history is still loading
+        self._publish(updates, frames)
+        return True
+
+    def _publish(self, updates: dict, frames: dict):
+        previous = self._snapshot
+        if previous is not None:
+            frames = dict(previous.frames, **frames)
+        updates['frames'] = MappingProxyType(frames)
+        if previous is None:
+            self._snapshot = PortfolioSnapshot(taken_at=time.time(), **updates)
+        else:
+            self._snapshot = replace(previous, taken_at=time.time(), **updates)
+
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(previous, self._snapshot)
+            except Exception as e:
+                print(f"Snapshot listener failed: {str(e)}")
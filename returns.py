@@ -0,0 +1,277 @@
+"""
+Time-weighted and money-weighted returns from the order and dividend history
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from lots import fill_of
+from utils import parse_timestamp_column, safe_float
+
+# Dividend states that put cash in the account
+PAID_DIVIDEND_STATES = ('paid', 'reinvested')
+
+
+def _to_days(values: pd.Series) -> np.ndarray:
+    """Convert timestamps to numpy day precision, dropping the time zone"""
+    return parse_timestamp_column(values).dt.tz_convert(None).dt.normalize().to_numpy('datetime64[D]')
+
+
+def fills_frame(orders: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Build a frame of executed fills
+
+    Args:
+        orders: Processed orders
+
+    Returns:
+        DataFrame with id, symbol, day, signed quantity and cash (positive for buys)
+    """
+    rows = []
+    for order in orders:
+        fill = fill_of(order)
+        if fill is not None:
+            rows.append(dict(fill, symbol=(order.get('symbol', '') or '').upper()))
+
+    if not rows:
+        return pd.DataFrame({'id': [], 'symbol': [], 'day': np.array([], dtype='datetime64[D]'),
+                             'quantity': [], 'price': [], 'cash': []})
+
+    frame = pd.DataFrame(rows)
+    sign = np.where(frame['side'] == 'buy', 1.0, -1.0)
+    frame['day'] = _to_days(frame['time'])
+    frame['quantity'] = frame['quantity'] * sign
+    frame['cash'] = frame['quantity'] * frame['price']
+    frame = frame[~pd.isna(frame['day'])]
+    return frame[['id', 'symbol', 'day', 'quantity', 'price', 'cash']].sort_values('day', kind='stable')
+
+
+def dividend_flows(dividends: List[Dict[str, Any]]) -> pd.Series:
+    """
+    Sum paid dividends per day
+
+    Args:
+        dividends: Processed dividends
+
+    Returns:
+        Series of dividend cash indexed by day
+    """
+    paid = [div for div in dividends if div.get('state') in PAID_DIVIDEND_STATES]
+    if not paid:
+        return pd.Series(dtype='float64')
+    frame = pd.DataFrame({
+        'day': _to_days(pd.Series([div.get('paid_at') or div.get('payable_date', '') for div in paid])),
+        'amount': [safe_float(div.get('amount')) for div in paid],
+    })
+    frame = frame[~pd.isna(frame['day'])]
+    return frame.groupby('day')['amount'].sum()
+
+
+def xirr(days: np.ndarray, amounts: np.ndarray) -> Optional[float]:
+    """
+    Annualized internal rate of return of irregular cash flows
+
+    Args:
+        days: datetime64[D] dates of the flows
+        amounts: Flows from the investor's view (negative = money in, positive = money out)
+
+    Returns:
+        Annual rate, or None if the flows do not change sign or no rate is found
+    """
+    if len(amounts) < 2 or not (amounts.min() < 0 < amounts.max()):
+        return None
+
+    days = days.astype('datetime64[D]')
+    years = (days - days.min()).astype('float64') / 365.0
+
+    def npv(rate: float) -> float:
+        return float(np.sum(amounts / np.power(1.0 + rate, years)))
+
+    # Bisection on a bracket where the NPV changes sign; robust for any flow pattern
+    low, high = -0.9999, 1.0
+    while npv(high) > 0 and high < 1e6:
+        high *= 2
+    if npv(low) * npv(high) > 0:
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        if npv(low) * npv(mid) <= 0:
+            high = mid
+        else:
+            low = mid
+        if high - low < 1e-10:
+            break
+    return (low + high) / 2
+
+
+class ReturnsEngine:
+    """
+    Daily portfolio value, TWR, XIRR and drawdowns.
+
+    The portfolio is measured without a cash balance: its value is the
+    market value of the shares held, every buy is money put in from outside
+    and every sell is money taken out, and dividends are income paid out.
+    Returns therefore describe the positions themselves, not the account's
+    idle cash. A symbol counts as not held (and its buys as not yet made)
+    until its first daily close, so prices are only ever carried forward.
+
+    The daily series (value, net flows, dividends, chained TWR index) is
+    cached. When called again with the same fills and a price table that
+    only adds newer days, just those days are computed and appended.
+    """
+
+    def __init__(self):
+        self._series: Optional[pd.DataFrame] = None
+        self._fills_key: Optional[tuple] = None
+        self._dividends_key: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def compute(self, orders: List[Dict[str, Any]], dividends: List[Dict[str, Any]],
+                prices: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Compute returns over the whole history
+
+        Args:
+            orders: Processed order history
+            dividends: Processed dividend history
+            prices: Daily closes, indexed by datetime64[D] day with one column per symbol
+
+        Returns:
+            Dict with the daily 'series' DataFrame (value, flow, dividends, twr_index,
+            drawdown), 'twr', 'annualized_twr', 'xirr', 'max_drawdown',
+            'max_drawdown_day', 'start' and 'end'; empty if there is nothing to measure
+        """
+        fills = fills_frame(orders)
+        divs = dividend_flows(dividends)
+        if fills.empty or prices.empty:
+            return {}
+
+        fills_key = tuple(map(tuple, fills[['id', 'quantity', 'price']].itertuples(index=False)))
+        dividends_key = tuple(divs.items())
+        days = self._days(fills, prices)
+
+        with self._lock:
+            series = self._series
+            reusable = (series is not None and fills_key == self._fills_key and dividends_key == self._dividends_key
+                        and len(days) >= len(series)
+                        and np.array_equal(days[:len(series)], series.index.to_numpy().astype('datetime64[D]')))
+            if reusable and len(days) > len(series):
+                tail = self._daily(fills, divs, prices, days, start=len(series), previous=series)
+                series = pd.concat([series, tail])
+            elif not reusable:
+                series = self._daily(fills, divs, prices, days)
+            self._series = series
+            self._fills_key = fills_key
+            self._dividends_key = dividends_key
+
+        return self._summary(series)
+
+    def clear(self):
+        """Drop the cached daily series"""
+        with self._lock:
+            self._series = None
+            self._fills_key = None
+            self._dividends_key = None
+
+    def _days(self, fills: pd.DataFrame, prices: pd.DataFrame) -> np.ndarray:
+        """Trading days from the first fill (or first price) to the last price"""
+        price_days = prices.index.to_numpy().astype('datetime64[D]')
+        start = max(fills['day'].min(), price_days.min())
+        return price_days[price_days >= start]
+
+    def _daily(self, fills: pd.DataFrame, divs: pd.Series, prices: pd.DataFrame, days: np.ndarray,
+               start: int = 0, previous: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Compute the daily series for days[start:], chaining from the previous series"""
+        window = days[start:]
+        closes = self._closes(fills, prices, days)
+        fills = self._priced_fills(fills, closes, days)
+
+        # Shares held at each day's close: cumulative fills up to and including that day
+        values = np.zeros(len(window))
+        for symbol, group in fills.groupby('symbol', sort=False):
+            held = np.cumsum(group['quantity'].to_numpy())
+            position = np.searchsorted(group['day'].to_numpy(), window, side='right') - 1
+            shares = np.where(position >= 0, held[np.maximum(position, 0)], 0.0)
+            values += shares * np.nan_to_num(closes[symbol].to_numpy()[start:])
+
+        # Flows on non-trading days count on the next trading day; everything before
+        # the first day is folded into the opening value
+        flow = self._bucket(fills['day'].to_numpy(), fills['cash'].to_numpy(), days)[start:]
+        income = self._bucket(divs.index.to_numpy().astype('datetime64[D]'), divs.to_numpy(), days)[start:]
+
+        if previous is not None:
+            last_value = previous['value'].iloc[-1]
+            last_index = previous['twr_index'].iloc[-1]
+        else:
+            last_value, last_index = 0.0, 1.0
+            flow[0] = values[0]
+
+        # Day return = (close - net buys + dividends) / previous close, flows at end of day
+        previous_values = np.concatenate([[last_value], values[:-1]])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily = np.where(previous_values > 0, (values - flow + income) / previous_values - 1.0, 0.0)
+        twr_index = last_index * np.cumprod(1.0 + daily)
+
+        return pd.DataFrame({
+            'value': values, 'flow': flow, 'dividends': income, 'twr_index': twr_index,
+        }, index=pd.Index(window, name='day'))
+
+    def _closes(self, fills: pd.DataFrame, prices: pd.DataFrame, days: np.ndarray) -> pd.DataFrame:
+        """Daily closes for every traded symbol, aligned to days and NaN before its first bar"""
+        # Forward fill only: a close is never used for a day before it was printed
+        closes = prices.ffill().reindex(days)
+        for symbol, group in fills.groupby('symbol', sort=False):
+            if symbol in closes.columns and closes[symbol].notna().any():
+                continue
+            # No price history (e.g. delisted): carry the last fill price forward
+            fill_prices = pd.Series(group['price'].to_numpy(), index=group['day'].to_numpy())
+            fill_prices = fill_prices[~fill_prices.index.duplicated(keep='last')]
+            closes[symbol] = fill_prices.reindex(days, method='ffill').to_numpy()
+        return closes
+
+    def _priced_fills(self, fills: pd.DataFrame, closes: pd.DataFrame, days: np.ndarray) -> pd.DataFrame:
+        """Move fills made before their symbol's first close to that day (past the end if never priced)"""
+        never = days[-1] + np.timedelta64(1, 'D')
+        first = {symbol: closes[symbol].first_valid_index() for symbol in fills['symbol'].unique()}
+        first_day = fills['symbol'].map(
+            lambda symbol: never if first[symbol] is None else np.datetime64(first[symbol], 'D'))
+        fills = fills.copy()
+        fills['day'] = np.maximum(fills['day'].to_numpy(), first_day.to_numpy().astype('datetime64[D]'))
+        return fills
+
+    def _bucket(self, flow_days: np.ndarray, amounts: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Sum amounts onto the first day on or after each flow day"""
+        totals = np.zeros(len(days))
+        if len(flow_days) == 0:
+            return totals
+        position = np.searchsorted(days, flow_days, side='left')
+        inside = (position < len(days)) & (flow_days >= days[0])
+        np.add.at(totals, position[inside], amounts[inside])
+        return totals
+
+    def _summary(self, series: pd.DataFrame) -> Dict[str, Any]:
+        series = series.copy()
+        series['drawdown'] = series['twr_index'] / series['twr_index'].cummax() - 1.0
+
+        days = series.index.to_numpy().astype('datetime64[D]')
+        span_years = max((days[-1] - days[0]).astype('float64') / 365.0, 0.0)
+        twr = float(series['twr_index'].iloc[-1] - 1.0)
+
+        # Investor view: buys (and the opening value) are money in, sells, dividends and
+        # the final value are money out
+        amounts = -series['flow'].to_numpy() + series['dividends'].to_numpy()
+        amounts[-1] += series['value'].iloc[-1]
+
+        return {
+            'series': series,
+            'start': series.index[0],
+            'end': series.index[-1],
+            'twr': twr,
+            'annualized_twr': (1.0 + twr) ** (1.0 / span_years) - 1.0 if span_years >= 1 else None,
+            'xirr': xirr(days, amounts),
+            'max_drawdown': float(series['drawdown'].min()),
+            'max_drawdown_day': series['drawdown'].idxmin(),
+        }
@@ -0,0 +1,338 @@
+"""
+Process-wide cache for public market data (instruments, quotes, fundamentals, price history)
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # optional: pip install redis (the 'redis' extra)
+    redis = None
+
+# Seconds each kind of public data is shared for; instruments never change
+SHARED_TTLS = {
+    'instruments': 7 * 24 * 3600,
+    'quotes': 2,
+    'fundamentals': 3600,
+    'historicals': 3600,
+}
+DEFAULT_SHARED_TTL = 60
+
+# Seconds a caller waits for a load started by another caller
+LOAD_TIMEOUT = 60
+
+# Prefix of every key written to Redis
+REDIS_PREFIX = 'ipt:'
+
+
+class MemoryBackend:
+    """In-process key/value store with per-key expiry"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 50000):
+        """
+        Args:
+            max_entries: Entries kept before expired and then oldest ones are dropped
+        """
+        self._max_entries = max(1, max_entries)
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            found = {}
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    found[key] = entry[1]
+            return found
+
+    def set_many(self, values: Dict[str, Any], ttl: float):
+        expires_at = time.time() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries.pop(key, None)
+                self._entries[key] = (expires_at, value)
+            if len(self._entries) > self._max_entries:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        # Dicts keep insertion order, so the first keys are the oldest writes
+        for key in list(self._entries)[:max(0, len(self._entries) - self._max_entries)]:
+            del self._entries[key]
+
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) shared by every process, values stored as JSON"""
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = REDIS_PREFIX):
+        """
+        Args:
+            url: Server URL, e.g. redis://localhost:6379/0
+            prefix: Prefix of every key written
+        """
+        if redis is None:
+            raise ImportError("RedisBackend requires redis (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        values = self._client.mget([self._prefix + key for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, values: Dict[str, Any], ttl: float):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(self._prefix + key, json.dumps(value, separators=(',', ':')), px=max(1, int(ttl * 1000)))
+        pipeline.execute()
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self._prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+class SharedCache:
+    """
+    Public market data shared by every analyzer, with request coalescing.
+
+    Data is stored per item ('quotes:AAPL', 'instruments:<url>') so analyzers
+    with different portfolios still share what overlaps. When several callers
+    miss the same item at once, only the first fetches it; the others wait
+    for that result instead of sending their own request, so fifty sessions
+    holding AAPL cost one quote request. Coalescing is per process; with a
+    Redis backend the stored results are also shared between processes.
+    Only non-account data may be stored here.
+    """
+
+    def __init__(self, backend: Optional[Any] = None, ttls: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            backend: MemoryBackend, RedisBackend or compatible (defaults to a MemoryBackend)
+            ttls: Per-kind TTL overrides
+        """
+        self._backend = backend if backend is not None else MemoryBackend()
+        self._ttls = dict(SHARED_TTLS, **(ttls or {}))
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'loads': 0, 'errors': 0}
+
+    def ttl_for(self, kind: str) -> float:
+        """Return the TTL configured for a kind of data"""
+        return self._ttls.get(kind, DEFAULT_SHARED_TTL)
+
+    def get_or_load(self, kind: str, item_id: str, loader: Callable[[], Any]) -> Any:
+        """
+        Get one item, loading it once no matter how many callers miss it at the same time
+
+        Args:
+            kind: Kind of data (e.g. 'quotes')
+            item_id: Item within the kind (e.g. a symbol)
+            loader: Callable producing the item
+
+        Returns:
+            Shared or freshly loaded value (None if the loader found nothing)
+        """
+        return self.get_many_or_load(kind, [item_id], lambda ids: {item_id: loader()}).get(item_id)
+
+    def get_many_or_load(self, kind: str, item_ids: Iterable[str],
+                         loader: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Get several items, loading only the ones nobody has stored or is already loading
+
+        Args:
+            kind: Kind of data (e.g. 'quotes')
+            item_ids: Items within the kind, duplicates allowed
+            loader: Callable taking the missing ids and returning id -> value
+                (typically one batched request)
+
+        Returns:
+            Dict of id -> value for every item that could be found
+        """
+        ids = list(dict.fromkeys(item_id for item_id in item_ids if item_id))
+        found = self._found(kind, ids, self._read(kind, ids))
+        owned, waiting = self._claim(kind, [item_id for item_id in ids if item_id not in found])
+
+        if owned:
+            try:
+                loaded = loader(list(owned)) or {}
+            except BaseException as e:
+                # Includes cancellation, so waiters are never left hanging
+                self._fail(kind, owned, e)
+                raise
+            values = {item_id: loaded[item_id] for item_id in owned if loaded.get(item_id)}
+            try:
+                self._write(kind, values)
+            finally:
+                self._release(kind, owned, values)
+            found.update(values)
+
+        for item_id, future in waiting.items():
+            value = future.result(timeout=LOAD_TIMEOUT)
+            if value is not None:
+                found[item_id] = value
+        return found
+
+    async def aget_many_or_load(self, kind: str, item_ids: Iterable[str],
+                                loader: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Async get_many_or_load(); coalesces with sync and async callers on any thread or loop
+
+        Args:
+            kind: Kind of data (e.g. 'quotes')
+            item_ids: Items within the kind, duplicates allowed
+            loader: Coroutine function taking the missing ids and returning id -> value
+
+        Returns:
+            Dict of id -> value for every item that could be found
+        """
+        ids = list(dict.fromkeys(item_id for item_id in item_ids if item_id))
+        found = self._found(kind, ids, await self._in_thread(self._read, kind, ids))
+        owned, waiting = self._claim(kind, [item_id for item_id in ids if item_id not in found])
+
+        if owned:
+            try:
+                loaded = await loader(list(owned)) or {}
+            except BaseException as e:
+                # Includes cancellation, so waiters are never left hanging
+                self._fail(kind, owned, e)
+                raise
+            values = {item_id: loaded[item_id] for item_id in owned if loaded.get(item_id)}
+            try:
+                await self._in_thread(self._write, kind, values)
+            finally:
+                self._release(kind, owned, values)
+            found.update(values)
+
+        for item_id, future in waiting.items():
+            value = await asyncio.wait_for(asyncio.wrap_future(future), LOAD_TIMEOUT)
+            if value is not None:
+                found[item_id] = value
+        return found
+
+    def clear(self):
+        """Drop every stored item"""
+        self._backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict with hits, misses, coalesced (misses served by another caller's load),
+            loads (loader calls) and errors
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    async def _in_thread(self, func: Callable, *args) -> Any:
+        """Keep network backends off the event loop"""
+        if self._backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def _read(self, kind: str, ids: List[str]) -> Dict[str, Any]:
+        try:
+            return self._backend.get_many([f'{kind}:{item_id}' for item_id in ids]) if ids else {}
+        except Exception as e:
+            # An unreachable shared store degrades to fetching directly
+            print(f"Shared cache lookup failed: {str(e)}")
+            return {}
+
+    def _write(self, kind: str, values: Dict[str, Any]):
+        # Empty results are not stored, so the next caller tries again
+        if not values:
+            return
+        try:
+            self._backend.set_many({f'{kind}:{item_id}': value for item_id, value in values.items()},
+                                   self.ttl_for(kind))
+        except Exception as e:
+            print(f"Shared cache store failed: {str(e)}")
+
+    def _found(self, kind: str, ids: List[str], stored: Dict[str, Any]) -> Dict[str, Any]:
+        found = {item_id: stored[f'{kind}:{item_id}'] for item_id in ids if f'{kind}:{item_id}' in stored}
+        with self._lock:
+            self._stats['hits'] += len(found)
+            self._stats['misses'] += len(ids) - len(found)
+        return found
+
+    def _claim(self, kind: str, missing: List[str]) -> Tuple[Dict[str, Future], Dict[str, Future]]:
+        """Split missing items into ones this caller loads and ones already being loaded"""
+        owned, waiting = {}, {}
+        with self._lock:
+            for item_id in missing:
+                key = f'{kind}:{item_id}'
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._inflight[key] = Future()
+                    owned[item_id] = future
+                else:
+                    waiting[item_id] = future
+            self._stats['coalesced'] += len(waiting)
+            if owned:
+                self._stats['loads'] += 1
+        return owned, waiting
+
+    def _release(self, kind: str, owned: Dict[str, Future], values: Dict[str, Any]):
+        """Hand a finished load to the callers waiting on it"""
+        with self._lock:
+            for item_id in owned:
+                self._inflight.pop(f'{kind}:{item_id}', None)
+        for item_id, future in owned.items():
+            future.set_result(values.get(item_id))
+
+    def _fail(self, kind: str, owned: Dict[str, Future], error: Exception):
+        """Release the callers waiting on a failed load; they see the same error"""
+        with self._lock:
+            self._stats['errors'] += 1
+            for item_id in owned:
+                self._inflight.pop(f'{kind}:{item_id}', None)
+        for future in owned.values():
+            future.set_exception(error)
+
+
+_shared: Optional[SharedCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """
+    Get the process-wide shared cache
+
+    Uses Redis when IPT_REDIS_URL is set and the redis package is installed,
+    otherwise an in-memory store.
+
+    Returns:
+        SharedCache used by every analyzer in this process
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            backend = None
+            url = os.environ.get('IPT_REDIS_URL')
+            if url:
+                try:
+                    backend = RedisBackend(url)
+                except ImportError as e:
+                    print(f"Shared cache falls back to memory: {str(e)}")
+            _shared = SharedCache(backend)
+        return _shared
@@ -0,0 +1,145 @@
+"""
+Field-level differences between portfolio snapshots, for pushing updates to clients
+"""
+
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from lots import fill_of
+
+# Holding fields pushed when they change; new symbols are sent in full
+HOLDING_FIELDS = ('price', 'quantity', 'equity', 'equity_change', 'percent_change')
+
+# Dividend fields whose change re-sends the dividend
+DIVIDEND_FIELDS = ('state', 'amount', 'paid_at', 'payable_date')
+
+
+def _thaw(value: Any) -> Any:
+    """Return a JSON-serializable copy of a frozen snapshot dataset"""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def snapshot_state(snapshot) -> Dict[str, Any]:
+    """
+    Get the state a streaming client starts from
+
+    Order and dividend history are left out; clients fetch those once and
+    then apply the fills and dividends sent in each diff.
+
+    Args:
+        snapshot: PortfolioSnapshot
+
+    Returns:
+        Dict with taken_at, holdings (None until loaded) and total_dividends
+    """
+    return {
+        'taken_at': snapshot.taken_at,
+        'holdings': _thaw(snapshot.holdings),
+        'total_dividends': snapshot.total_dividends,
+    }
+
+
+def diff_snapshots(previous, current) -> Dict[str, Any]:
+    """
+    Compute what changed between two snapshots
+
+    Args:
+        previous: Earlier PortfolioSnapshot, or None
+        current: Later PortfolioSnapshot
+
+    Returns:
+        Dict with only the parts that changed: 'holdings' (symbol -> changed
+        fields, full record for new symbols), 'removed' (symbols no longer
+        held), 'fills' (orders with newly executed shares), 'dividends' (new
+        or updated dividends) and 'total_dividends'; empty if nothing changed
+    """
+    diff: Dict[str, Any] = {}
+
+    holdings, removed = _diff_holdings(previous.holdings if previous else None, current.holdings)
+    if holdings:
+        diff['holdings'] = holdings
+    if removed:
+        diff['removed'] = removed
+
+    # The first history load is the client's starting point, not a batch of new fills
+    if previous is not None:
+        fills = _diff_fills(previous, current)
+        if fills:
+            diff['fills'] = fills
+        if previous.dividends is not None:
+            dividends = _diff_dividends(previous.dividends, current.dividends)
+            if dividends:
+                diff['dividends'] = dividends
+
+    previous_total = previous.total_dividends if previous else None
+    if current.total_dividends is not None and current.total_dividends != previous_total:
+        diff['total_dividends'] = current.total_dividends
+
+    if diff:
+        diff['taken_at'] = current.taken_at
+    return diff
+
+
+def _diff_holdings(previous: Optional[Mapping[str, Any]], current: Optional[Mapping[str, Any]]):
+    if current is None or current is previous:
+        return {}, []
+    previous = previous or {}
+
+    changed = {}
+    for symbol, data in current.items():
+        before = previous.get(symbol)
+        if before is None:
+            changed[symbol] = _thaw(data)
+            continue
+        fields = {name: data.get(name) for name in HOLDING_FIELDS if data.get(name) != before.get(name)}
+        if fields:
+            changed[symbol] = fields
+    removed = [symbol for symbol in previous if symbol not in current]
+    return changed, removed
+
+
+def _executed(orders: Optional[Iterable[Mapping[str, Any]]]) -> Dict[str, float]:
+    """Executed quantity per order id"""
+    executed = {}
+    for order in orders or ():
+        fill = fill_of(order)
+        if fill is not None:
+            executed[fill['id']] = fill['quantity']
+    return executed
+
+
+def _diff_fills(previous, current) -> list:
+    """Orders whose executed quantity grew, from the order history and the open orders"""
+    # A dataset's first load is not compared against anything
+    reloaded = [current_orders for previous_orders, current_orders in (
+        (previous.all_orders, current.all_orders), (previous.open_orders, current.open_orders),
+    ) if previous_orders is not None and current_orders is not previous_orders]
+    if not reloaded:
+        return []
+
+    before = _executed(previous.all_orders)
+    before.update(_executed(previous.open_orders))
+
+    # Keyed by order id: clients upsert fills, so an order seen in both lists is sent once
+    fills = {}
+    for orders in reloaded:
+        for order in orders or ():
+            fill = fill_of(order)
+            if fill is not None and fill['quantity'] > before.get(fill['id'], 0.0):
+                fills[fill['id']] = _thaw(order)
+    return list(fills.values())
+
+
+def _diff_dividends(previous: Iterable[Mapping[str, Any]], current: Optional[Iterable[Mapping[str, Any]]]) -> list:
+    if current is None or current is previous:
+        return []
+    before = {div.get('id'): div for div in previous}
+    changed = []
+    for div in current:
+        old = before.get(div.get('id'))
+        if old is None or any(div.get(name) != old.get(name) for name in DIVIDEND_FIELDS):
+            changed.append(_thaw(div))
+    return changed
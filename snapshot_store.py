@@ -0,0 +1,204 @@
+"""
+Local SQLite snapshot store for holdings, orders, dividends and instruments
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # pragma: no cover - cryptography ships with robin_stocks
+    Fernet = None
+    InvalidToken = Exception
+
+# Column name -> SQLite type for every snapshot table. REAL columns are parsed
+# on write and handed back in the analyzer's string format on read.
+TABLES = {
+    'holdings': [
+        ('symbol', 'TEXT PRIMARY KEY'), ('name', 'TEXT'), ('type', 'TEXT'), ('id', 'TEXT'),
+        ('quantity', 'REAL'), ('average_buy_price', 'REAL'), ('equity', 'REAL'),
+        ('market_value', 'REAL'), ('price', 'REAL'), ('percent_change', 'REAL'),
+        ('total_return_today', 'REAL'), ('total_return_today_percent', 'REAL'),
+        ('equity_change', 'REAL'), ('pe_ratio', 'REAL'), ('dividend_yield', 'REAL'),
+    ],
+    'orders': [
+        ('id', 'TEXT PRIMARY KEY'), ('symbol', 'TEXT'), ('side', 'TEXT'), ('type', 'TEXT'),
+        ('time_in_force', 'TEXT'), ('state', 'TEXT'), ('quantity', 'REAL'), ('price', 'REAL'),
+        ('created_at', 'TEXT'), ('updated_at', 'TEXT'), ('executed_at', 'TEXT'), ('instrument', 'TEXT'),
+        ('average_price', 'REAL'), ('cumulative_quantity', 'REAL'),
+    ],
+    'dividends': [
+        ('id', 'TEXT PRIMARY KEY'), ('symbol', 'TEXT'), ('state', 'TEXT'), ('amount', 'REAL'),
+        ('rate', 'REAL'), ('position', 'REAL'), ('paid_at', 'TEXT'), ('payable_date', 'TEXT'),
+        ('record_date', 'TEXT'), ('instrument', 'TEXT'),
+    ],
+    'instruments': [
+        ('url', 'TEXT PRIMARY KEY'), ('symbol', 'TEXT'),
+    ],
+}
+
+
+def snapshot_path(account_id: str, snapshot_dir: str) -> str:
+    """
+    Build the snapshot file path of an account
+
+    Args:
+        account_id: Account identifier the snapshot belongs to
+        snapshot_dir: Directory holding snapshot files
+
+    Returns:
+        str: Path of the snapshot database (the account id is hashed, never stored in the name)
+    """
+    digest = hashlib.sha256(account_id.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(snapshot_dir, f"snapshot_{digest}.db")
+
+
+class SnapshotStore:
+    """
+    Typed SQLite tables holding the last synced state of an account.
+
+    The database lives in memory and is written to disk as a whole after each
+    update that changed it. When an encryption key is given the file is a Fernet token of the
+    serialized database, so nothing is readable at rest without the key;
+    otherwise it is a plain SQLite file.
+    """
+
+    def __init__(self, path: str, key: Optional[str] = None):
+        """
+        Args:
+            path: Snapshot file location
+            key: Fernet key (urlsafe base64, 32 bytes) enabling encryption at rest
+        """
+        if key and Fernet is None:
+            raise RuntimeError("Encrypted snapshots require the 'cryptography' package")
+
+        self._path = path
+        self._fernet = Fernet(key) if key else None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._load()
+        self._create_tables()
+
+    def save(self, **tables: List[Dict[str, Any]]):
+        """
+        Replace the contents of one or more tables and persist the snapshot
+
+        Tables whose rows are unchanged are left alone, and the file is only
+        re-encrypted and rewritten when at least one table changed.
+
+        Args:
+            **tables: Table name -> list of records (holdings, orders, dividends, instruments)
+        """
+        with self._lock:
+            changed = {}
+            for table, records in tables.items():
+                columns = [name for name, _ in TABLES[table]]
+                types = dict(TABLES[table])
+                rows = [tuple(self._to_column(record.get(name), types[name]) for name in columns)
+                        for record in records]
+                stored = self._conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+                if set(rows) != set(stored) or len(rows) != len(stored):
+                    changed[table] = (columns, rows)
+            if not changed:
+                return
+
+            with self._conn:
+                for table, (columns, rows) in changed.items():
+                    self._conn.execute(f"DELETE FROM {table}")
+                    self._conn.executemany(
+                        f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' for _ in columns)})",
+                        rows,
+                    )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('saved_at', ?)", (str(time.time()),)
+                )
+            self._write()
+
+    def load(self, table: str) -> List[Dict[str, Any]]:
+        """
+        Read every record of a table
+
+        Args:
+            table: Table name
+
+        Returns:
+            List of records in the analyzer's string-valued format
+        """
+        columns = [name for name, _ in TABLES[table]]
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+        return [{name: '' if value is None else str(value) for name, value in zip(columns, row)}
+                for row in rows]
+
+    @property
+    def saved_at(self) -> Optional[float]:
+        """Unix time of the last save that changed the snapshot (None for an empty snapshot)"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'saved_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def close(self):
+        """Release the in-memory database"""
+        with self._lock:
+            self._conn.close()
+
+    def _to_column(self, value: Any, column_type: str) -> Any:
+        if value is None or value == '':
+            return None
+        if column_type == 'REAL':
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return str(value)
+
+    def _create_tables(self):
+        with self._conn:
+            for table, columns in TABLES.items():
+                definition = ', '.join(f"{name} {column_type}" for name, column_type in columns)
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+                # Snapshots written before a column was added get it as NULLs
+                existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for name, column_type in columns:
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _load(self):
+        """Load the snapshot file into the in-memory database"""
+        if not os.path.isfile(self._path):
+            return
+
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+            if self._fernet:
+                data = self._fernet.decrypt(data)
+            self._conn.deserialize(data)
+            self._conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        except (OSError, sqlite3.DatabaseError, InvalidToken) as e:
+            # A snapshot we cannot read is just a cold start
+            print(f"Could not load snapshot {self._path}: {str(e)}")
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+    def _write(self):
+        """Write the in-memory database to disk, encrypting it if a key is set"""
+        try:
+            data = self._conn.serialize()
+            if self._fernet:
+                data = self._fernet.encrypt(data)
+
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self._path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._path)
+        except OSError as e:
+            print(f"Could not save snapshot {self._path}: {str(e)}")
@@ -0,0 +1,109 @@
+"""
+Per-symbol index over order and dividend records
+"""
+
+import bisect
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SymbolIndex:
+    """
+    Records grouped by symbol, each group kept sorted by a date field.
+
+    The index remembers which record list it was built from. Looking a symbol
+    up against the same list is O(records for that symbol); a different list
+    (e.g. after a cache reload) triggers a rebuild. Loaders that know exactly
+    which records changed can apply just those with apply().
+    """
+
+    def __init__(self, date_field: str):
+        """
+        Args:
+            date_field: Record field groups are sorted by (newest first on lookup)
+        """
+        self._date_field = date_field
+        self._groups: Dict[str, List[Dict[str, Any]]] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._symbol_of: Dict[str, str] = {}
+        self._source: Optional[List[Dict[str, Any]]] = None
+        self._origin: Any = None
+        self._lock = threading.RLock()
+
+    def lookup(self, symbol: str, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Get the records of one symbol
+
+        Args:
+            symbol: Stock symbol (case-insensitive)
+            records: Current full record list, used to rebuild the index if it changed
+
+        Returns:
+            List of the symbol's records sorted by date (newest first)
+        """
+        with self._lock:
+            if records is not self._source:
+                self._rebuild(records)
+                self._origin = None
+            return list(reversed(self._groups.get(symbol.upper(), [])))
+
+    def apply(self, changed: Iterable[Dict[str, Any]], records: List[Dict[str, Any]], origin: Any):
+        """
+        Bring the index up to date after a sync
+
+        Args:
+            changed: Records that are new or changed since the previous sync of origin
+            records: Full record list after the sync
+            origin: Object the records came from (e.g. a ledger); deltas from a
+                different origin than the last one cannot be trusted, so the
+                index is rebuilt from records instead
+        """
+        with self._lock:
+            if origin is None or origin is not self._origin:
+                self._rebuild(records)
+            else:
+                for record in changed:
+                    self._remove(record.get('id', ''))
+                    self._insert(record)
+            self._source = records
+            self._origin = origin
+
+    def clear(self):
+        """Drop every indexed record"""
+        with self._lock:
+            self._groups.clear()
+            self._keys.clear()
+            self._symbol_of.clear()
+            self._source = None
+            self._origin = None
+
+    def _rebuild(self, records: List[Dict[str, Any]]):
+        self._groups.clear()
+        self._keys.clear()
+        self._symbol_of.clear()
+        for record in sorted(records, key=lambda x: x.get(self._date_field, '') or ''):
+            symbol = (record.get('symbol', '') or '').upper()
+            self._groups.setdefault(symbol, []).append(record)
+            self._keys.setdefault(symbol, []).append(record.get(self._date_field, '') or '')
+            self._symbol_of[record.get('id', '')] = symbol
+        self._source = records
+
+    def _insert(self, record: Dict[str, Any]):
+        symbol = (record.get('symbol', '') or '').upper()
+        key = record.get(self._date_field, '') or ''
+        keys = self._keys.setdefault(symbol, [])
+        position = bisect.bisect_right(keys, key)
+        keys.insert(position, key)
+        self._groups.setdefault(symbol, []).insert(position, record)
+        self._symbol_of[record.get('id', '')] = symbol
+
+    def _remove(self, record_id: str):
+        symbol = self._symbol_of.pop(record_id, None)
+        if symbol is None:
+            return
+        group = self._groups[symbol]
+        for position, record in enumerate(group):
+            if record.get('id', '') == record_id:
+                del group[position]
+                del self._keys[symbol][position]
+                break
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test merging, ordering and error reporting across accounts with fake analyzers
+"""
+
+import pytest
+
+from aggregator import PortfolioAggregator
+
+
+class FakeAnalyzer:
+    """Stands in for a logged-in PortfolioAnalyzer; no network"""
+
+    def __init__(self, holdings=None, dividends=None, error=None):
+        self.holdings = holdings or {}
+        self.dividends = dividends or []
+        self.error = error
+
+    def get_holdings(self, force_refresh=False):
+        if self.error:
+            raise self.error
+        return self.holdings
+
+    def get_dividends(self, force_refresh=False):
+        if self.error:
+            raise self.error
+        return self.dividends
+
+    def get_total_dividends(self, force_refresh=False):
+        return f"{sum(float(div['amount']) for div in self.dividends):.2f}"
+
+    def logout(self):
+        pass
+
+
+def _aggregator(**analyzers):
+    aggregator = PortfolioAggregator(instrument_resolver=object(), price_history=object())
+    for label, analyzer in analyzers.items():
+        aggregator.add_analyzer(label, analyzer)
+    return aggregator
+
+
+def _holding(quantity, average_buy_price, today):
+    return {'quantity': quantity, 'average_buy_price': average_buy_price, 'price': '150',
+            'market_value': '0', 'total_return_today': today, 'name': 'Apple'}
+
+
+def test_holdings_merge_by_symbol():
+    aggregator = _aggregator(
+        main=FakeAnalyzer({'AAPL': _holding('10', '100', '10')}),
+        ira=FakeAnalyzer({'AAPL': _holding('5', '130', '5')}),
+    )
+
+    holding = aggregator.get_holdings()['AAPL']
+
+    assert holding['quantity'] == '15'
+    assert holding['average_buy_price'] == '110.0000'
+    assert holding['equity'] == '2250.00'
+    assert holding['accounts'] == {'main': '10', 'ira': '5'}
+    # 15 gained today on an opening value of 2250 - 15
+    assert holding['total_return_today_percent'] == '0.67'
+
+
+def test_dividends_are_ordered_by_payable_date():
+    aggregator = _aggregator(
+        main=FakeAnalyzer(dividends=[{'id': 'a', 'amount': '1', 'payable_date': '2024-01-02', 'paid_at': None}]),
+        ira=FakeAnalyzer(dividends=[{'id': 'b', 'amount': '2', 'payable_date': '2024-03-01', 'paid_at': None}]),
+    )
+
+    assert [(div['id'], div['account']) for div in aggregator.get_dividends()] == [('b', 'ira'), ('a', 'main')]
+
+
+def test_failed_account_is_reported_and_skipped(capsys):
+    aggregator = _aggregator(
+        main=FakeAnalyzer({'AAPL': _holding('10', '100', '0')}),
+        ira=FakeAnalyzer(error=ConnectionError('ira unavailable')),
+    )
+
+    assert list(aggregator.get_holdings()['AAPL']['accounts']) == ['main']
+    assert 'Holdings of account ira failed: ira unavailable' in capsys.readouterr().out
+
+    totals = aggregator.get_account_totals()
+    assert totals['main']['total_equity'] == 1500.0
+    assert totals['ira'] == {'error': 'ira unavailable'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test TTLCache expiry, stale-while-revalidate, LRU eviction and clear() generations
+"""
+
+import threading
+import time
+
+from cache import TTLCache
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_fresh_entry_is_served_without_loading():
+    cache = TTLCache(default_ttl=60)
+    cache.set('holdings', {'AAPL': 1})
+
+    assert cache.get_or_load('holdings', lambda: {'AAPL': 2}) == {'AAPL': 1}
+    assert cache.stats()['hits'] == 1
+
+
+def test_expired_entry_past_stale_window_reloads():
+    cache = TTLCache(default_ttl=10, stale_ttl=5)
+    cache.set('holdings', {'AAPL': 1}, stored_at=time.time() - 30)
+
+    assert 'holdings' not in cache
+    assert cache.get('holdings') is None
+    assert cache.get_or_load('holdings', lambda: {'AAPL': 2}) == {'AAPL': 2}
+    assert cache.get('holdings') == {'AAPL': 2}
+
+
+def test_stale_entry_is_served_while_refreshing_in_background():
+    cache = TTLCache(default_ttl=10, stale_ttl=60)
+    cache.set('holdings', {'AAPL': 1}, stored_at=time.time() - 20)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return {'AAPL': 2}
+
+    # Both reads see the stale value; only one background refresh runs
+    assert cache.get_or_load('holdings', loader) == {'AAPL': 1}
+    assert cache.get_or_load('holdings', loader) == {'AAPL': 1}
+    release.set()
+
+    assert _wait_for(lambda: cache.get('holdings') == {'AAPL': 2})
+    assert len(calls) == 1
+    assert cache.stats()['stale_hits'] == 2
+
+
+def test_get_stale_serves_stale_entries_without_loading():
+    cache = TTLCache(default_ttl=10, stale_ttl=60)
+    cache.set('holdings', {'AAPL': 1}, stored_at=time.time() - 20)
+    cache.set('dividends', [1], stored_at=time.time() - 100)
+
+    assert cache.get('holdings') is None
+    assert cache.get_stale('holdings') == {'AAPL': 1}
+    assert cache.get_stale('dividends') is None
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_empty_results_are_not_cached():
+    cache = TTLCache()
+    assert cache.get_or_load('orders', lambda: []) == []
+    assert 'orders' not in cache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_update_keeps_age_and_ttl():
+    cache = TTLCache(default_ttl=10)
+    cache.set('holdings', {'AAPL': 1}, stored_at=time.time() - 15)
+
+    assert cache.update('holdings', {'AAPL': 2})
+    assert cache.peek('holdings') == {'AAPL': 2}
+    assert 'holdings' not in cache
+    assert not cache.update('missing', 1)
+
+
+def test_clear_discards_loads_started_before_it():
+    cache = TTLCache()
+
+    def loader():
+        cache.clear()
+        return {'AAPL': 1}
+
+    assert cache.get_or_load('holdings', loader) == {'AAPL': 1}
+    assert cache.peek('holdings') is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
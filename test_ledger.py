@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the order and dividend ledgers used for incremental history syncs
+"""
+
+import os
+import tempfile
+
+from cryptography.fernet import Fernet
+
+from ledger import DividendLedger, OrderLedger
+
+
+def _order(order_id, updated_at, state='filled'):
+    return {'id': order_id, 'state': state, 'created_at': updated_at, 'updated_at': updated_at}
+
+
+def test_order_cursor_tracks_newest_update():
+    ledger = OrderLedger(None)
+    assert ledger.cursor is None
+
+    ledger.merge([_order('1', '2024-01-02T00:00:00Z'), _order('2', '2024-01-05T00:00:00Z')])
+    assert ledger.cursor == '2024-01-05T00:00:00Z'
+
+    # An older update never moves the cursor back
+    ledger.merge([_order('1', '2024-01-03T00:00:00Z', state='cancelled')])
+    assert ledger.cursor == '2024-01-05T00:00:00Z'
+    assert [order['id'] for order in ledger.orders()] == ['2', '1']
+
+
+def test_merge_returns_only_new_or_changed_records():
+    ledger = OrderLedger(None)
+    first = _order('1', '2024-01-02T00:00:00Z')
+
+    assert ledger.merge([first]) == [first]
+    assert ledger.merge([dict(first)]) == []
+    assert len(ledger) == 1
+
+
+def test_ledger_file_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'orders.json')
+    OrderLedger(path).merge([_order('1', '2024-01-02T00:00:00Z')])
+
+    reloaded = OrderLedger(path)
+    assert '1' in reloaded
+    assert reloaded.cursor == '2024-01-02T00:00:00Z'
+
+
+def test_encrypted_ledger_is_unreadable_without_key():
+    path = os.path.join(tempfile.mkdtemp(), 'orders.json')
+    key = Fernet.generate_key().decode()
+    OrderLedger(path, encryption_key=key).merge([_order('1', '2024-01-02T00:00:00Z')])
+
+    with open(path, 'rb') as f:
+        assert b'2024-01-02' not in f.read()
+    assert '1' in OrderLedger(path, encryption_key=key)
+    # A wrong or missing key is a cold start, not an error
+    assert len(OrderLedger(path)) == 0
+    assert len(OrderLedger(path, encryption_key=Fernet.generate_key().decode())) == 0
+
+
+def _dividend(dividend_id, state, amount, payable_date='2024-01-01'):
+    return {'id': dividend_id, 'state': state, 'amount': amount, 'payable_date': payable_date}
+
+
+def test_dividend_total_follows_state_and_amount_changes():
+    ledger = DividendLedger(None)
+    ledger.merge([_dividend('1', 'paid', '5'), _dividend('2', 'pending', '3')])
+    assert ledger.total == 5.0
+
+    ledger.merge([_dividend('2', 'paid', '3')])
+    assert ledger.total == 8.0
+
+    ledger.merge([_dividend('1', 'voided', '5')])
+    assert ledger.total == 3.0
+
+
+def test_dividend_merge_dedupes_repeated_ids():
+    ledger = DividendLedger(None)
+    ledger.merge([_dividend('1', 'paid', '5'), _dividend('2', 'paid', '3')])
+    assert ledger.total == 8.0
+
+    # The same corrected record twice must replace the old copy once, keeping the last copy
+    changed = ledger.merge([_dividend('2', 'paid', '4'), _dividend('2', 'paid', '4')])
+    assert ledger.total == 9.0
+    assert len(changed) == 1
+
+    ledger.merge([_dividend('3', 'paid', '1'), _dividend('3', 'paid', '2')])
+    assert ledger.total == 11.0
+    assert ledger.get('3')['amount'] == '2'
+
+
+def test_pending_ids_only_cover_states_that_can_change():
+    ledger = DividendLedger(None)
+    ledger.merge([
+        _dividend('1', 'paid', '5'), _dividend('2', 'reinvested', '1'), _dividend('3', 'pending', '2'),
+        _dividend('4', 'voided', '2'), _dividend('5', 'cancelled', '2'),
+    ])
+    assert ledger.pending_ids() == ['3']
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test realized P&L of every lot matching method, and replays of late or changed fills
+"""
+
+import pytest
+
+from lots import LotEngine
+
+
+def _order(order_id, side, day, quantity, price, state='filled', cumulative_quantity=None):
+    return {
+        'id': order_id, 'symbol': 'AAPL', 'side': side, 'state': state,
+        'created_at': f'2024-01-0{day}T15:00:00Z', 'quantity': str(quantity), 'price': str(price),
+        'cumulative_quantity': str(quantity if cumulative_quantity is None else cumulative_quantity),
+    }
+
+
+ORDERS = [
+    _order('b1', 'buy', 1, 10, 10),
+    _order('b2', 'buy', 2, 10, 20),
+    _order('b3', 'buy', 3, 10, 15),
+    _order('s1', 'sell', 4, 15, 30),
+]
+
+
+@pytest.mark.parametrize('method, realized_pnl, cost_basis', [
+    ('fifo', 450 - (10 * 10 + 5 * 20), 5 * 20 + 10 * 15),
+    ('lifo', 450 - (10 * 15 + 5 * 20), 10 * 10 + 5 * 20),
+    ('hifo', 450 - (10 * 20 + 5 * 15), 10 * 10 + 5 * 15),
+    ('average', 450 - 15 * 15, 15 * 15),
+])
+def test_realized_pnl_per_method(method, realized_pnl, cost_basis):
+    position = LotEngine(method).position('aapl', ORDERS, current_price=40.0)
+
+    assert position['realized_pnl'] == pytest.approx(realized_pnl)
+    assert position['quantity'] == pytest.approx(15)
+    assert position['cost_basis'] == pytest.approx(cost_basis)
+    assert position['unrealized_pnl'] == pytest.approx(15 * 40 - cost_basis)
+
+
+def test_late_fill_replays_to_the_same_result():
+    origin = object()
+    engine = LotEngine('fifo')
+    early = [ORDERS[0], ORDERS[2], ORDERS[3]]
+    engine.apply(early, early, origin)
+
+    # b2 was executed before the sell but arrives in a later sync
+    engine.apply([ORDERS[1]], ORDERS, origin)
+    incremental = engine.position('AAPL', ORDERS)
+    expected = LotEngine('fifo').position('AAPL', ORDERS)
+
+    assert incremental['realized_pnl'] == pytest.approx(expected['realized_pnl'])
+    assert incremental['lots'] == expected['lots']
+
+
+def test_growing_partial_fill_replays():
+    origin = object()
+    engine = LotEngine('fifo')
+    partial = [_order('b1', 'buy', 1, 10, 10, state='partially_filled', cumulative_quantity=4)]
+    engine.apply(partial, partial, origin)
+    assert engine.position('AAPL', partial)['quantity'] == pytest.approx(4)
+
+    filled = [_order('b1', 'buy', 1, 10, 10)]
+    engine.apply(filled, filled, origin)
+    assert engine.position('AAPL', filled)['quantity'] == pytest.approx(10)
+
+
+def test_sell_without_known_purchase_has_no_cost_basis():
+    position = LotEngine('fifo').position('AAPL', [_order('s1', 'sell', 1, 2, 50)])
+    assert position['realized_pnl'] == pytest.approx(100)
+    assert position['quantity'] == 0
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        LotEngine('random')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test that the price history store fetches only missing days, with a fake historicals fetcher
+"""
+
+import datetime
+import tempfile
+import types
+
+import numpy as np
+import pytest
+
+import price_history
+from price_history import PriceHistoryStore
+from shared_cache import SharedCache
+
+SPAN_DAYS = dict(price_history.SPANS)
+
+
+class FakeDate(datetime.date):
+    current = datetime.date(2024, 3, 10)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+class FakeHistoricals:
+    """Returns one bar per calendar day of the span, closing at the day number"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbols, span):
+        self.calls.append((tuple(symbols), span))
+        yesterday = FakeDate.current - datetime.timedelta(days=1)
+        bars = []
+        for offset in range(SPAN_DAYS[span]):
+            day = yesterday - datetime.timedelta(days=offset)
+            for symbol in symbols:
+                bars.append({'symbol': symbol, 'begins_at': f'{day.isoformat()}T00:00:00Z',
+                             'open_price': '1', 'high_price': '1', 'low_price': '1',
+                             'close_price': str(price_history._day_number(day)), 'volume': '100'})
+        return bars
+
+
+@pytest.fixture(autouse=True)
+def fake_today(monkeypatch):
+    monkeypatch.setattr(price_history, 'datetime', types.SimpleNamespace(date=FakeDate))
+    FakeDate.current = datetime.date(2024, 3, 10)
+
+
+def _days(store, symbol):
+    return list(store.bars(symbol)['day'])
+
+
+def test_fetches_once_then_serves_from_disk():
+    store_dir = tempfile.mkdtemp()
+    fetch = FakeHistoricals()
+    store = PriceHistoryStore(store_dir, fetch_historicals=fetch)
+
+    closes = store.closes(['aapl', 'MSFT'], '2024-02-20')
+    assert fetch.calls == [(('AAPL', 'MSFT'), 'month')]
+    assert str(closes.index[0])[:10] == '2024-02-20'
+    assert str(closes.index[-1])[:10] == '2024-03-09'
+
+    store.closes(['AAPL'], '2024-02-25')
+    PriceHistoryStore(store_dir, fetch_historicals=fetch).closes(['AAPL', 'MSFT'], '2024-02-20')
+    assert len(fetch.calls) == 1
+
+
+def test_new_days_are_appended_with_a_small_span():
+    fetch = FakeHistoricals()
+    store = PriceHistoryStore(tempfile.mkdtemp(), fetch_historicals=fetch)
+    store.update(['AAPL'], '2024-02-20')
+    before = _days(store, 'AAPL')
+
+    FakeDate.current = datetime.date(2024, 3, 13)
+    store.update(['AAPL'], '2024-02-20')
+
+    assert fetch.calls[-1] == (('AAPL',), 'week')
+    after = _days(store, 'AAPL')
+    assert after[:len(before)] == before
+    assert len(after) == len(before) + 3
+    assert after == sorted(set(after))
+
+
+def test_earlier_start_fills_the_gap_once():
+    fetch = FakeHistoricals()
+    store = PriceHistoryStore(None, fetch_historicals=fetch)
+    store.update(['AAPL'], '2024-03-01')
+    store.update(['AAPL'], '2024-01-01')
+    store.update(['AAPL'], '2024-01-01')
+
+    assert [span for _, span in fetch.calls] == ['month', '3month']
+    days = _days(store, 'AAPL')
+    assert days == sorted(set(days))
+    assert days[0] <= price_history._day_number(datetime.date(2024, 1, 1))
+
+
+def test_stores_sharing_a_cache_fetch_once():
+    fetch = FakeHistoricals()
+    shared = SharedCache()
+    for _ in range(3):
+        PriceHistoryStore(None, fetch_historicals=fetch, shared_cache=shared).update(['AAPL'], '2024-03-01')
+
+    assert len(fetch.calls) == 1
+
+
+def test_failed_fetch_is_retried_next_time():
+    calls = []
+
+    def failing(symbols, span):
+        calls.append(span)
+        raise ConnectionError('offline')
+
+    store = PriceHistoryStore(None, fetch_historicals=failing)
+    store.update(['AAPL'], '2024-03-01')
+    store.update(['AAPL'], '2024-03-01')
+
+    assert len(calls) == 2
+    assert isinstance(store.bars('AAPL'), np.ndarray) and len(store.bars('AAPL')) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
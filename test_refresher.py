@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the background refresher's snapshots and idle shutdown with a fake analyzer
+"""
+
+import time
+
+import pytest
+
+import refresher as refresher_module
+from refresher import BackgroundRefresher
+
+
+class FakeAnalyzer:
+    """Stands in for PortfolioAnalyzer; no network"""
+
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = dict(failures or {})
+
+    def refresh(self, dataset):
+        self.calls.append(dataset)
+        if self.failures.get(dataset):
+            self.failures[dataset] -= 1
+            raise ConnectionError(f"{dataset} unavailable")
+        if dataset in ('holdings', 'quotes'):
+            return {'AAPL': {'price': '100.00', 'quantity': '1'}}
+        return []
+
+    def to_frame(self, dataset, records):
+        return None
+
+    def get_total_dividends(self):
+        return '0.00'
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_publishes_snapshots_to_readers_and_subscribers():
+    refresher = BackgroundRefresher(FakeAnalyzer(), quote_interval=0.05, idle_timeout=None)
+    published = []
+    refresher.subscribe(lambda previous, snapshot: published.append(snapshot))
+    refresher.start()
+    try:
+        assert _wait_for(lambda: refresher.snapshot is not None and refresher.snapshot.dividends is not None)
+        assert refresher.snapshot.holdings['AAPL']['price'] == '100.00'
+        assert refresher.snapshot.total_dividends == '0.00'
+        assert published and published[-1] is refresher.snapshot
+    finally:
+        refresher.stop()
+
+
+def test_stops_when_nobody_reads():
+    refresher = BackgroundRefresher(FakeAnalyzer(), quote_interval=0.02, idle_timeout=0.2)
+    refresher.start()
+    try:
+        assert refresher.is_running
+        assert _wait_for(lambda: not refresher.is_running)
+
+        # A returning reader restarts it
+        refresher.start()
+        assert refresher.is_running
+    finally:
+        refresher.stop()
+
+
+def test_readers_and_subscribers_keep_it_running():
+    refresher = BackgroundRefresher(FakeAnalyzer(), quote_interval=0.02, idle_timeout=0.2)
+    refresher.start()
+    try:
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            refresher.touch()
+            time.sleep(0.02)
+        assert refresher.is_running
+
+        unsubscribe = refresher.subscribe(lambda previous, snapshot: None)
+        time.sleep(0.4)
+        assert refresher.is_running
+        unsubscribe()
+        assert _wait_for(lambda: not refresher.is_running)
+    finally:
+        refresher.stop()
+
+
+def test_failed_dataset_retries_with_backoff_and_keeps_its_error(monkeypatch):
+    monkeypatch.setattr(refresher_module, 'RETRY_DELAY', 0.05)
+    analyzer = FakeAnalyzer(failures={'dividends': 2})
+    refresher = BackgroundRefresher(analyzer, quote_interval=60, position_interval=60,
+                                    history_interval=600, idle_timeout=None)
+    refresher.start()
+    try:
+        assert _wait_for(lambda: 'dividends' in refresher.errors)
+        assert refresher.errors['dividends'] == 'dividends unavailable'
+
+        # Retried after 0.05s and 0.1s instead of waiting the 600s history interval
+        assert _wait_for(lambda: refresher.snapshot is not None and refresher.snapshot.dividends is not None)
+        assert 'dividends' not in refresher.errors
+        assert analyzer.calls.count('dividends') == 3
+        # Datasets that loaded are not reloaded until their own interval
+        assert analyzer.calls.count('all_orders') == 1
+        assert analyzer.calls.count('holdings') == 1
+    finally:
+        refresher.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
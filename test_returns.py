@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test TWR, XIRR and drawdowns of the returns engine on small known series
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from returns import ReturnsEngine, xirr
+
+
+def _buy(order_id, symbol, day, quantity, price):
+    return {'id': order_id, 'symbol': symbol, 'side': 'buy', 'state': 'filled',
+            'created_at': f'{day}T20:00:00Z', 'quantity': str(quantity), 'price': str(price)}
+
+
+def _prices(closes):
+    days = sorted({day for series in closes.values() for day in series})
+    return pd.DataFrame(
+        {symbol: [series.get(day, np.nan) for day in days] for symbol, series in closes.items()},
+        index=pd.Index(np.array(days, dtype='datetime64[D]'), name='day'),
+    )
+
+
+def test_xirr_of_one_year_round_trip():
+    days = np.array(['2023-01-01', '2024-01-01'], dtype='datetime64[D]')
+    assert xirr(days, np.array([-1000.0, 1100.0])) == pytest.approx(0.10, abs=1e-6)
+    assert xirr(days, np.array([-1000.0, -100.0])) is None
+
+
+def test_buy_and_hold_over_one_year():
+    orders = [_buy('1', 'AAPL', '2023-01-01', 10, 100)]
+    prices = _prices({'AAPL': {'2023-01-01': 100.0, '2023-07-02': 110.0, '2024-01-01': 121.0}})
+
+    result = ReturnsEngine().compute(orders, [], prices)
+
+    assert result['twr'] == pytest.approx(0.21)
+    assert result['annualized_twr'] == pytest.approx(0.21)
+    assert result['xirr'] == pytest.approx(0.21, abs=1e-6)
+    assert result['max_drawdown'] == pytest.approx(0.0)
+
+
+def test_twr_ignores_the_size_of_flows():
+    orders = [_buy('1', 'AAPL', '2024-01-02', 10, 100), _buy('2', 'AAPL', '2024-01-03', 10, 110)]
+    prices = _prices({'AAPL': {'2024-01-02': 100.0, '2024-01-03': 110.0, '2024-01-04': 99.0}})
+
+    result = ReturnsEngine().compute(orders, [], prices)
+
+    # +10% on 1,000 then -10% on 2,200
+    assert result['twr'] == pytest.approx(1.1 * 0.9 - 1)
+    assert result['max_drawdown'] == pytest.approx(-0.1)
+    assert str(result['max_drawdown_day'])[:10] == '2024-01-04'
+    assert list(result['series']['value']) == pytest.approx([1000.0, 2200.0, 1980.0])
+
+
+def test_position_counts_from_its_first_close():
+    orders = [_buy('1', 'MSFT', '2024-01-02', 10, 50), _buy('2', 'AAPL', '2024-01-02', 10, 100)]
+    prices = _prices({
+        'MSFT': {'2024-01-02': 50.0, '2024-01-03': 50.0, '2024-01-04': 50.0},
+        'AAPL': {'2024-01-04': 120.0},
+    })
+
+    series = ReturnsEngine().compute(orders, [], prices)['series']
+
+    # AAPL is not valued with a later close; its buy enters on its first bar
+    assert list(series['value']) == pytest.approx([500.0, 500.0, 1700.0])
+    assert list(series['flow']) == pytest.approx([500.0, 0.0, 1000.0])
+
+
+def test_appending_days_matches_a_full_recompute():
+    orders = [_buy('1', 'AAPL', '2024-01-02', 10, 100)]
+    closes = {'2024-01-02': 100.0, '2024-01-03': 104.0, '2024-01-04': 101.0, '2024-01-05': 107.0}
+    engine = ReturnsEngine()
+    engine.compute(orders, [], _prices({'AAPL': dict(list(closes.items())[:2])}))
+
+    appended = engine.compute(orders, [], _prices({'AAPL': closes}))
+    full = ReturnsEngine().compute(orders, [], _prices({'AAPL': closes}))
+
+    assert appended['twr'] == pytest.approx(full['twr'])
+    assert list(appended['series']['twr_index']) == pytest.approx(list(full['series']['twr_index']))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
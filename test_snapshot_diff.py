@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test the field-level diffs pushed to streaming clients
+"""
+
+import pytest
+
+from refresher import PortfolioSnapshot
+from snapshot_diff import diff_snapshots, snapshot_state
+
+
+def _holding(price, quantity='2'):
+    equity = "{0:.2f}".format(float(price) * float(quantity))
+    return {'price': price, 'quantity': quantity, 'equity': equity, 'equity_change': '0.00',
+            'percent_change': '0.00', 'name': 'Apple', 'pe_ratio': '30'}
+
+
+def _order(order_id, state, cumulative_quantity, side='buy'):
+    return {'id': order_id, 'state': state, 'side': side, 'quantity': '5',
+            'cumulative_quantity': cumulative_quantity, 'average_price': '100', 'symbol': 'AAPL'}
+
+
+def _dividend(dividend_id, state, amount='1.00'):
+    return {'id': dividend_id, 'state': state, 'amount': amount, 'paid_at': None, 'payable_date': '2024-03-01'}
+
+
+def test_first_snapshot_sends_holdings_in_full():
+    current = PortfolioSnapshot(taken_at=1.0, holdings={'AAPL': _holding('100')}, total_dividends='5.00')
+
+    diff = diff_snapshots(None, current)
+
+    assert diff == {'holdings': {'AAPL': _holding('100')}, 'total_dividends': '5.00', 'taken_at': 1.0}
+
+
+def test_changed_holding_sends_only_changed_fields():
+    previous = PortfolioSnapshot(taken_at=1.0, holdings={'AAPL': _holding('100')})
+    current = PortfolioSnapshot(taken_at=2.0, holdings={'AAPL': _holding('101'), 'MSFT': _holding('400', '1')})
+
+    diff = diff_snapshots(previous, current)
+
+    assert diff['holdings']['AAPL'] == {'price': '101', 'equity': '202.00'}
+    assert diff['holdings']['MSFT'] == _holding('400', '1')
+    assert diff['taken_at'] == 2.0
+
+
+def test_removed_symbols_are_listed():
+    previous = PortfolioSnapshot(taken_at=1.0, holdings={'AAPL': _holding('100'), 'MSFT': _holding('400')})
+    current = PortfolioSnapshot(taken_at=2.0, holdings={'AAPL': _holding('100')})
+
+    assert diff_snapshots(previous, current) == {'removed': ['MSFT'], 'taken_at': 2.0}
+
+
+def test_unchanged_snapshot_gives_empty_diff():
+    holdings = {'AAPL': _holding('100')}
+    previous = PortfolioSnapshot(taken_at=1.0, holdings=holdings, total_dividends='5.00')
+    current = PortfolioSnapshot(taken_at=2.0, holdings=holdings, total_dividends='5.00')
+
+    assert diff_snapshots(previous, current) == {}
+
+
+def test_first_order_load_sends_no_fills():
+    previous = PortfolioSnapshot(taken_at=1.0)
+    current = PortfolioSnapshot(taken_at=2.0, all_orders=(_order('1', 'filled', '5'),))
+
+    assert 'fills' not in diff_snapshots(previous, current)
+
+
+def test_fills_are_orders_whose_executed_quantity_grew():
+    partial = _order('1', 'partially_filled', '2')
+    previous = PortfolioSnapshot(taken_at=1.0, all_orders=(partial,), open_orders=(partial,))
+    grown = _order('1', 'partially_filled', '3')
+    new = _order('2', 'filled', '5', side='sell')
+    queued = _order('3', 'queued', '0')
+    current = PortfolioSnapshot(taken_at=2.0, all_orders=(grown, new, queued), open_orders=(grown, queued))
+
+    fills = diff_snapshots(previous, current)['fills']
+
+    # Order 1 is in both lists but is sent once
+    assert sorted(fill['id'] for fill in fills) == ['1', '2']
+
+
+def test_fills_only_come_from_reloaded_datasets():
+    filled = _order('1', 'filled', '5')
+    all_orders = (filled,)
+    previous = PortfolioSnapshot(taken_at=1.0, all_orders=all_orders, open_orders=())
+    # Only the open orders reloaded; the order history is the same object as before
+    current = PortfolioSnapshot(taken_at=2.0, all_orders=all_orders, open_orders=())
+
+    assert 'fills' not in diff_snapshots(previous, current)
+
+
+def test_dividends_send_new_and_updated_records():
+    previous = PortfolioSnapshot(taken_at=1.0, dividends=(_dividend('a', 'pending'), _dividend('b', 'paid')),
+                                 total_dividends='1.00')
+    paid = _dividend('a', 'paid')
+    new = _dividend('c', 'pending', '2.00')
+    current = PortfolioSnapshot(taken_at=2.0, dividends=(paid, _dividend('b', 'paid'), new), total_dividends='2.00')
+
+    diff = diff_snapshots(previous, current)
+
+    assert diff['dividends'] == [paid, new]
+    assert diff['total_dividends'] == '2.00'
+
+
+def test_first_dividend_load_sends_only_the_total():
+    previous = PortfolioSnapshot(taken_at=1.0)
+    current = PortfolioSnapshot(taken_at=2.0, dividends=(_dividend('a', 'paid'),), total_dividends='1.00')
+
+    assert diff_snapshots(previous, current) == {'total_dividends': '1.00', 'taken_at': 2.0}
+
+
+def test_snapshot_state_before_holdings_load():
+    state = snapshot_state(PortfolioSnapshot(taken_at=1.0, total_dividends='3.00'))
+
+    assert state == {'taken_at': 1.0, 'holdings': None, 'total_dividends': '3.00'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, '-q'])
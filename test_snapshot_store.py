@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Test that the snapshot store round-trips tables and only rewrites its file on changes
+"""
+
+import os
+import tempfile
+
+from cryptography.fernet import Fernet
+
+from snapshot_store import SnapshotStore
+
+
+def test_unchanged_save_does_not_rewrite_file():
+    path = os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+    store = SnapshotStore(path)
+    store.save(holdings=[{'symbol': 'AAPL', 'quantity': '1.5'}])
+    written = os.stat(path).st_mtime_ns
+    os.utime(path, ns=(written - 10 ** 9, written - 10 ** 9))
+
+    store.save(holdings=[{'symbol': 'AAPL', 'quantity': '1.5'}])
+    assert os.stat(path).st_mtime_ns == written - 10 ** 9
+
+    store.save(holdings=[{'symbol': 'AAPL', 'quantity': '2'}])
+    assert os.stat(path).st_mtime_ns != written - 10 ** 9
+
+
+def test_encrypted_snapshot_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+    key = Fernet.generate_key().decode()
+    SnapshotStore(path, key=key).save(
+        holdings=[{'symbol': 'AAPL', 'quantity': '2'}],
+        dividends=[{'id': '1', 'symbol': 'AAPL', 'state': 'paid', 'amount': '0.24'}],
+    )
+
+    store = SnapshotStore(path, key=key)
+    assert store.saved_at is not None
+    assert store.load('holdings')[0]['quantity'] == '2.0'
+    assert store.load('dividends')[0]['amount'] == '0.24'
+    assert SnapshotStore(path).saved_at is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test per-symbol lookups and incremental apply() of the symbol index
+"""
+
+from symbol_index import SymbolIndex
+
+
+def _order(order_id, symbol, created_at):
+    return {'id': order_id, 'symbol': symbol, 'created_at': created_at}
+
+
+def test_lookup_groups_by_symbol_newest_first():
+    records = [_order('1', 'AAPL', '2024-01-01'), _order('2', 'msft', '2024-01-02'),
+               _order('3', 'AAPL', '2024-01-03')]
+    index = SymbolIndex('created_at')
+
+    assert [r['id'] for r in index.lookup('aapl', records)] == ['3', '1']
+    assert [r['id'] for r in index.lookup('MSFT', records)] == ['2']
+    assert index.lookup('TSLA', records) == []
+
+
+def test_apply_inserts_and_moves_changed_records():
+    ledger = object()
+    records = [_order('1', 'AAPL', '2024-01-01'), _order('2', 'AAPL', '2024-01-03')]
+    index = SymbolIndex('created_at')
+    index.apply(records, records, ledger)
+
+    # A new order, and order 1 re-dated and moved to another symbol
+    changed = [_order('3', 'AAPL', '2024-01-02'), _order('1', 'MSFT', '2024-01-04')]
+    updated = [changed[1], records[1], changed[0]]
+    index.apply(changed, updated, ledger)
+
+    assert [r['id'] for r in index.lookup('AAPL', updated)] == ['2', '3']
+    assert [r['id'] for r in index.lookup('MSFT', updated)] == ['1']
+
+
+def test_apply_from_another_origin_rebuilds():
+    records = [_order('1', 'AAPL', '2024-01-01')]
+    index = SymbolIndex('created_at')
+    index.apply(records, records, object())
+
+    # Deltas from a different ledger are not trusted: the full list wins
+    reloaded = [_order('2', 'MSFT', '2024-01-02')]
+    index.apply([], reloaded, object())
+
+    assert index.lookup('AAPL', reloaded) == []
+    assert [r['id'] for r in index.lookup('MSFT', reloaded)] == ['2']
+
+
+def test_lookup_against_a_new_list_rebuilds():
+    index = SymbolIndex('created_at')
+    index.lookup('AAPL', [_order('1', 'AAPL', '2024-01-01')])
+
+    assert [r['id'] for r in index.lookup('AAPL', [_order('2', 'AAPL', '2024-01-02')])] == ['2']
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
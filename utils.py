@@ -2,6 +2,13 @@
 Utility functions for the Robinhood Portfolio Analyzer
 """
 
+import functools
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
 def safe_float(value, default=0.0):
     """
     Safely convert a value to float with fallback
@@ -202,6 +209,106 @@ def validate_credentials(username, password):
     
     return True, ""
 
+# Non-ISO formats tried, in order, for timestamp shapes fromisoformat rejects
+FALLBACK_DATE_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y"
+]
+
+_DIGITS = re.compile(r"\d")
+
+@functools.lru_cache(maxsize=256)
+def _parser_for_shape(shape):
+    """
+    Pick the parser for a timestamp shape (the string with every digit replaced by '0')
+    
+    Args:
+        shape: Timestamp shape, e.g. '0000-00-00T00:00:00.000000Z'
+        
+    Returns:
+        Callable parsing a string of that shape into a datetime, or None if no format fits
+    """
+    try:
+        datetime.fromisoformat(shape.replace('0', '1'))
+        return datetime.fromisoformat
+    except ValueError:
+        pass
+    
+    for fmt in FALLBACK_DATE_FORMATS:
+        try:
+            datetime.strptime(shape.replace('0', '1'), fmt)
+            return functools.partial(_strptime, fmt=fmt)
+        except ValueError:
+            continue
+    return None
+
+def _strptime(value, fmt):
+    return datetime.strptime(value, fmt)
+
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(value):
+    """
+    Parse a Robinhood timestamp or date string
+    
+    ISO-8601 strings (the API's format) take the datetime.fromisoformat fast
+    path. Other layouts are matched once per shape and the working format is
+    remembered, so repeated values and repeated shapes are cheap.
+    
+    Args:
+        value: Timestamp string, e.g. '2024-01-02T15:04:05.123456Z' or '2024-01-02'
+        
+    Returns:
+        datetime (timezone-aware when the string has an offset) or None if unparseable
+    """
+    if not value or not isinstance(value, str):
+        return None
+    
+    parser = _parser_for_shape(_DIGITS.sub('0', value))
+    if parser is None:
+        return None
+    try:
+        return parser(value)
+    except ValueError:
+        pass
+    
+    # The shape's format does not fit this value (e.g. day-first 13/02/2024), try the rest
+    for fmt in FALLBACK_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+def parse_timestamp_column(values):
+    """
+    Parse a column of ISO-8601 timestamps in one vectorized call
+    
+    Args:
+        values: Sequence or Series of timestamp strings ('' or None for missing)
+        
+    Returns:
+        pd.Series of UTC datetime64 values (NaT where missing or unparseable)
+    """
+    values = pd.Series(values, dtype=object)
+    return pd.to_datetime(values.replace('', None), utc=True, errors='coerce', format='ISO8601')
+
+def format_date_column(values, output_format="%Y-%m-%d"):
+    """
+    Format a datetime64 column as date strings
+    
+    Args:
+        values: Series of datetime64 values
+        output_format: Desired output format
+        
+    Returns:
+        pd.Series of formatted strings ('N/A' where missing)
+    """
+    return values.dt.strftime(output_format).fillna("N/A")
+
 def format_date(date_string, input_format=None, output_format="%Y-%m-%d"):
     """
     Format date string
@@ -218,36 +325,57 @@ def format_date(date_string, input_format=None, output_format="%Y-%m-%d"):
         return "N/A"
     
     try:
-        from datetime import datetime
-        
-        # Common input formats to try
-        common_formats = [
-            "%Y-%m-%dT%H:%M:%S.%fZ",
-            "%Y-%m-%dT%H:%M:%SZ",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d",
-            "%m/%d/%Y",
-            "%d/%m/%Y"
-        ]
-        
         # Try to parse with provided format first
         if input_format:
             try:
-                dt = datetime.strptime(date_string, input_format)
-                return dt.strftime(output_format)
+                return datetime.strptime(date_string, input_format).strftime(output_format)
             except ValueError:
                 pass
         
-        # Try common formats
-        for fmt in common_formats:
-            try:
-                dt = datetime.strptime(date_string, fmt)
-                return dt.strftime(output_format)
-            except ValueError:
-                continue
+        dt = parse_timestamp(date_string)
+        if dt is not None:
+            return dt.strftime(output_format)
         
         # If all fails, return first 10 characters (assuming YYYY-MM-DD)
         return date_string[:10] if len(date_string) >= 10 else date_string
         
     except Exception:
         return date_string[:10] if len(date_string) >= 10 else "N/A"
+
+
+def fan_out(calls, deadline, thread_name_prefix=''):
+    """
+    Run independent calls concurrently and join them under one deadline
+    
+    Args:
+        calls: Name -> zero-argument callable
+        deadline: Seconds to wait for all calls together
+        thread_name_prefix: Name prefix of the worker threads
+        
+    Returns:
+        tuple: (results, errors) - results maps every call that finished in time
+        to its return value, in the order of calls; errors maps the others to
+        the exception they raised or a TimeoutError
+    """
+    if not calls:
+        return {}, {}
+    
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix=thread_name_prefix)
+    try:
+        futures = {executor.submit(call): name for name, call in calls.items()}
+        done, not_done = wait(futures, timeout=deadline)
+        
+        finished = {}
+        errors = {}
+        for future in done:
+            name = futures[future]
+            try:
+                finished[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+        for future in not_done:
+            errors[futures[future]] = TimeoutError(f"{futures[future]} did not finish within {deadline}s")
+        return {name: finished[name] for name in calls if name in finished}, errors
+    finally:
+        # Do not block on calls that missed the deadline
+        executor.shutdown(wait=False, cancel_futures=True)